@@ -0,0 +1,158 @@
+"""
+Coverage analytics of the game bank: which functions and categories are over- or under-represented, which ones
+lack strong games, and which ones are found together.
+
+    python3 . analytics --strong 7 --min-games 3
+
+Every game is a row of a games x tags matrix of weights, categories then functions, and a boolean matrix marks the
+tags it has, whatever their weight. All the figures are reductions of these matrices:
+
+- coverage: number of games, of strong games (weight >= strong) and sum of the weights of each tag, divided by the
+  number of games. The representation of a tag is its weighted coverage relative to the mean of its kind.
+- gaps: the tags with fewer than `min_games` strong games.
+- co-occurrence: the tags x tags matrix of the number of games having both, the product of the boolean matrix by its
+  transpose, from which the Jaccard index of each pair and the share of the rarer tag found with the other.
+
+The report is stored in the database with the change feed seq it was computed at: it is only computed again once
+games, categories or functions changed.
+"""
+
+import json
+import logging
+import sqlite3
+
+import numpy as np
+
+from database import Database, DatabaseError
+
+logger = logging.getLogger(__name__)
+
+REPORT_NAME = "analytics"
+STRONG_WEIGHT = 7
+MIN_STRONG_GAMES = 3
+TOP_PAIRS = 20
+# Representation above or below which a tag is over- or under-represented
+OVER_REPRESENTED = 1.5
+UNDER_REPRESENTED = 0.5
+
+TAG_TABLES = ("cognitive_categories", "cognitive_functions")
+
+
+def compute(db: Database, strong: int = STRONG_WEIGHT, min_games: int = MIN_STRONG_GAMES, top: int = TOP_PAIRS) -> dict:
+    """Compute the report from the current catalog."""
+    try:
+        seq = db.last_change_seq()
+        games = db.con.execute("SELECT cognitive_categories, cognitive_functions FROM games").fetchall()
+        tags = [
+            (table, tag_id, name)
+            for table in TAG_TABLES
+            for tag_id, name in db.con.execute(f"SELECT id, name FROM {table} ORDER BY id")
+        ]
+    except sqlite3.Error as e:
+        raise DatabaseError(f"An error occurred with the database: {e}") from e
+
+    columns = {(table, tag_id): column for column, (table, tag_id, _) in enumerate(tags)}
+    cells_rows, cells_columns, cells_weights = [], [], []
+    for row, game in enumerate(games):
+        for table, game_tags in zip(TAG_TABLES, game):
+            for tag_id, weight in json.loads(game_tags or "[]"):
+                # Tags which do not exist anymore are left out
+                column = columns.get((table, tag_id))
+                if column is not None:
+                    cells_rows.append(row)
+                    cells_columns.append(column)
+                    cells_weights.append(weight)
+    weights = np.zeros((len(games), len(tags)), dtype=np.float32)
+    weights[cells_rows, cells_columns] = cells_weights
+    tagged = np.zeros((len(games), len(tags)), dtype=bool)
+    tagged[cells_rows, cells_columns] = True
+
+    counts = tagged.sum(axis=0)
+    strong_counts = (weights >= strong).sum(axis=0)
+    coverage = weights.sum(axis=0) / max(len(games), 1)
+    mean_weights = np.divide(weights.sum(axis=0), counts, out=np.zeros(len(tags), dtype=np.float32), where=counts > 0)
+    kinds = np.array([TAG_TABLES.index(table) for table, _, _ in tags], dtype=np.intp)
+    kind_means = np.array([coverage[kinds == kind].mean() if (kinds == kind).any() else 0 for kind in range(2)])
+    representation = np.divide(
+        coverage, kind_means[kinds], out=np.zeros(len(tags), dtype=np.float64), where=kind_means[kinds] > 0
+    )
+
+    together = tagged.T.astype(np.float32) @ tagged.astype(np.float32)
+    either = counts[:, None] + counts[None, :] - together
+    jaccard = np.divide(together, either, out=np.zeros_like(together), where=either > 0)
+    rarer = np.minimum(counts[:, None], counts[None, :])
+    conditional = np.divide(together, rarer, out=np.zeros_like(together), where=rarer > 0)
+    first, second = np.triu_indices(len(tags), k=1)
+    shared = together[first, second] > 0
+    first, second = first[shared], second[shared]
+    order = np.lexsort((-together[first, second], -jaccard[first, second]))[:top]
+
+    def tag(column: int) -> dict:
+        table, tag_id, name = tags[column]
+        return {"table": table, "id": tag_id, "name": name}
+
+    report = {
+        "seq": seq,
+        "games": len(games),
+        "strong_weight": strong,
+        "min_strong_games": min_games,
+        "coverage": {table: [] for table in TAG_TABLES},
+        "gaps": {table: [] for table in TAG_TABLES},
+        "co_occurrence": [
+            {
+                "first": tag(first[i]),
+                "second": tag(second[i]),
+                "games": int(together[first[i], second[i]]),
+                "jaccard": round(float(jaccard[first[i], second[i]]), 3),
+                "conditional": round(float(conditional[first[i], second[i]]), 3),
+            }
+            for i in order
+        ],
+    }
+    for column in np.lexsort((np.arange(len(tags)), -coverage)):
+        table, tag_id, name = tags[column]
+        entry = {
+            "id": tag_id,
+            "name": name,
+            "games": int(counts[column]),
+            "strong_games": int(strong_counts[column]),
+            "weighted_coverage": round(float(coverage[column]), 3),
+            "mean_weight": round(float(mean_weights[column]), 2),
+            "representation": round(float(representation[column]), 2),
+        }
+        if representation[column] >= OVER_REPRESENTED:
+            entry["status"] = "over"
+        elif representation[column] <= UNDER_REPRESENTED:
+            entry["status"] = "under"
+        report["coverage"][table].append(entry)
+        if strong_counts[column] < min_games:
+            report["gaps"][table].append({"id": tag_id, "name": name, "strong_games": int(strong_counts[column])})
+    logger.info("Computed the analytics of %d games and %d tags", len(games), len(tags))
+    return report
+
+
+def report(
+    db: Database,
+    strong: int = STRONG_WEIGHT,
+    min_games: int = MIN_STRONG_GAMES,
+    top: int = TOP_PAIRS,
+    refresh: bool = False,
+) -> dict:
+    """The stored report if nothing changed since it was computed with the same parameters, else a new one."""
+    parameters = json.dumps({"strong": strong, "min_games": min_games, "top": top})
+    try:
+        row = db.con.execute(
+            "SELECT seq, parameters, value FROM reports WHERE name = ?", (REPORT_NAME,)
+        ).fetchone()
+        if not refresh and row and row[:2] == (db.last_change_seq(), parameters):
+            return json.loads(row[2])
+        result = compute(db, strong, min_games, top)
+        if not db.read_only:
+            with db.con:
+                db.con.execute(
+                    "INSERT OR REPLACE INTO reports (name, seq, parameters, value) VALUES (?, ?, ?, ?)",
+                    (REPORT_NAME, result["seq"], parameters, json.dumps(result)),
+                )
+    except sqlite3.Error as e:
+        raise DatabaseError(f"An error occurred with the database: {e}") from e
+    return result
@@ -0,0 +1,389 @@
+"""
+Online snapshots of the catalog: the database and the images its games reference.
+
+    backups/
+        20261019-153000/
+            catalog.db
+            manifest.json
+        images/ab/ab12...ef.png     content-addressed, shared by every snapshot
+        hashes.json                 hashes of the source images by size and mtime, to only hash changed files
+
+The database is copied with the SQLite online backup API, a few pages at a time with a pause in between,
+so the application keeps reading and writing meanwhile. An image is only copied if no snapshot has it yet.
+A snapshot is written to a temporary directory first: an interrupted backup never looks like a complete one.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+from urllib.request import pathname2url
+
+from image_store import BLOB_PREFIX
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIR = "backups"
+DATABASE_FILE = "catalog.db"
+MANIFEST_FILE = "manifest.json"
+IMAGES_DIR = "images"
+HASHES_FILE = "hashes.json"
+PARTIAL_SUFFIX = ".partial"
+NAME_FORMAT = "%Y%m%d-%H%M%S"
+
+PAGES_PER_STEP = 64
+STEP_PAUSE = 0.005
+
+KEEP_LAST = 10
+KEEP_DAILY = 7
+KEEP_WEEKLY = 4
+# Seconds without a write after which a temporary snapshot directory is left by an interrupted backup, not a running one
+PARTIAL_MAX_AGE = 60 * 60
+
+
+class BackupError(Exception):
+    pass
+
+
+@dataclass(slots=True)
+class Snapshot:
+    name: str
+    path: str
+    created_at: datetime
+
+    def manifest(self) -> dict:
+        with open(os.path.join(self.path, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+
+
+def default_backup_dir(db_file: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), DEFAULT_DIR)
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _image_path(db_file: str, image: str) -> str:
+    """Images are stored as given by the user: relative paths are relative to the database directory."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), image)
+
+
+def _blob_path(backup_dir: str, digest: str, image: str) -> str:
+    extension = os.path.splitext(image)[1].lower()
+    return os.path.join(backup_dir, IMAGES_DIR, digest[:2], digest + extension)
+
+
+def _connect_read_only(path: str) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True)
+
+
+def _copy_atomically(source: str, destination: str):
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    temporary = destination + PARTIAL_SUFFIX
+    shutil.copyfile(source, temporary)
+    os.replace(temporary, destination)
+
+
+class _HashCache:
+    """sha256 of files by path, trusted as long as their size and mtime did not change."""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.entries: dict[str, list] = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def hash(self, path: str) -> str:
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        digest = file_hash(path)
+        self.entries[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def save(self):
+        temporary = self.path + PARTIAL_SUFFIX
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(temporary, self.path)
+
+
+def create_snapshot(
+    db_file: str,
+    backup_dir: str = None,
+    pages: int = PAGES_PER_STEP,
+    pause: float = STEP_PAUSE,
+    progress: Callable[[int, int], None] = None,
+    now: datetime = None,
+) -> Snapshot:
+    """
+    Snapshot the database and its images while they may be in use. Safe to call from a worker thread.
+
+    `progress(remaining, total)` is called with page counts after each step of the database copy.
+    """
+    backup_dir = backup_dir or default_backup_dir(db_file)
+    now = now or datetime.now()
+    os.makedirs(backup_dir, exist_ok=True)
+    name = now.strftime(NAME_FORMAT)
+    suffix = 1
+    while os.path.exists(os.path.join(backup_dir, name)):
+        name = f"{now.strftime(NAME_FORMAT)}-{suffix}"
+        suffix += 1
+    path = os.path.join(backup_dir, name)
+    partial = path + PARTIAL_SUFFIX
+    os.makedirs(partial)
+    logger.info("Backing up %s to %s", db_file, path)
+
+    try:
+        copy_file = os.path.join(partial, DATABASE_FILE)
+        source = _connect_read_only(db_file)
+        copy = sqlite3.connect(copy_file)
+        try:
+            source.backup(
+                copy,
+                pages=pages,
+                progress=(lambda status, remaining, total: progress(remaining, total)) if progress else None,
+                sleep=pause,
+            )
+            # The images referenced by the copy are the consistent set, whatever changed since. Those stored in the
+            # database are in the copy already, except the originals left in their files.
+            images = [
+                row[0]
+                for row in copy.execute(
+                    f"""
+                    SELECT image FROM games WHERE image <> '' AND image NOT LIKE '{BLOB_PREFIX}%'
+                    UNION SELECT name FROM images WHERE original IS NULL
+                    ORDER BY 1
+                    """
+                )
+            ]
+            schema_version = copy.execute("PRAGMA user_version").fetchone()[0]
+            game_count = copy.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+        finally:
+            copy.close()
+            source.close()
+
+        hashes = _HashCache(os.path.join(backup_dir, HASHES_FILE))
+        manifest_images, missing, copied = {}, [], 0
+        for image in images:
+            image_path = _image_path(db_file, image)
+            if not os.path.isfile(image_path):
+                missing.append(image)
+                continue
+            digest = hashes.hash(image_path)
+            blob = _blob_path(backup_dir, digest, image)
+            if not os.path.exists(blob):
+                _copy_atomically(image_path, blob)
+                copied += 1
+            manifest_images[image] = digest
+        hashes.save()
+        if missing:
+            logger.warning("%d images referenced by the catalog are missing: %s", len(missing), ", ".join(missing))
+
+        manifest = {
+            "created_at": now.isoformat(timespec="seconds"),
+            "source": os.path.abspath(db_file),
+            "database": {"file": DATABASE_FILE, "sha256": file_hash(copy_file), "size": os.path.getsize(copy_file)},
+            "schema_version": schema_version,
+            "games": game_count,
+            "images": manifest_images,
+            "missing_images": missing,
+        }
+        with open(os.path.join(partial, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(partial, path)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    logger.info("Backed up %d games and %d images, %d of them new", game_count, len(manifest_images), copied)
+    return Snapshot(name, path, now)
+
+
+def list_snapshots(backup_dir: str) -> list[Snapshot]:
+    """Complete snapshots, oldest first."""
+    snapshots = []
+    if not os.path.isdir(backup_dir):
+        return snapshots
+    for name in os.listdir(backup_dir):
+        path = os.path.join(backup_dir, name)
+        if name.endswith(PARTIAL_SUFFIX) or not os.path.isfile(os.path.join(path, MANIFEST_FILE)):
+            continue
+        try:
+            created_at = datetime.strptime(name[: len("YYYYmmdd-HHMMSS")], NAME_FORMAT)
+        except ValueError:
+            continue
+        snapshots.append(Snapshot(name, path, created_at))
+    return sorted(snapshots, key=lambda snapshot: (snapshot.created_at, snapshot.name))
+
+
+def find_snapshot(backup_dir: str, name: str = None) -> Snapshot:
+    """The snapshot with the given name, or the latest one."""
+    snapshots = list_snapshots(backup_dir)
+    if name is None and snapshots:
+        return snapshots[-1]
+    for snapshot in snapshots:
+        if snapshot.name == name:
+            return snapshot
+    raise BackupError(f"No snapshot {name} in {backup_dir}" if name else f"No snapshot in {backup_dir}")
+
+
+def _integrity_problems(db_file: str) -> list[str]:
+    con = _connect_read_only(db_file)
+    try:
+        result = [row[0] for row in con.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as e:
+        return [f"database: {e}"]
+    finally:
+        con.close()
+    return [] if result == ["ok"] else [f"database: {message}" for message in result]
+
+
+def verify_snapshot(snapshot: Snapshot, backup_dir: str = None) -> list[str]:
+    """Check the snapshot against its manifest. Returns the problems found, none if it can be restored."""
+    backup_dir = backup_dir or os.path.dirname(snapshot.path)
+    try:
+        manifest = snapshot.manifest()
+    except (OSError, ValueError) as e:
+        return [f"manifest: {e}"]
+    db_file = os.path.join(snapshot.path, manifest["database"]["file"])
+    if not os.path.isfile(db_file):
+        return ["database: missing"]
+    if file_hash(db_file) != manifest["database"]["sha256"]:
+        return ["database: checksum mismatch"]
+    problems = _integrity_problems(db_file)
+    for image, digest in manifest["images"].items():
+        blob = _blob_path(backup_dir, digest, image)
+        if not os.path.isfile(blob):
+            problems.append(f"image {image}: missing")
+        elif file_hash(blob) != digest:
+            problems.append(f"image {image}: checksum mismatch")
+    return problems
+
+
+def restore_snapshot(snapshot: Snapshot, db_file: str, backup_dir: str = None, verify: bool = True) -> dict:
+    """
+    Replace the database and its images by the snapshot.
+
+    The snapshot is verified first, and nothing is touched if it is damaged. The database is restored through the
+    backup API, so connections left open on it see the restored content. Images are only copied if they differ.
+    """
+    backup_dir = backup_dir or os.path.dirname(snapshot.path)
+    if verify:
+        problems = verify_snapshot(snapshot, backup_dir)
+        if problems:
+            raise BackupError(f"Snapshot {snapshot.name} is damaged: " + "; ".join(problems))
+    manifest = snapshot.manifest()
+    logger.info("Restoring %s from %s", db_file, snapshot.path)
+
+    source = _connect_read_only(os.path.join(snapshot.path, manifest["database"]["file"]))
+    target = sqlite3.connect(db_file)
+    try:
+        source.backup(target, pages=PAGES_PER_STEP, sleep=STEP_PAUSE)
+        game_count = target.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+
+    restored = 0
+    for image, digest in manifest["images"].items():
+        image_path = _image_path(db_file, image)
+        if os.path.isfile(image_path) and file_hash(image_path) == digest:
+            continue
+        _copy_atomically(_blob_path(backup_dir, digest, image), image_path)
+        restored += 1
+
+    problems = _integrity_problems(db_file)
+    if game_count != manifest["games"]:
+        problems.append(f"{game_count} games restored instead of {manifest['games']}")
+    if problems:
+        raise BackupError("The restored database does not match the snapshot: " + "; ".join(problems))
+    return {"snapshot": snapshot.name, "games": game_count, "images_restored": restored}
+
+
+def _kept_snapshots(snapshots: list[Snapshot], keep_last: int, keep_daily: int, keep_weekly: int) -> set[str]:
+    """The snapshots to keep: the last ones, and the latest one of each recent day and week."""
+    newest_first = sorted(snapshots, key=lambda snapshot: (snapshot.created_at, snapshot.name), reverse=True)
+    kept = {snapshot.name for snapshot in newest_first[:keep_last]}
+    for count, period in (
+        (keep_daily, lambda date: date.date()),
+        (keep_weekly, lambda date: date.isocalendar()[:2]),
+    ):
+        periods = set()
+        for snapshot in newest_first:
+            key = period(snapshot.created_at)
+            if key in periods:
+                continue
+            if len(periods) >= count:
+                break
+            periods.add(key)
+            kept.add(snapshot.name)
+    return kept
+
+
+def _last_write(directory: str) -> float:
+    """Latest modification time of the directory and its files, 0 if it was removed meanwhile."""
+    try:
+        with os.scandir(directory) as entries:
+            return max([os.path.getmtime(directory), *(entry.stat().st_mtime for entry in entries)])
+    except FileNotFoundError:
+        return 0
+
+
+def prune_snapshots(
+    backup_dir: str, keep_last: int = KEEP_LAST, keep_daily: int = KEEP_DAILY, keep_weekly: int = KEEP_WEEKLY
+) -> list[str]:
+    """
+    Delete the snapshots out of the retention rules, and the images no remaining snapshot references. Safe to call
+    while a backup is running: its temporary directory and the images are left alone then.
+
+    Returns the names of the deleted snapshots.
+    """
+    snapshots = list_snapshots(backup_dir)
+    kept = _kept_snapshots(snapshots, keep_last, keep_daily, keep_weekly)
+    removed = []
+    for snapshot in snapshots:
+        if snapshot.name not in kept:
+            logger.info("Deleting snapshot %s", snapshot.name)
+            shutil.rmtree(snapshot.path)
+            removed.append(snapshot.name)
+
+    # Left by interrupted backups. A recent one is a backup running meanwhile, whose images are not referenced by
+    # a manifest yet: they are kept until it is done.
+    running = False
+    for name in os.listdir(backup_dir):
+        partial = os.path.join(backup_dir, name)
+        if not name.endswith(PARTIAL_SUFFIX) or not os.path.isdir(partial):
+            continue
+        if time.time() - _last_write(partial) > PARTIAL_MAX_AGE:
+            shutil.rmtree(partial, ignore_errors=True)
+        else:
+            running = True
+    if running:
+        logger.info("A backup is running, its images are kept")
+        return removed
+
+    referenced = set()
+    for snapshot in list_snapshots(backup_dir):
+        images = snapshot.manifest()["images"]
+        referenced.update(_blob_path(backup_dir, digest, image) for image, digest in images.items())
+    images_dir = os.path.join(backup_dir, IMAGES_DIR)
+    for directory, _, files in os.walk(images_dir):
+        for file in files:
+            path = os.path.join(directory, file)
+            if path not in referenced:
+                os.remove(path)
+    return removed
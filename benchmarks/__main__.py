@@ -0,0 +1,55 @@
+"""
+Benchmark every Database operation on synthetic catalogs.
+
+Usage:
+    python3 -m benchmarks --sizes 1k 10k --output results.json
+    python3 -m benchmarks --compare baseline.json
+
+The results are printed as JSON on stdout (or written to --output). With --compare, the medians are compared to a
+saved run, a table is printed on stderr, and the exit code is 1 if any operation regressed by more than --threshold.
+"""
+
+import argparse
+import json
+import sys
+
+from benchmarks.catalog import SIZES
+from benchmarks.suite import compare, run
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python3 -m benchmarks", description="Benchmark the Database operations.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["1k", "10k"], help="catalog sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per operation")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the catalog generator")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown counted as a regression")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat, args.seed)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if not args.compare:
+        return 0
+
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    comparison = compare(results, baseline, args.threshold)
+    for entry in comparison:
+        flag = "REGRESSION" if entry["regression"] else ""
+        print(
+            f"{entry['size']:>5} {entry['operation']:<45}"
+            f"{entry['baseline'] * 1000:10.3f} ms {entry['current'] * 1000:10.3f} ms {entry['ratio']:6.2f}x {flag}",
+            file=sys.stderr,
+        )
+    return 1 if any(entry["regression"] for entry in comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Deterministic synthetic catalogs for the benchmarks.
+
+The same size and seed always produce the same database. Tags follow a Zipf-like popularity, so a few categories
+and functions are on most games while the others are rare, and weights are skewed towards the middle-high range,
+as in real game banks.
+"""
+
+import json
+import random
+
+from database import Database
+from models import Material, title_key
+
+SIZES: dict[str, int] = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+CATEGORY_COUNT = 12
+FUNCTION_COUNT = 30
+
+_WORDS = [
+    "memory", "dobble", "tower", "cards", "puzzle", "color", "shape", "word", "story", "sound",
+    "speed", "match", "chain", "maze", "logic", "quest", "rhythm", "mirror", "secret", "garden",
+]  # fmt: skip
+
+
+def _zipf_sample(rng: random.Random, count: int, population: int) -> list[int]:
+    """Pick `count` distinct IDs in [1, population], the lower IDs being much more frequent."""
+    weights = [1 / rank for rank in range(1, population + 1)]
+    picked: set[int] = set()
+    while len(picked) < count:
+        picked.add(rng.choices(range(1, population + 1), weights)[0])
+    return sorted(picked)
+
+
+def _weight(rng: random.Random) -> int:
+    return round(rng.triangular(0, 10, 7))
+
+
+def generate_games(size: int, seed: int = 0) -> list[tuple]:
+    """Rows for the games table, in the column order of the INSERT in `generate_catalog`."""
+    rng = random.Random(seed)
+    materials = [material.name for material in Material]
+    rows = []
+    for i in range(size):
+        title = f"{rng.choice(_WORDS).capitalize()} {rng.choice(_WORDS)} {i}"
+        categories = [(cat_id, _weight(rng)) for cat_id in _zipf_sample(rng, rng.randint(1, 3), CATEGORY_COUNT)]
+        functions = [(func_id, _weight(rng)) for func_id in _zipf_sample(rng, rng.randint(1, 6), FUNCTION_COUNT)]
+        game_materials = rng.sample(materials, rng.choices([1, 2, 3], [6, 3, 1])[0])
+        rows.append(
+            (
+                title,
+                " ".join(rng.choices(_WORDS, k=rng.randint(10, 60))),
+                json.dumps(functions),
+                json.dumps(categories),
+                json.dumps(game_materials),
+                f"images/{i}.png" if rng.random() < 0.7 else None,
+                title_key(title),
+            )
+        )
+    return rows
+
+
+def generate_catalog(db: Database, size: int, seed: int = 0):
+    """Fill an empty, set up database with a synthetic catalog of `size` games."""
+    db.con.executemany(
+        "INSERT INTO cognitive_categories (name) VALUES (?)",
+        [(f"Category {i}",) for i in range(1, CATEGORY_COUNT + 1)],
+    )
+    db.con.executemany(
+        "INSERT INTO cognitive_functions (name) VALUES (?)",
+        [(f"Function {i}",) for i in range(1, FUNCTION_COUNT + 1)],
+    )
+    db.con.executemany(
+        """
+        INSERT INTO games (
+            title, description, cognitive_functions,
+            cognitive_categories, materials, image, title_key)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        generate_games(size, seed),
+    )
+    db.con.commit()
@@ -0,0 +1,47 @@
+"""
+Compare hydrating games as validated pydantic models and as trusted records.
+
+Usage: python3 -m benchmarks.hydration [number of games]
+"""
+
+import sys
+import time
+import tracemalloc
+
+from benchmarks.catalog import generate_catalog
+from database import Database, Projection
+from models import Game, GameRecord
+
+
+def _validated(records: list[GameRecord]) -> list[Game]:
+    # What hydration cost before trusted records: every row went through pydantic validation
+    return [Game.model_validate(record) for record in records]
+
+
+def _measure(label: str, build, count: int):
+    start = time.perf_counter()
+    build()
+    duration = time.perf_counter() - start
+
+    tracemalloc.start()
+    games = build()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del games
+
+    print(f"{label:<12}{count / duration:12.0f} games/s{memory / count:12.0f} bytes/game")
+
+
+def main(count: int = 10_000):
+    db = Database(file=":memory:")
+    db.setup()
+    generate_catalog(db, count)
+    rows = db.con.execute(f"SELECT {Projection.FULL.value} FROM games").fetchall()
+
+    print(f"Hydrating {count} games")
+    _measure("records", lambda: db._games_from_rows(rows, Projection.FULL), count)
+    _measure("validated", lambda: _validated(db._games_from_rows(rows, Projection.FULL)), count)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,130 @@
+"""
+Load test of the HTTP API (server.py).
+
+Usage:
+    python3 -m benchmarks.load_test --size 10k --requests 2000 --concurrency 16
+    python3 -m benchmarks.load_test --url http://192.168.1.10:8080 --requests 500
+
+Without --url, a server is started in this process over a generated catalog.
+The requests per second and the latency percentiles are printed as JSON on stdout.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from benchmarks.catalog import SIZES, CATEGORY_COUNT, FUNCTION_COUNT, generate_catalog
+from database import Database
+
+
+def _paths(count: int, game_count: int, seed: int) -> list[str]:
+    """A mix of the requests made by a browsing client: mostly searches, then details and facets."""
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.5:
+            query = [f"category={rng.randint(1, CATEGORY_COUNT)}"]
+            if rng.random() < 0.5:
+                query.append(f"function={rng.randint(1, FUNCTION_COUNT)}")
+            query.append(f"offset={rng.choice((0, 50, 100))}")
+            paths.append("/api/games?" + "&".join(query))
+        elif kind < 0.8:
+            paths.append(f"/api/games/{rng.randint(1, game_count)}")
+        elif kind < 0.95:
+            paths.append(f"/api/facets?category={rng.randint(1, CATEGORY_COUNT)}")
+        else:
+            paths.append("/api/taxonomy")
+    return paths
+
+
+def _percentile(sorted_values: list[float], fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run(url: str, paths: list[str], concurrency: int) -> dict:
+    parts = urlsplit(url)
+    local = threading.local()
+    errors = 0
+    errors_lock = threading.Lock()
+
+    def fetch(path: str) -> float:
+        nonlocal errors
+        if not hasattr(local, "connection"):
+            local.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        start = time.perf_counter()
+        local.connection.request("GET", path, headers={"Accept-Encoding": "gzip"})
+        response = local.connection.getresponse()
+        response.read()
+        duration = time.perf_counter() - start
+        if response.status not in (200, 404):
+            with errors_lock:
+                errors += 1
+        return duration
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = sorted(executor.map(fetch, paths))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(paths),
+        "concurrency": concurrency,
+        "errors": errors,
+        "requests_per_second": len(paths) / elapsed,
+        "latency_ms": {
+            "mean": statistics.fmean(latencies) * 1000,
+            "p50": _percentile(latencies, 0.50) * 1000,
+            "p95": _percentile(latencies, 0.95) * 1000,
+            "p99": _percentile(latencies, 0.99) * 1000,
+            "max": latencies[-1] * 1000,
+        },
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python3 -m benchmarks.load_test", description="Load test the HTTP API.")
+    parser.add_argument("--url", help="server to test, instead of starting one over a generated catalog")
+    parser.add_argument("--size", choices=list(SIZES), default="10k", help="size of the generated catalog")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16, help="simultaneous clients")
+    parser.add_argument("--workers", type=int, default=8, help="worker threads of the started server")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.url:
+        paths = _paths(args.requests, SIZES[args.size], args.seed)
+        print(json.dumps(run(args.url, paths, args.concurrency), indent=2))
+        return 0
+
+    import server
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_file = os.path.join(directory, "catalog.db")
+        db = Database(file=db_file)
+        db.setup()
+        generate_catalog(db, SIZES[args.size], args.seed)
+        db.con.close()
+        httpd = server.make_server(db_file, port=0, workers=args.workers)
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = f"http://127.0.0.1:{httpd.server_address[1]}"
+            paths = _paths(args.requests, SIZES[args.size], args.seed)
+            print(json.dumps(run(url, paths, args.concurrency), indent=2))
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
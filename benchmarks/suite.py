@@ -0,0 +1,204 @@
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from typing import Callable
+
+import planner
+import query_language
+import saved_searches
+from bitmap_index import GameIndex
+from benchmarks.catalog import SIZES, CATEGORY_COUNT, FUNCTION_COUNT, generate_catalog
+from database import Database, Projection
+from models import Game, Material
+
+# Keyword arguments of get_games_with_filters for each benchmarked filter combination
+FILTERS: dict[str, dict] = {
+    "none": {},
+    "title": {"game_title": "me"},
+    "category": {"cognitive_categories_ids": [1]},
+    "rare_category": {"cognitive_categories_ids": [CATEGORY_COUNT]},
+    "functions": {"cognitive_functions_ids": [2, 5]},
+    "material": {"materials": [Material.TACTILE]},
+    "combined": {
+        "game_title": "me",
+        "cognitive_categories_ids": [1, 2],
+        "cognitive_functions_ids": [1],
+        "materials": [Material.VISUAL],
+    },
+}
+
+# Queries of the search language, benchmarked as typed in the search box
+QUERIES: dict[str, str] = {
+    "words": "maze tower",
+    "combined": 'func:"function 1">=7 cat:"category 2" mat:VISUAL -mat:VERBAL (maze OR tower)',
+}
+
+BULK_INSERT_SIZE = 100
+
+
+def _stats(durations: list[float]) -> dict[str, float]:
+    return {
+        "min": min(durations),
+        "median": statistics.median(durations),
+        "mean": statistics.fmean(durations),
+        "repeat": len(durations),
+    }
+
+
+def _time(func: Callable[[], object], repeat: int, setup: Callable[[], object] = None) -> dict[str, float]:
+    """Run `func` `repeat` times, calling the untimed `setup` before each run."""
+    durations = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return _stats(durations)
+
+
+class _Fixture:
+    """A generated catalog on disk, and a fresh copy of it for the operations which modify it."""
+
+    def __init__(self, directory: str, size: int, seed: int):
+        self.source = os.path.join(directory, f"catalog_{size}.db")
+        db = Database(file=self.source)
+        db.setup()
+        generate_catalog(db, size, seed)
+        db.con.close()
+        self.db = Database(file=self.source)
+        self.copy_file = os.path.join(directory, f"copy_{size}.db")
+        self.copy = None
+
+    def fresh_copy(self) -> Database:
+        if self.copy:
+            self.copy.con.close()
+        target = sqlite3.connect(self.copy_file)
+        self.db.con.backup(target)
+        target.close()
+        self.copy = Database(file=self.copy_file)
+        return self.copy
+
+    def close(self):
+        self.db.con.close()
+        if self.copy:
+            self.copy.con.close()
+
+
+def benchmark_size(size: int, repeat: int = 5, seed: int = 0) -> dict[str, dict[str, float]]:
+    """Time every Database operation on a generated catalog of `size` games."""
+    rng = random.Random(seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        fixture = _Fixture(directory, size, seed)
+        db = fixture.db
+        ids = db.get_all_games(projection=Projection.IDS)
+        titles = [title for _, title in db.get_all_games(projection=Projection.TITLES)]
+
+        for name, filters in FILTERS.items():
+            results[f"get_games_with_filters[{name}]"] = _time(lambda: db.get_games_with_filters(**filters), repeat)
+            results[f"get_games_with_filters[{name},ids]"] = _time(
+                lambda: db.get_games_with_filters(**filters, projection=Projection.IDS), repeat
+            )
+
+        for name, text in QUERIES.items():
+            results[f"compile_query[{name}]"] = _time(lambda: query_language.compile_query(text), repeat * 20)
+            results[f"get_games_with_filters[query:{name},ids]"] = _time(
+                lambda: db.get_games_with_filters(search_query=text, projection=Projection.IDS), repeat
+            )
+            # The same query saved: its games are read from the stored result
+            saved_searches.save(db, name, text)
+            results[f"saved_searches.games[{name},ids]"] = _time(
+                lambda: saved_searches.games(db, name, Projection.IDS), repeat
+            )
+
+        index = GameIndex(db, follow=False)
+        for name, filters in FILTERS.items():
+            results[f"GameIndex.get_games_with_filters[{name},ids]"] = _time(
+                lambda: index.get_games_with_filters(**filters, projection=Projection.IDS), repeat
+            )
+        results["GameIndex.build"] = _time(lambda: GameIndex(db, follow=False), repeat)
+
+        game_repeat = repeat * 20
+        results["get_game[id]"] = _time(lambda: db.get_game(game_id=rng.choice(ids)), game_repeat)
+        results["get_game[title]"] = _time(lambda: db.get_game(game_title=rng.choice(titles)), game_repeat)
+        results["search_game_titles"] = _time(lambda: db.search_game_titles(rng.choice(titles)[:2]), game_repeat)
+
+        for projection in Projection:
+            results[f"get_all_games[{projection.name.lower()}]"] = _time(
+                lambda: db.get_all_games(projection=projection), repeat
+            )
+
+        goals = planner.targets({function_id: 7 for function_id in range(1, 9)})
+        results["plan_session[greedy]"] = _time(lambda: planner.plan_session(db, goals, exact=False), repeat)
+        results["plan_session[exact]"] = _time(lambda: planner.plan_session(db, goals), repeat)
+
+        results["get_all_cognitive_categories"] = _time(db.get_all_cognitive_categories, game_repeat)
+        results["get_all_cognitive_functions"] = _time(db.get_all_cognitive_functions, game_repeat)
+
+        # Modifying operations run on a fresh copy of the catalog each time
+        state = {}
+
+        def copy():
+            state["db"] = fixture.fresh_copy()
+
+        results["delete_cognitive_category"] = _time(
+            lambda: state["db"].delete_cognitive_category(rng.randint(1, CATEGORY_COUNT)), repeat, copy
+        )
+        results["delete_cognitive_function"] = _time(
+            lambda: state["db"].delete_cognitive_function(rng.randint(1, FUNCTION_COUNT)), repeat, copy
+        )
+        results["delete_game"] = _time(lambda: state["db"].delete_game(rng.choice(ids)), repeat, copy)
+
+        def bulk_insert():
+            for i in range(BULK_INSERT_SIZE):
+                state["db"].add_game(Game(title=f"Inserted game {i}", description="", categories=[], functions=[]))
+
+        results[f"add_game[x{BULK_INSERT_SIZE}]"] = _time(bulk_insert, repeat, copy)
+        fixture.close()
+    return results
+
+
+def run(sizes: list[str], repeat: int = 5, seed: int = 0) -> dict:
+    """Run the suite for the given catalog sizes ("1k", "10k", "100k") and return machine-readable results."""
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": {size: benchmark_size(SIZES[size], repeat, seed) for size in sizes},
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float = 0.2) -> list[dict]:
+    """
+    Compare the median durations of two runs.
+
+    Returns one entry per operation found in both, flagged as a regression when it is
+    more than `threshold` (relative) slower than the baseline.
+    """
+    comparison = []
+    for size, operations in current["results"].items():
+        for operation, stats in operations.items():
+            base = baseline["results"].get(size, {}).get(operation)
+            if not base or not base["median"]:
+                continue
+            ratio = stats["median"] / base["median"]
+            comparison.append(
+                {
+                    "size": size,
+                    "operation": operation,
+                    "baseline": base["median"],
+                    "current": stats["median"],
+                    "ratio": ratio,
+                    "regression": ratio > 1 + threshold,
+                }
+            )
+    return comparison
@@ -0,0 +1,371 @@
+"""
+In-memory inverted index of the game filters, for searches answered without querying SQLite.
+
+Each category and function has a bitmap of the IDs of its games per weight, and each material a bitmap of its games.
+A bitmap is a Python int whose bit N is set when game N is in it, so that:
+
+- "any of these categories" is the OR of their bitmaps, "with at least this weight" only ORs the weights above,
+- combining the category, function and material filters is an AND of those unions,
+- counting the matching games is a popcount, and the facets one AND and popcount per tag.
+
+Each trigram of the title keys also has a bitmap. A search query made only of words and phrases, which is what is
+typed in the search box, ANDs the bitmaps of their trigrams, then checks the few games left against the title keys
+kept in memory, so that typing reads nothing from SQLite. This costs a bitmap per distinct trigram, a few MB for
+10k games. Other queries, and the `game_title` filter, are answered by SQLite, and the bitmap of the last one is kept,
+so that toggling the other filters reads nothing. Only the page of games finally shown is read from the database.
+
+The index follows the change feed: each changed game is removed from the bitmaps it was in and added to its new ones,
+instead of rebuilding the index.
+"""
+
+import json
+import logging
+import sqlite3
+from typing import Callable, Iterable, Optional
+
+from database import Database, DatabaseError, Projection
+from models import Change, Material
+from query_language import title_terms
+
+logger = logging.getLogger(__name__)
+
+TAG_TABLES = ("cognitive_categories", "cognitive_functions")
+
+# Positions of the bits set in each byte, to list the IDs of a bitmap
+_BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+
+def bitmap_ids(bitmap: int, offset: int = 0, limit: int = None) -> list[int]:
+    """The IDs of the bitmap in increasing order, skipping the first `offset` ones."""
+    ids = []
+    end = None if limit is None else offset + limit
+    count = 0
+    for index, byte in enumerate(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")):
+        if not byte:
+            continue
+        for bit in _BYTE_BITS[byte]:
+            if count >= offset:
+                ids.append(index * 8 + bit)
+            count += 1
+            if count == end:
+                return ids
+    return ids
+
+
+def trigrams(key: str) -> set[str]:
+    """The substrings of 3 characters of the title key, or the key itself if shorter."""
+    if len(key) < 3:
+        return {key} if key else set()
+    return {key[start : start + 3] for start in range(len(key) - 2)}
+
+
+def ids_bitmap(ids: Iterable[int]) -> int:
+    """The bitmap of these IDs."""
+    ids = list(ids)
+    buffer = bytearray((max(ids, default=0) >> 3) + 1)
+    for game_id in ids:
+        buffer[game_id >> 3] |= 1 << (game_id & 7)
+    return int.from_bytes(buffer, "little")
+
+
+class _Entry:
+    """What the index knows of a game, to remove it from its bitmaps."""
+
+    __slots__ = ("tags", "materials", "title_key")
+
+    def __init__(self, tags: tuple[tuple[str, int, int], ...], materials: tuple[str, ...], title_key: str):
+        self.tags = tags
+        self.materials = materials
+        self.title_key = title_key
+
+
+class GameIndex:
+    """
+    Bitmaps of the games of each tag weight and material, answering `get_games_with_filters`.
+
+    With `follow`, writes made through `db` update the index as soon as they are committed. Changes made by other
+    connections are applied before each query.
+    """
+
+    def __init__(self, db: Database, follow: bool = True):
+        self.db = db
+        self.seq = 0
+        self.entries: dict[int, _Entry] = {}
+        self.all = 0
+        # Bitmap by weight, by tag ID, by table
+        self.tags: dict[str, dict[int, dict[int, int]]] = {table: {} for table in TAG_TABLES}
+        self.materials: dict[str, int] = {}
+        self.trigrams: dict[str, int] = {}
+        # (title, change feed seq, bitmap) of the last title searched
+        self._title: Optional[tuple[str, int, int]] = None
+        # (query, include_descendants, change feed seq, bitmap) of the last query searched
+        self._query: Optional[tuple[str, bool, int, int]] = None
+        self._unsubscribe: Optional[Callable[[], None]] = None
+        self.load()
+        if follow:
+            self._unsubscribe = db.subscribe(self.apply)
+
+    def close(self):
+        if self._unsubscribe:
+            self._unsubscribe()
+            self._unsubscribe = None
+
+    def load(self):
+        """Build the bitmaps from every game, setting the bits in byte arrays before turning them into ints."""
+        self.seq = self.db.last_change_seq()
+        self.entries.clear()
+        rows = self._read()
+        size = (max((row[0] for row in rows), default=0) >> 3) + 1
+        buffers: dict[tuple, bytearray] = {}
+
+        def set_bit(key: tuple, game_id: int):
+            buffer = buffers.get(key)
+            if buffer is None:
+                buffer = buffers[key] = bytearray(size)
+            buffer[game_id >> 3] |= 1 << (game_id & 7)
+
+        for row in rows:
+            entry = self._entry(row)
+            self.entries[row[0]] = entry
+            set_bit(("all",), row[0])
+            for table, tag_id, weight in entry.tags:
+                set_bit((table, tag_id, weight), row[0])
+            for material in entry.materials:
+                set_bit(("material", material), row[0])
+            for trigram in trigrams(entry.title_key):
+                set_bit(("trigram", trigram), row[0])
+
+        self.tags = {table: {} for table in TAG_TABLES}
+        self.materials = {}
+        self.trigrams = {}
+        self.all = 0
+        for key, buffer in buffers.items():
+            bitmap = int.from_bytes(buffer, "little")
+            if key[0] == "all":
+                self.all = bitmap
+            elif key[0] == "material":
+                self.materials[key[1]] = bitmap
+            elif key[0] == "trigram":
+                self.trigrams[key[1]] = bitmap
+            else:
+                self.tags[key[0]].setdefault(key[1], {})[key[2]] = bitmap
+        logger.info("Indexed %d games in %d bitmaps", len(self.entries), len(buffers))
+
+    def apply(self, changes: list[Change]):
+        """Move the games changed by these changes of the feed to their new bitmaps."""
+        game_ids = {change.row_id for change in changes if change.seq > self.seq and change.table == "games"}
+        if changes:
+            self.seq = max(self.seq, changes[-1].seq)
+        if not game_ids:
+            return
+        for game_id in game_ids:
+            self._remove(game_id)
+        for row in self._read(sorted(game_ids)):
+            self._add(row)
+
+    def refresh(self):
+        """Apply the changes committed by other connections since the last time."""
+        self.apply(self.db.changes_since(self.seq))
+
+    def search(
+        self,
+        game_title: str = None,
+        cognitive_categories_ids: list[int] = None,
+        cognitive_functions_ids: list[int] = None,
+        materials: list[Material] = None,
+        min_weight: int = None,
+        include_descendants: bool = False,
+        search_query: str = None,
+    ) -> int:
+        """
+        Bitmap of the games matching the filters of `get_games_with_filters`. With `min_weight`, only the categories
+        and functions given with at least that weight count.
+        """
+        self.refresh()
+        if include_descendants:
+            # The hierarchy is not indexed: the closure tables already answer it with a single lookup
+            if cognitive_categories_ids:
+                cognitive_categories_ids = self.db.get_cognitive_category_descendants(cognitive_categories_ids)
+            if cognitive_functions_ids:
+                cognitive_functions_ids = self.db.get_cognitive_function_descendants(cognitive_functions_ids)
+        result = self.all
+        for table, tag_ids in zip(TAG_TABLES, (cognitive_categories_ids, cognitive_functions_ids)):
+            if tag_ids:
+                result &= self._union(table, tag_ids, min_weight)
+        if materials:
+            union = 0
+            for material in materials:
+                union |= self.materials.get(material.name, 0)
+            result &= union
+        if game_title and result:
+            result &= self._title_bitmap(game_title)
+        if search_query and result:
+            terms = title_terms(search_query)
+            if terms is None:
+                result &= self._query_bitmap(search_query, include_descendants)
+            else:
+                result = self._terms_bitmap(terms, result)
+        return result
+
+    def count(self, **filters) -> int:
+        return self.search(**filters).bit_count()
+
+    def get_games_with_filters(
+        self,
+        game_title: str = None,
+        cognitive_categories_ids: list[int] = None,
+        cognitive_functions_ids: list[int] = None,
+        materials: list[Material] = None,
+        projection: Projection = None,
+        limit: int = None,
+        offset: int = 0,
+        include_descendants: bool = False,
+        search_query: str = None,
+    ) -> list:
+        """Same as `Database.get_games_with_filters`, ordered by ID: only the games of the page are read."""
+        bitmap = self.search(
+            game_title,
+            cognitive_categories_ids,
+            cognitive_functions_ids,
+            materials,
+            include_descendants=include_descendants,
+            search_query=search_query,
+        )
+        game_ids = bitmap_ids(bitmap, offset, limit)
+        if projection is Projection.IDS:
+            return game_ids
+        return self.db.get_games_by_ids(game_ids, projection)
+
+    def get_facets(
+        self,
+        game_title: str = None,
+        cognitive_categories_ids: list[int] = None,
+        cognitive_functions_ids: list[int] = None,
+        materials: list[Material] = None,
+        include_descendants: bool = False,
+        search_query: str = None,
+    ) -> dict:
+        """Same as `Database.get_facets`."""
+        bitmap = self.search(
+            game_title,
+            cognitive_categories_ids,
+            cognitive_functions_ids,
+            materials,
+            include_descendants=include_descendants,
+            search_query=search_query,
+        )
+        facets = {"games": bitmap.bit_count()}
+        for table in TAG_TABLES:
+            counts = {tag_id: (bitmap & self._union(table, [tag_id])).bit_count() for tag_id in self.tags[table]}
+            facets[table] = {tag_id: count for tag_id, count in counts.items() if count}
+        counts = {name: (bitmap & material).bit_count() for name, material in self.materials.items()}
+        facets["materials"] = {name: count for name, count in counts.items() if count}
+        return facets
+
+    def _union(self, table: str, tag_ids: list[int], min_weight: int = None) -> int:
+        union = 0
+        for tag_id in tag_ids:
+            for weight, bitmap in self.tags[table].get(tag_id, {}).items():
+                if min_weight is None or weight >= min_weight:
+                    union |= bitmap
+        return union
+
+    def _title_bitmap(self, game_title: str) -> int:
+        if self._title is None or self._title[:2] != (game_title, self.seq):
+            try:
+                cursor = self.db.con.execute("SELECT id FROM games WHERE title LIKE ?", (f"%{game_title}%",))
+                bitmap = ids_bitmap(row[0] for row in cursor)
+            except sqlite3.Error as e:
+                raise DatabaseError(f"An error occurred with the database: {e}") from e
+            self._title = (game_title, self.seq, bitmap)
+        return self._title[2]
+
+    def _terms_bitmap(self, terms: list[str], candidates: int) -> int:
+        """The candidates whose title key contains every term."""
+        for term in terms:
+            if len(term) < 3:
+                # Exact: any occurrence of a shorter term is within one of the trigrams
+                union = 0
+                for trigram, bitmap in self.trigrams.items():
+                    if term in trigram:
+                        union |= bitmap
+                candidates &= union
+            else:
+                for trigram in trigrams(term):
+                    candidates &= self.trigrams.get(trigram, 0)
+            if not candidates:
+                return 0
+        if all(len(term) <= 3 for term in terms):
+            return candidates
+        # The trigrams of a longer term only narrow the candidates down: they may be apart in the title
+        entries = self.entries
+        return ids_bitmap(
+            game_id
+            for game_id in bitmap_ids(candidates)
+            if all(term in entries[game_id].title_key for term in terms)
+        )
+
+    def _query_bitmap(self, search_query: str, include_descendants: bool) -> int:
+        # Weight comparisons and negations are not indexed: the query runs as a single statement in SQLite
+        key = (search_query, include_descendants, self.seq)
+        if self._query is None or self._query[:3] != key:
+            game_ids = self.db.get_games_with_filters(
+                search_query=search_query, include_descendants=include_descendants, projection=Projection.IDS
+            )
+            self._query = (*key, ids_bitmap(game_ids))
+        return self._query[3]
+
+    def _read(self, game_ids: list[int] = None) -> list[tuple]:
+        query = "SELECT id, cognitive_categories, cognitive_functions, materials, COALESCE(title_key, '') FROM games"
+        try:
+            if game_ids is None:
+                return self.db.con.execute(query).fetchall()
+            rows = []
+            for start in range(0, len(game_ids), 900):
+                chunk = game_ids[start : start + 900]
+                rows += self.db.con.execute(f"{query} WHERE id IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+            return rows
+        except sqlite3.Error as e:
+            raise DatabaseError(f"An error occurred with the database: {e}") from e
+
+    @staticmethod
+    def _entry(row: tuple) -> _Entry:
+        _, categories, functions, materials, title_key = row
+        tags = tuple(
+            (table, tag_id, weight)
+            for table, column in zip(TAG_TABLES, (categories, functions))
+            for tag_id, weight in json.loads(column or "[]")
+        )
+        return _Entry(tags, tuple(json.loads(materials or "[]")), title_key)
+
+    def _add(self, row: tuple):
+        game_id = row[0]
+        entry = self.entries[game_id] = self._entry(row)
+        bit = 1 << game_id
+        self.all |= bit
+        for table, tag_id, weight in entry.tags:
+            weights = self.tags[table].setdefault(tag_id, {})
+            weights[weight] = weights.get(weight, 0) | bit
+        for material in entry.materials:
+            self.materials[material] = self.materials.get(material, 0) | bit
+        for trigram in trigrams(entry.title_key):
+            self.trigrams[trigram] = self.trigrams.get(trigram, 0) | bit
+
+    def _remove(self, game_id: int):
+        entry = self.entries.pop(game_id, None)
+        if entry is None:
+            return
+        mask = ~(1 << game_id)
+        self.all &= mask
+        for table, tag_id, weight in entry.tags:
+            weights = self.tags[table][tag_id]
+            if weights.get(weight, 0) & ~mask:
+                weights[weight] &= mask
+                if not weights[weight]:
+                    del weights[weight]
+        for material in entry.materials:
+            self.materials[material] &= mask
+        for trigram in trigrams(entry.title_key):
+            self.trigrams[trigram] &= mask
+            if not self.trigrams[trigram]:
+                del self.trigrams[trigram]
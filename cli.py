@@ -0,0 +1,655 @@
+"""
+Headless command line interface, for scripted and bulk work on the catalog.
+
+    python3 . search --function "Working memory" --material VISUAL --format csv
+    python3 . search --query 'func:"working memory">=7 mat:VISUAL -mat:VERBAL dobble'
+    python3 . export --output catalog.jsonl
+    python3 . import catalog.jsonl
+    python3 . similar "Memory cards" --limit 5
+    python3 . plan --function "Working memory=7" --function "Inhibition=5" --material VISUAL --material VERBAL
+    python3 . stats
+    python3 . vacuum
+    python3 . maintain
+    python3 . serve --host 0.0.0.0 --port 8080
+    python3 . backup
+    python3 . restore 20261019-153000
+    python3 . sync-export --peer alice --output to_alice.zip
+    python3 . sync-import from_bob.zip
+    python3 . export-pack --output catalog.pack
+    python3 . ingest-images photos/ --mapping photos.csv
+    python3 . images --to-database --originals
+    python3 . analytics --strong 7 --min-games 3
+    python3 . collection "Young, tactile" --save 'mat:TACTILE func:attention>=6'
+    python3 . collection "Young, tactile" --fields titles
+    python3 . set-parent --function "Working memory" --parent "Executive functions"
+
+Results are streamed as JSONL (one JSON object per line) or CSV, so any catalog size can be processed.
+This module never imports tkinter, nor Pillow except to make the thumbnails of `serve`.
+
+Exit codes: 0 on success, 1 if some imported records were rejected, 2 on usage errors, 3 on database errors.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import ChainMap
+from typing import Callable, Iterable, Iterator, TextIO
+
+import serialization
+from database import Database, DatabaseError, NotFoundError, Projection
+from models import (
+    CognitiveCategory,
+    CognitiveCategoryRecord,
+    CognitiveFunction,
+    CognitiveFunctionRecord,
+    Material,
+)
+from query_language import QueryError, compile_query
+
+EXIT_OK = 0
+EXIT_REJECTED = 1
+EXIT_USAGE = 2
+EXIT_DATABASE_ERROR = 3
+
+FORMATS = ("jsonl", "csv")
+FIELDS: dict[str, Projection] = {projection.name.lower(): projection for projection in Projection}
+
+IMPORT_BATCH_SIZE = 500
+
+
+class UsageError(Exception):
+    pass
+
+
+def write_games(items: Iterable, projection: Projection, output_format: str, output: TextIO) -> int:
+    """Stream the games to `output` in the given format. Returns the number of games written."""
+    count = 0
+    if output_format == "csv":
+        writer = csv.DictWriter(output, fieldnames=serialization.CSV_FIELDS[projection], extrasaction="ignore")
+        writer.writeheader()
+        for item in items:
+            writer.writerow(serialization.to_csv_row(serialization.to_dict(item, projection)))
+            count += 1
+    else:
+        for item in items:
+            output.write(json.dumps(serialization.to_dict(item, projection), ensure_ascii=False))
+            output.write("\n")
+            count += 1
+    return count
+
+
+def read_records(source: TextIO, input_format: str) -> Iterator[tuple[int, dict]]:
+    """Yield (line number, dict) for each record. Malformed lines yield (line number, the error)."""
+    if input_format == "csv":
+        reader = csv.DictReader(source)
+        for row in reader:
+            try:
+                # DictReader fills the missing fields with None, and keeps the extra ones under the None key
+                if None in row or None in row.values():
+                    raise ValueError(f"expected {len(reader.fieldnames)} fields")
+                yield reader.line_num, serialization.from_csv_row(row)
+            except (AttributeError, TypeError, ValueError) as e:
+                yield reader.line_num, e
+        return
+    for line_number, line in enumerate(source, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, e
+
+
+def _category_ids(db: Database, names: list[str]) -> list[int]:
+    try:
+        return [db.get_cognitive_category(category_name=name).id for name in names or []]
+    except NotFoundError as e:
+        raise UsageError(str(e)) from e
+
+
+def _function_ids(db: Database, names: list[str]) -> list[int]:
+    try:
+        return [db.get_cognitive_function(function_name=name).id for name in names or []]
+    except NotFoundError as e:
+        raise UsageError(str(e)) from e
+
+
+def _open_output(path: str) -> TextIO:
+    if not path:
+        return sys.stdout
+    try:
+        return open(path, "w", newline="", encoding="utf-8")
+    except OSError as e:
+        raise UsageError(f"Cannot write {path}: {e.strerror}") from e
+
+
+def command_search(db: Database, args: argparse.Namespace) -> int:
+    projection = FIELDS[args.fields]
+    if args.query:
+        # Checked before the first game is written
+        try:
+            compile_query(args.query)
+        except QueryError as e:
+            raise UsageError(f"Invalid query: {e}") from e
+    games = db.iter_games_with_filters(
+        game_title=args.title,
+        cognitive_categories_ids=_category_ids(db, args.category),
+        cognitive_functions_ids=_function_ids(db, args.function),
+        materials=[Material[name] for name in args.material or []],
+        projection=projection,
+        include_descendants=args.descendants,
+        search_query=args.query,
+    )
+    if args.limit is not None:
+        games = (game for i, game in zip(range(args.limit), games))
+    output = _open_output(args.output)
+    try:
+        write_games(games, projection, args.format, output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return EXIT_OK
+
+
+def command_export(db: Database, args: argparse.Namespace) -> int:
+    output = _open_output(args.output)
+    try:
+        count = write_games(db.iter_games_with_filters(), Projection.FULL, args.format, output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"Exported {count} games", file=sys.stderr)
+    return EXIT_OK
+
+
+def command_import(db: Database, args: argparse.Namespace) -> int:
+    input_format = args.format or ("csv" if args.file.endswith(".csv") else "jsonl")
+    existing_titles = {title for _, title in db.get_all_games(projection=Projection.TITLES)}
+    categories = {category.name: category for category in db.get_all_cognitive_categories()}
+    functions = {function.name: function for function in db.get_all_cognitive_functions()}
+    imported = skipped = rejected = 0
+
+    def reject(line_number: int, error):
+        nonlocal rejected
+        rejected += 1
+        print(f"{args.file}:{line_number}: {error}", file=sys.stderr)
+
+    def add_category(name: str):
+        db.add_cognitive_category(CognitiveCategory(name=name))
+        return db.get_cognitive_category(category_name=name)
+
+    def add_function(name: str):
+        db.add_cognitive_function(CognitiveFunction(name=name))
+        return db.get_cognitive_function(function_name=name)
+
+    def resolve(tags: list, known: dict, add: Callable) -> list:
+        resolved = []
+        for tag, weight in tags:
+            if tag.id is None:
+                if tag.name not in known:
+                    known[tag.name] = add(tag.name)
+                tag = known[tag.name]
+            resolved.append((tag, weight))
+        return resolved
+
+    def flush(batch: list):
+        nonlocal imported
+        # The new tags are only created for the games which were accepted
+        for game in batch:
+            game.categories = resolve(game.categories, categories, add_category)
+            game.functions = resolve(game.functions, functions, add_function)
+        imported += db.add_games(batch, batch_size=IMPORT_BATCH_SIZE)
+        batch.clear()
+
+    batch = []
+    try:
+        source = sys.stdin if args.file == "-" else open(args.file, newline="", encoding="utf-8")
+    except OSError as e:
+        raise UsageError(f"Cannot read {args.file}: {e.strerror}") from e
+    try:
+        for line_number, record in read_records(source, input_format):
+            if isinstance(record, Exception):
+                reject(line_number, record)
+                continue
+            try:
+                if not isinstance(record, dict):
+                    raise TypeError(f"expected an object, got {type(record).__name__}")
+                if record.get("title") in existing_titles:
+                    skipped += 1
+                    continue
+                # Unknown tags are validated as records without ID, created by flush()
+                category_names, function_names = serialization.tag_names(record)
+                new_categories = {name: CognitiveCategoryRecord(None, name) for name in category_names}
+                new_functions = {name: CognitiveFunctionRecord(None, name) for name in function_names}
+                game = serialization.from_dict(
+                    record, ChainMap(categories, new_categories), ChainMap(functions, new_functions)
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                reject(line_number, f"invalid record: {e!r}")
+                continue
+            existing_titles.add(game.title)
+            batch.append(game)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush(batch)
+        flush(batch)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+    if imported:
+        import maintenance
+
+        # Statistics for the query planner, after a bulk change
+        maintenance.analyze_if_needed(db, maintenance.MaintenanceReport())
+    print(f"Imported {imported} games, skipped {skipped} existing titles, rejected {rejected}", file=sys.stderr)
+    return EXIT_REJECTED if rejected else EXIT_OK
+
+
+def command_similar(db: Database, args: argparse.Namespace) -> int:
+    import similarity
+
+    try:
+        game = db.get_game(game_title=args.title, projection=Projection.TITLES)
+    except NotFoundError as e:
+        raise UsageError(str(e)) from e
+    engine = similarity.SimilarGames(db, follow=False)
+    for game_id, score in engine.similar(game[0], args.limit):
+        _, title = db.get_game(game_id=game_id, projection=Projection.TITLES)
+        print(json.dumps({"id": game_id, "title": title, "score": round(score, 4)}, ensure_ascii=False))
+    return EXIT_OK
+
+
+def _goals(db: Database, args: argparse.Namespace):
+    import planner
+
+    goals = []
+    for values, get, table in (
+        (args.function, lambda name: db.get_cognitive_function(function_name=name), "cognitive_functions"),
+        (args.category, lambda name: db.get_cognitive_category(category_name=name), "cognitive_categories"),
+    ):
+        for value in values or []:
+            name, _, weight = value.rpartition("=")
+            if not name or not weight.isdigit():
+                raise UsageError(f"expected NAME=WEIGHT, got {value!r}")
+            try:
+                goals.append(planner.Target(table, get(name).id, int(weight)))
+            except NotFoundError as e:
+                raise UsageError(str(e)) from e
+    if not goals:
+        raise UsageError("at least one --function or --category target is required")
+    return goals
+
+
+def command_plan(db: Database, args: argparse.Namespace) -> int:
+    import planner
+
+    goals = _goals(db, args)
+    names = {
+        ("cognitive_functions", tag.id): tag.name for tag in db.get_all_cognitive_functions()
+    } | {("cognitive_categories", tag.id): tag.name for tag in db.get_all_cognitive_categories()}
+    plans = planner.plan_session(
+        db,
+        goals,
+        materials=[Material[name] for name in args.material] if args.material else None,
+        alternatives=args.alternatives,
+        exact=not args.greedy,
+        time_budget=args.time_budget,
+    )
+    for plan in plans:
+        games = [db.get_game(game_id=game_id, projection=Projection.TITLES) for game_id in plan.game_ids]
+        row = {
+            "games": [{"id": game_id, "title": title} for game_id, title in games],
+            "strength": plan.strength,
+            "optimal": plan.optimal,
+            "uncovered": [f"{names[goal.table, goal.tag_id]}={goal.weight}" for goal in plan.uncovered],
+        }
+        print(json.dumps(row, ensure_ascii=False))
+    if not plans:
+        print("No game covers any of the targets", file=sys.stderr)
+    return EXIT_OK
+
+
+def command_stats(db: Database, args: argparse.Namespace) -> int:
+    print(json.dumps(db.get_stats(), indent=2))
+    return EXIT_OK
+
+
+def command_vacuum(db: Database, args: argparse.Namespace) -> int:
+    before = db.get_stats()["size_bytes"]
+    db.vacuum()
+    after = db.get_stats()["size_bytes"]
+    print(json.dumps({"size_before": before, "size_after": after}))
+    return EXIT_OK
+
+
+def command_maintain(db: Database, args: argparse.Namespace) -> int:
+    import maintenance
+
+    report = maintenance.run(db, repair=not args.check_only)
+    print(json.dumps(report.as_dict(), indent=2))
+    return EXIT_REJECTED if report.problems and args.check_only else EXIT_OK
+
+
+def command_serve(db: Database, args: argparse.Namespace) -> int:
+    import server
+
+    db.close()
+    print(f"Serving {args.db} on http://{args.host}:{args.port}/api/games", file=sys.stderr)
+    server.serve(args.db, args.host, args.port, args.workers)
+    return EXIT_OK
+
+
+def command_backup(db: Database, args: argparse.Namespace) -> int:
+    import backup
+
+    backup_dir = args.dir or backup.default_backup_dir(args.db)
+    if args.list:
+        for snapshot in backup.list_snapshots(backup_dir):
+            manifest = snapshot.manifest()
+            problems = backup.verify_snapshot(snapshot, backup_dir) if args.verify else []
+            row = {"name": snapshot.name, "games": manifest["games"], "images": len(manifest["images"])}
+            if args.verify:
+                row["problems"] = problems
+            print(json.dumps(row))
+        return EXIT_OK
+    snapshot = backup.create_snapshot(args.db, backup_dir)
+    removed = backup.prune_snapshots(backup_dir, args.keep_last, args.keep_daily, args.keep_weekly)
+    print(f"Created snapshot {snapshot.name}, deleted {len(removed)} old snapshots", file=sys.stderr)
+    return EXIT_OK
+
+
+def command_restore(db: Database, args: argparse.Namespace) -> int:
+    import backup
+
+    db.close()
+    backup_dir = args.dir or backup.default_backup_dir(args.db)
+    try:
+        snapshot = backup.find_snapshot(backup_dir, args.snapshot)
+        print(json.dumps(backup.restore_snapshot(snapshot, args.db, backup_dir)))
+    except backup.BackupError as e:
+        raise UsageError(str(e)) from e
+    return EXIT_OK
+
+
+def command_sync_export(db: Database, args: argparse.Namespace) -> int:
+    import sync
+
+    if args.peer:
+        summary = sync.export_to_peer(db, args.output, args.peer)
+    else:
+        summary = sync.export_bundle(db, args.output, since=args.since)
+    print(json.dumps(summary))
+    return EXIT_OK
+
+
+def command_sync_import(db: Database, args: argparse.Namespace) -> int:
+    import sync
+
+    try:
+        stats = sync.import_bundle(db, args.bundle)
+    except sync.BundleError as e:
+        raise UsageError(str(e)) from e
+    print(json.dumps(stats))
+    return EXIT_REJECTED if stats["rejected"] else EXIT_OK
+
+
+def command_export_pack(db: Database, args: argparse.Namespace) -> int:
+    import packed_catalog
+
+    try:
+        summary = packed_catalog.export_pack(db, args.output)
+    except packed_catalog.PackError as e:
+        raise UsageError(str(e)) from e
+    print(json.dumps(summary))
+    return EXIT_OK
+
+
+def command_ingest_images(db: Database, args: argparse.Namespace) -> int:
+    import ingest
+
+    def progress(done: int, total: int, seconds: float):
+        if done == total or done % 25 == 0:
+            print(f"{done}/{total} images, {done / seconds:.1f} per second", file=sys.stderr)
+
+    try:
+        mapping = ingest.load_mapping(args.mapping)
+        report = ingest.ingest_images(
+            db, args.folder, mapping, args.workers, args.max_size, args.batch_size, progress=progress
+        )
+    except ingest.IngestError as e:
+        raise UsageError(str(e)) from e
+    print(json.dumps(report))
+    return EXIT_REJECTED if report["failed"] else EXIT_OK
+
+
+def command_images(db: Database, args: argparse.Namespace) -> int:
+    import image_store
+
+    try:
+        if args.to_database:
+            report = image_store.move_to_database(db, originals=args.originals)
+        else:
+            report = image_store.move_to_files(db)
+    except image_store.ImageStoreError as e:
+        raise UsageError(str(e)) from e
+    print(json.dumps(report))
+    return EXIT_REJECTED if report.get("failed") else EXIT_OK
+
+
+def command_analytics(db: Database, args: argparse.Namespace) -> int:
+    import analytics
+
+    report = analytics.report(db, args.strong, args.min_games, args.top, refresh=args.refresh)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return EXIT_OK
+
+
+def command_collection(db: Database, args: argparse.Namespace) -> int:
+    import saved_searches
+
+    if args.list:
+        for search in saved_searches.get_all(db):
+            print(json.dumps(search.as_dict(), ensure_ascii=False))
+        return EXIT_OK
+    if not args.name:
+        raise UsageError("A saved search name is required, or --list")
+    try:
+        if args.save:
+            search = saved_searches.save(db, args.name, args.save, args.descendants)
+            print(json.dumps(search.as_dict(), ensure_ascii=False))
+            return EXIT_OK
+        if args.delete:
+            saved_searches.delete(db, args.name)
+            return EXIT_OK
+        projection = FIELDS[args.fields]
+        games = saved_searches.games(db, args.name, projection, args.limit)
+    except QueryError as e:
+        raise UsageError(f"Invalid query: {e}") from e
+    except NotFoundError as e:
+        raise UsageError(str(e)) from e
+    output = _open_output(args.output)
+    try:
+        write_games(games, projection, args.format, output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return EXIT_OK
+
+
+def command_set_parent(db: Database, args: argparse.Namespace) -> int:
+    if args.category:
+        ids, move = _category_ids, db.set_cognitive_category_parent
+    else:
+        ids, move = _function_ids, db.set_cognitive_function_parent
+    (node,) = ids(db, [args.category or args.function])
+    parent = ids(db, [args.parent])[0] if args.parent else None
+    try:
+        move(node, parent)
+    except ValueError as e:
+        raise UsageError(str(e)) from e
+    print(json.dumps({"id": node, "parent_id": parent}))
+    return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python3 .", description="Neuropsy Games headless commands.")
+    parser.add_argument("--db", default="DO_NOT_REMOVE.db", help="database file (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search = commands.add_parser("search", help="search games and stream the results")
+    search.add_argument("--query", "-q", help='query such as \'func:"working memory">=7 -mat:VERBAL dobble\'')
+    search.add_argument("--title", help="part of the title")
+    search.add_argument("--category", action="append", help="category name, can be repeated (any of)")
+    search.add_argument("--function", action="append", help="function name, can be repeated (any of)")
+    search.add_argument(
+        "--material", action="append", choices=[material.name for material in Material], help="can be repeated"
+    )
+    search.add_argument(
+        "--descendants", action="store_true", help="also match the descendants of the categories and functions"
+    )
+    search.add_argument("--fields", choices=list(FIELDS), default="full", help="projection (default: %(default)s)")
+    search.add_argument("--limit", type=int, help="maximum number of games")
+    search.add_argument("--format", choices=FORMATS, default="jsonl")
+    search.add_argument("--output", help="file to write, instead of stdout")
+    search.set_defaults(handler=command_search)
+
+    export = commands.add_parser("export", help="export the whole catalog")
+    export.add_argument("--format", choices=FORMATS, default="jsonl")
+    export.add_argument("--output", help="file to write, instead of stdout")
+    export.set_defaults(handler=command_export)
+
+    import_ = commands.add_parser("import", help="import games exported by this tool, skipping existing titles")
+    import_.add_argument("file", help="JSONL or CSV file, or - for stdin")
+    import_.add_argument("--format", choices=FORMATS, help="guessed from the file extension by default")
+    import_.set_defaults(handler=command_import)
+
+    similar = commands.add_parser("similar", help="games with the closest cognitive weights and materials")
+    similar.add_argument("title", help="title of the game")
+    similar.add_argument("--limit", type=int, default=10, help="number of games (default: %(default)s)")
+    similar.set_defaults(handler=command_similar)
+
+    plan = commands.add_parser("plan", help="a few games which together cover target functions and categories")
+    plan.add_argument("--function", action="append", metavar="NAME=WEIGHT", help="minimum weight, can be repeated")
+    plan.add_argument("--category", action="append", metavar="NAME=WEIGHT", help="minimum weight, can be repeated")
+    plan.add_argument(
+        "--material",
+        action="append",
+        choices=[material.name for material in Material],
+        help="available material, can be repeated (default: any)",
+    )
+    plan.add_argument("--alternatives", type=int, default=3, help="number of plans (default: %(default)s)")
+    plan.add_argument("--greedy", action="store_true", help="skip the exact search")
+    plan.add_argument("--time-budget", type=float, default=0.2, help="seconds of exact search (default: %(default)s)")
+    plan.set_defaults(handler=command_plan)
+
+    stats = commands.add_parser("stats", help="print catalog and database statistics as JSON")
+    stats.set_defaults(handler=command_stats)
+
+    vacuum = commands.add_parser("vacuum", help="give back the space left by deleted data")
+    vacuum.set_defaults(handler=command_vacuum)
+
+    maintain = commands.add_parser("maintain", help="check integrity, refresh the statistics and free unused pages")
+    maintain.add_argument("--check-only", action="store_true", help="report the dangling tag IDs without removing them")
+    maintain.set_defaults(handler=command_maintain)
+
+    serve = commands.add_parser("serve", help="serve a read-only JSON HTTP API over the catalog")
+    serve.add_argument("--host", default="127.0.0.1", help="use 0.0.0.0 to accept connections from the LAN")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.add_argument("--workers", type=int, default=8, help="size of the worker pool")
+    serve.set_defaults(handler=command_serve)
+
+    backup = commands.add_parser("backup", help="snapshot the database and its images while the application runs")
+    backup.add_argument("--dir", help="backup directory (default: backups/ next to the database)")
+    backup.add_argument("--list", action="store_true", help="list the snapshots instead of creating one")
+    backup.add_argument("--verify", action="store_true", help="with --list, check the snapshots")
+    backup.add_argument("--keep-last", type=int, default=10, help="number of latest snapshots kept")
+    backup.add_argument("--keep-daily", type=int, default=7, help="number of days whose latest snapshot is kept")
+    backup.add_argument("--keep-weekly", type=int, default=4, help="number of weeks whose latest snapshot is kept")
+    backup.set_defaults(handler=command_backup)
+
+    restore = commands.add_parser("restore", help="verify a snapshot and restore the database and images from it")
+    restore.add_argument("snapshot", nargs="?", help="snapshot name (default: the latest)")
+    restore.add_argument("--dir", help="backup directory (default: backups/ next to the database)")
+    restore.set_defaults(handler=command_restore)
+
+    sync_export = commands.add_parser("sync-export", help="export the changes since a point as a bundle to merge")
+    sync_export.add_argument("--output", required=True, help="bundle file to write")
+    since = sync_export.add_mutually_exclusive_group()
+    since.add_argument("--since", type=int, default=0, help="'until' of the previous bundle (default: everything)")
+    since.add_argument("--peer", help="export what changed since the last bundle for this peer, and remember this one")
+    sync_export.set_defaults(handler=command_sync_export)
+
+    sync_import = commands.add_parser("sync-import", help="merge a bundle exported from another catalog")
+    sync_import.add_argument("bundle", help="bundle file")
+    sync_import.set_defaults(handler=command_sync_import)
+
+    export_pack = commands.add_parser("export-pack", help="write a read-only packed catalog for the kiosk machines")
+    export_pack.add_argument("--output", required=True, help="pack file to write")
+    export_pack.set_defaults(handler=command_export_pack)
+
+    ingest_images = commands.add_parser("ingest-images", help="convert a folder of images and attach them to games")
+    ingest_images.add_argument("folder", help="folder of the images")
+    ingest_images.add_argument("--mapping", required=True, help="CSV (file,title rows) or JSON file of game titles")
+    ingest_images.add_argument("--workers", type=int, help="number of processes (default: one per CPU)")
+    ingest_images.add_argument("--max-size", type=int, default=1024, help="largest side in pixels (default: 1024)")
+    ingest_images.add_argument("--batch-size", type=int, default=100, help="games updated per transaction")
+    ingest_images.set_defaults(handler=command_ingest_images)
+
+    images = commands.add_parser("images", help="move the images into the database file, or back to images/")
+    direction = images.add_mutually_exclusive_group(required=True)
+    direction.add_argument("--to-database", action="store_true", help="store thumbnails in the database")
+    direction.add_argument("--to-files", action="store_true", help="write the stored images back to their files")
+    images.add_argument("--originals", action="store_true", help="with --to-database, store the originals too")
+    images.set_defaults(handler=command_images)
+
+    analytics = commands.add_parser("analytics", help="coverage, gaps and co-occurrence of the tags")
+    analytics.add_argument("--strong", type=int, default=7, help="minimum weight of a strong game (default: 7)")
+    analytics.add_argument("--min-games", type=int, default=3, help="strong games below which a tag is a gap")
+    analytics.add_argument("--top", type=int, default=20, help="number of co-occurring pairs (default: 20)")
+    analytics.add_argument("--refresh", action="store_true", help="compute the report even if nothing changed")
+    analytics.set_defaults(handler=command_analytics)
+
+    collection = commands.add_parser("collection", help="save a search, or list the games of a saved one")
+    collection.add_argument("name", nargs="?", help="name of the saved search")
+    action = collection.add_mutually_exclusive_group()
+    action.add_argument("--save", metavar="QUERY", help="save this query under the name, replacing it")
+    action.add_argument("--delete", action="store_true", help="delete the saved search")
+    action.add_argument("--list", action="store_true", help="list the saved searches and their number of games")
+    collection.add_argument(
+        "--descendants", action="store_true", help="with --save, also match the descendants of the tags named"
+    )
+    collection.add_argument("--fields", choices=list(FIELDS), default="full", help="projection (default: %(default)s)")
+    collection.add_argument("--limit", type=int, help="maximum number of games")
+    collection.add_argument("--format", choices=FORMATS, default="jsonl")
+    collection.add_argument("--output", help="file to write, instead of stdout")
+    collection.set_defaults(handler=command_collection)
+
+    set_parent = commands.add_parser("set-parent", help="move a category or function, with its subtree, under another")
+    node = set_parent.add_mutually_exclusive_group(required=True)
+    node.add_argument("--category", help="name of the category to move")
+    node.add_argument("--function", help="name of the function to move")
+    set_parent.add_argument("--parent", help="name of the new parent, of the same kind (default: the top level)")
+    set_parent.set_defaults(handler=command_set_parent)
+    return parser
+
+
+def main(argv: list[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    db = Database(file=args.db)
+    try:
+        db.setup()
+        return args.handler(db, args)
+    except UsageError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    except DatabaseError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_DATABASE_ERROR
+    except BrokenPipeError:
+        # The reader stopped early, as with `| head`: not an error
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return EXIT_OK
+    finally:
+        db.close()
@@ -1,9 +1,29 @@
 import sqlite3
 import logging
+import inspect
 import json
+import os
+import random
+import time
+from enum import Enum
 from functools import wraps
-
-from models import Game, CognitiveCategory, CognitiveFunction, Material
+from typing import Callable, Iterable, Iterator, Optional
+from urllib.request import pathname2url
+
+import instrumentation
+import migrations
+from query_language import compile_query
+from models import (
+    Game,
+    CognitiveCategory,
+    CognitiveFunction,
+    Material,
+    GameRecord,
+    CognitiveCategoryRecord,
+    CognitiveFunctionRecord,
+    Change,
+    title_key,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -26,118 +46,290 @@ class NotFoundError(DatabaseError):
     pass
 
 
+class ConflictError(DatabaseError):
+    """The entry has been modified or deleted by someone else since it was read."""
+
+    pass
+
+
+class LockedError(DatabaseError):
+    """The database stayed locked by another instance of the application, even after retrying."""
+
+    pass
+
+
+# Seconds SQLite waits for a lock held by another connection, then attempts of the whole call with a jittered backoff
+BUSY_TIMEOUT = 5.0
+BUSY_RETRIES = 5
+BUSY_BACKOFF = 0.05
+
+
 def handle_sqlite_exceptions(func):
-    """Decorator to handle sqlite3 exceptions and convert them to custom exceptions."""
+    """
+    Decorator to handle sqlite3 exceptions and convert them to custom exceptions.
+
+    It also records the call when the instrumentation is enabled, and retries it when the database is busy.
+    """
+    name = func.__qualname__
+
+    if inspect.isgeneratorfunction(func):
+        # Errors happen while iterating. The instrumentation would only see the generator creation, so it is skipped.
+        @wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            try:
+                yield from func(*args, **kwargs)
+            except sqlite3.Error as e:
+                raise _database_error(e) from e
+
+        return generator_wrapper
 
     @wraps(func)
-    def wrapper(*args, **kwargs):
-        try:
-            return func(*args, **kwargs)
-        except sqlite3.IntegrityError as e:
-            raise DuplicateError(f"A unique constraint was violated: {e}") from e
-        except sqlite3.Error as e:
-            raise DatabaseError(f"An error occurred with the database: {e}") from e
+    def wrapper(self, *args, **kwargs):
+        # Retrying rolls back: never when called inside a transaction of the caller, whose work would be lost
+        retry = not self.con.in_transaction
+        for attempt in range(BUSY_RETRIES + 1):
+            try:
+                recorder = instrumentation.current
+                if recorder is None:
+                    return func(self, *args, **kwargs)
+                return recorder.call(name, func, (self, *args), kwargs)
+            except sqlite3.OperationalError as e:
+                # Busy despite the busy timeout, typically when two transactions which have read both want to write:
+                # one of them has to give up its transaction for the other one to proceed
+                if not (retry and _is_busy(e)) or attempt == BUSY_RETRIES:
+                    raise _database_error(e) from e
+                self.con.rollback()
+                delay = BUSY_BACKOFF * 2**attempt * random.uniform(0.5, 1.5)
+                logger.info("Database busy in %s, retrying in %.3fs", name, delay)
+                time.sleep(delay)
+            except sqlite3.Error as e:
+                raise _database_error(e) from e
 
     return wrapper
 
 
+def _is_busy(e: sqlite3.Error) -> bool:
+    message = str(e)
+    return "database is locked" in message or "database is busy" in message
+
+
+def _database_error(e: sqlite3.Error) -> DatabaseError:
+    if isinstance(e, sqlite3.IntegrityError):
+        return DuplicateError(f"A unique constraint was violated: {e}")
+    if _is_busy(e):
+        return LockedError(f"The database is used by another instance of the application: {e}")
+    return DatabaseError(f"An error occurred with the database: {e}")
+
+
+# Modification time of the rows, in ISO 8601 UTC with milliseconds, so that it sorts as text
+NOW = "strftime('%Y-%m-%dT%H:%M:%fZ', 'now')"
+
+INSERT_GAME = f"""
+    INSERT INTO games (
+        title, description, cognitive_functions,
+        cognitive_categories, materials, image, title_key, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, {NOW})
+"""
+
+
+def game_params(game: Game) -> tuple:
+    """Parameters of INSERT_GAME for a validated game."""
+    return (
+        game.title,
+        game.description,
+        json.dumps([(func.id, weight) for func, weight in game.functions]),  # Serialize function IDs
+        json.dumps([(cat.id, weight) for cat, weight in game.categories]),  # Serialize category IDs
+        json.dumps([material.name for material in game.materials]),  # Serialize materials
+        game.image,
+        title_key(game.title),
+    )
+
+
+class Projection(Enum):
+    """
+    Columns read by the game queries, which also decide the shape of the returned objects.
+
+    - IDS: game IDs only.
+    - TITLES: (id, title) tuples.
+    - SUMMARY: Game objects without description nor cognitive categories and functions.
+    - FULL: complete Game objects.
+    """
+
+    IDS = "id"
+    TITLES = "id, title"
+    SUMMARY = "id, title, image, materials"
+    FULL = "id, title, description, cognitive_functions, cognitive_categories, materials, image, version"
+
+
 class Database:
-    def __init__(self, file: str = "DO_NOT_REMOVE.db"):
-        self.con = sqlite3.connect(file)
+    def __init__(self, file: str = "DO_NOT_REMOVE.db", read_only: bool = False):
+        self.file = file
+        self.read_only = read_only
+        if read_only:
+            self.con = sqlite3.connect(
+                f"file:{pathname2url(os.path.abspath(file))}?mode=ro",
+                uri=True,
+                timeout=BUSY_TIMEOUT,
+                factory=instrumentation.TracedConnection,
+            )
+        else:
+            self.con = sqlite3.connect(file, timeout=BUSY_TIMEOUT, factory=instrumentation.TracedConnection)
+        self._subscribers: list[Callable[[list[Change]], None]] = []
+        self._published_seq = None
+        self.closed = False
 
     @handle_sqlite_exceptions
     def setup(self):
+        """Bring the schema up to date. This is a single PRAGMA read when no migration is pending."""
+        version = migrations.get_version(self.con)
+        if version >= migrations.latest_version():
+            return
         logger.info("Setting up database")
-        with open("database.sql", "r") as f:
-            schema = f.read()
-            self.con.executescript(schema)
-        self.con.commit()
+        if version == 0:
+            # Only takes effect before the first table is created: free pages can then be given back incrementally
+            self.con.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        migrations.migrate(self.con)
+
+    def close(self):
+        """
+        Close the connection, after letting SQLite refresh the statistics of the query planner if needed.
+
+        Closing an already closed Database does nothing.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if not self.read_only:
+                self.con.execute("PRAGMA optimize")
+        except sqlite3.Error as e:
+            logger.warning("PRAGMA optimize failed: %s", e)
+        finally:
+            self.con.close()
 
     @handle_sqlite_exceptions
     def add_game(self, game: Game):
-        logger.info("Adding game " + game.title)
-        self.con.execute(
-            """
-            INSERT INTO games (
-                title, description, cognitive_functions,
-                cognitive_categories, materials, image)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (
-                game.title,
-                game.description,
-                json.dumps([(func.id, weight) for func, weight in game.functions]),  # Serialize function IDs
-                json.dumps([(cat.id, weight) for cat, weight in game.categories]),  # Serialize category IDs
-                json.dumps([material.name for material in game.materials]),  # Serialize materials
-                game.image,
-            ),
-        )
+        game = Game.model_validate(game)
+        logger.info("Adding game %s", game.title)
+        self.con.execute(INSERT_GAME, game_params(game))
         self.con.commit()
+        self.publish_changes()
+
+    @handle_sqlite_exceptions
+    def add_games(self, games: Iterable[Game], batch_size: int = 500) -> int:
+        """
+        Insert many games, one transaction per batch. Returns the number of games inserted.
+
+        If a batch fails, it is rolled back and the error is raised: the previous batches stay inserted.
+        """
+        count = 0
+        batch = []
+        try:
+            for game in games:
+                batch.append(game_params(Game.model_validate(game)))
+                if len(batch) >= batch_size:
+                    count += self._insert_games(batch)
+                    batch = []
+            if batch:
+                count += self._insert_games(batch)
+        finally:
+            self.publish_changes()
+        return count
+
+    @handle_sqlite_exceptions
+    def _insert_games(self, batch: list[tuple]) -> int:
+        logger.info("Adding %d games", len(batch))
+        with self.con:
+            self.con.executemany(INSERT_GAME, batch)
+        return len(batch)
 
     @handle_sqlite_exceptions
     def update_game(self, game: Game):
+        """
+        Update the game. If its `version` is set, the update is refused with ConflictError when the row changed since
+        it was read at that version: read it again, or set the version to None to overwrite.
+        """
+        game = Game.model_validate(game)
         if game.id is None or game.id < 0:
             raise ValueError("Game ID must be a positive number")
-        logger.info("Updating game " + game.title)
-        self.con.execute(
-            """
+        logger.info("Updating game %s", game.title)
+        cursor = self.con.execute(
+            f"""
             UPDATE games
-            SET title = ?, description = ?, cognitive_functions = ?, 
-                cognitive_categories = ?, materials = ?, image = ?
-            WHERE id = ?
+            SET title = ?, description = ?, cognitive_functions = ?,
+                cognitive_categories = ?, materials = ?, image = ?, title_key = ?, updated_at = {NOW},
+                version = version + 1
+            WHERE id = ? AND (? IS NULL OR version = ?)
             """,
-            (
-                game.title,
-                game.description,
-                json.dumps([(func.id, weight) for func, weight in game.functions]),
-                json.dumps([(cat.id, weight) for cat, weight in game.categories]),
-                json.dumps([material.name for material in game.materials]),
-                game.image,
-                game.id,
-            ),
+            (*game_params(game), game.id, game.version, game.version),
         )
+        self._check_swapped(cursor, "games", game.id, game.version)
         self.con.commit()
+        self.publish_changes()
+
+    @handle_sqlite_exceptions
+    def set_game_images(self, images: list[tuple[int, str]]) -> int:
+        """Set the image path of many games, given as (ID, path), in one transaction. Returns the number updated."""
+        logger.info("Setting the images of %d games", len(images))
+        with self.con:
+            cursor = self.con.executemany(
+                f"UPDATE games SET image = ?, updated_at = {NOW}, version = version + 1 WHERE id = ?",
+                [(path, game_id) for game_id, path in images],
+            )
+        self.publish_changes()
+        return cursor.rowcount
 
     @handle_sqlite_exceptions
-    def delete_game(self, game_id: int):
+    def delete_game(self, game_id: int, version: int = None):
+        """Delete the game. As for `update_game`, a version makes it fail with ConflictError if the game changed."""
         if game_id is None or game_id < 0:
             raise ValueError("Game ID must be a positive number")
-        logger.info("Deleting game with id " + str(game_id))
-        self.con.execute("DELETE FROM games WHERE id = ?", (game_id,))
+        logger.info("Deleting game with id %s", game_id)
+        cursor = self.con.execute(
+            "DELETE FROM games WHERE id = ? AND (? IS NULL OR version = ?)", (game_id, version, version)
+        )
+        self._check_swapped(cursor, "games", game_id, version)
         self.con.commit()
+        self.publish_changes()
 
     @handle_sqlite_exceptions
     def add_cognitive_category(self, category: CognitiveCategory):
-        logger.info("Adding cognitive category" + category.name)
+        category = CognitiveCategory.model_validate(category)
+        logger.info("Adding cognitive category %s", category.name)
         self.con.execute(
-            """
-            INSERT INTO cognitive_categories (name)
-            VALUES (?)
+            f"""
+            INSERT INTO cognitive_categories (name, updated_at)
+            VALUES (?, {NOW})
             """,
             (category.name,),
         )
         self.con.commit()
+        self.publish_changes()
 
     @handle_sqlite_exceptions
     def update_cognitive_category(self, category: CognitiveCategory):
+        """Rename the category, refused with ConflictError if its `version` is set and the row changed since."""
+        category = CognitiveCategory.model_validate(category)
         if category.id is None or category.id < 0:
             raise ValueError("Cognitive Category ID must be a positive number")
-        logger.info("Updating cognitive category " + category.name)
-        self.con.execute(
-            """
+        logger.info("Updating cognitive category %s", category.name)
+        cursor = self.con.execute(
+            f"""
             UPDATE cognitive_categories
-            SET name = ?
-            WHERE id = ?
+            SET name = ?, updated_at = {NOW}, version = version + 1
+            WHERE id = ? AND (? IS NULL OR version = ?)
             """,
-            (category.name, category.id),
+            (category.name, category.id, category.version, category.version),
         )
+        self._check_swapped(cursor, "cognitive_categories", category.id, category.version)
         self.con.commit()
+        self.publish_changes()
 
     @handle_sqlite_exceptions
     def delete_cognitive_category(self, category_id: int):
         if category_id is None or category_id < 0:
             raise ValueError("Cognitive Category ID must be a positive number")
-        logger.info("Deleting cognitive category with id " + str(category_id))
+        logger.info("Deleting cognitive category with id %s", category_id)
 
         # Update games to remove references to the deleted category
         cursor = self.con.execute("SELECT id, cognitive_categories FROM games")
@@ -145,47 +337,59 @@ class Database:
             if categories_json:
                 categories = json.loads(categories_json)
                 updated_categories = [(cat_id, weight) for cat_id, weight in categories if cat_id != category_id]
+                if len(updated_categories) == len(categories):
+                    continue  # Not tagged: leave the row, and the change feed, untouched
                 self.con.execute(
-                    "UPDATE games SET cognitive_categories = ? WHERE id = ?",
+                    f"""
+                    UPDATE games SET cognitive_categories = ?, updated_at = {NOW}, version = version + 1
+                    WHERE id = ?
+                    """,
                     (json.dumps(updated_categories), game_id),
                 )
 
         # Delete the cognitive category
         self.con.execute("DELETE FROM cognitive_categories WHERE id = ?", (category_id,))
         self.con.commit()
+        self.publish_changes()
 
     @handle_sqlite_exceptions
     def add_cognitive_function(self, function: CognitiveFunction):
-        logger.info("Adding cognitive function" + function.name)
+        function = CognitiveFunction.model_validate(function)
+        logger.info("Adding cognitive function %s", function.name)
         self.con.execute(
-            """
-            INSERT INTO cognitive_functions (name)
-            VALUES (?)
+            f"""
+            INSERT INTO cognitive_functions (name, updated_at)
+            VALUES (?, {NOW})
             """,
             (function.name,),
         )
         self.con.commit()
+        self.publish_changes()
 
     @handle_sqlite_exceptions
     def update_cognitive_function(self, function: CognitiveFunction):
+        """Rename the function, refused with ConflictError if its `version` is set and the row changed since."""
+        function = CognitiveFunction.model_validate(function)
         if function.id is None or function.id < 0:
             raise ValueError("Cognitive Function ID must be a positive number")
-        logger.info("Updating cognitive function " + function.name)
-        self.con.execute(
-            """
+        logger.info("Updating cognitive function %s", function.name)
+        cursor = self.con.execute(
+            f"""
             UPDATE cognitive_functions
-            SET name = ?
-            WHERE id = ?
+            SET name = ?, updated_at = {NOW}, version = version + 1
+            WHERE id = ? AND (? IS NULL OR version = ?)
             """,
-            (function.name, function.id),
+            (function.name, function.id, function.version, function.version),
         )
+        self._check_swapped(cursor, "cognitive_functions", function.id, function.version)
         self.con.commit()
+        self.publish_changes()
 
     @handle_sqlite_exceptions
     def delete_cognitive_function(self, function_id: int):
         if function_id is None or function_id < 0:
             raise ValueError("Cognitive Function ID must be a positive number")
-        logger.info("Deleting cognitive function with id " + str(function_id))
+        logger.info("Deleting cognitive function with id %s", function_id)
 
         # Update games to remove references to the deleted function
         cursor = self.con.execute("SELECT id, cognitive_functions FROM games")
@@ -193,22 +397,29 @@ class Database:
             if functions_json:
                 functions = json.loads(functions_json)
                 updated_functions = [(func_id, weight) for func_id, weight in functions if func_id != function_id]
+                if len(updated_functions) == len(functions):
+                    continue  # Not tagged: leave the row, and the change feed, untouched
                 self.con.execute(
-                    "UPDATE games SET cognitive_functions = ? WHERE id = ?",
+                    f"""
+                    UPDATE games SET cognitive_functions = ?, updated_at = {NOW}, version = version + 1
+                    WHERE id = ?
+                    """,
                     (json.dumps(updated_functions), game_id),
                 )
 
         # Delete the cognitive function
         self.con.execute("DELETE FROM cognitive_functions WHERE id = ?", (function_id,))
         self.con.commit()
+        self.publish_changes()
 
     @handle_sqlite_exceptions
-    def get_game(self, game_id: int = None, game_title: str = None) -> Game:
+    def get_game(self, game_id: int = None, game_title: str = None, projection: Projection = None) -> GameRecord:
         logger.info("Getting game")
+        projection = projection or Projection.FULL
         if game_id:
-            cursor = self.con.execute("SELECT * FROM games WHERE id = ?", (game_id,))
+            cursor = self.con.execute(f"SELECT {projection.value} FROM games WHERE id = ?", (game_id,))
         elif game_title:
-            cursor = self.con.execute("SELECT * FROM games WHERE title = ?", (game_title,))
+            cursor = self.con.execute(f"SELECT {projection.value} FROM games WHERE title = ?", (game_title,))
         else:
             raise ValueError("Either game_id or game_title must be provided")
 
@@ -216,32 +427,16 @@ class Database:
         if not row:
             raise NotFoundError(f"Game with ID {game_id} or title {game_title} not found.")
 
-        game = Game(
-            id=row[0],
-            title=row[1],
-            description=row[2],
-            materials=[
-                Material[material] for material in json.loads(row[5] or "[]")
-            ],  # Handle None or empty string for materials
-            categories=[
-                (self.get_cognitive_category_by_id(cat[0]), cat[1]) for cat in json.loads(row[4] or "[]")
-            ],  # Deserialize category IDs
-            functions=[
-                (self.get_cognitive_function_by_id(func[0]), func[1]) for func in json.loads(row[3] or "[]")
-            ],  # Deserialize function IDs
-            image=row[6],
-        )
-
-        return game
+        return self._games_from_rows([row], projection)[0]
 
     @handle_sqlite_exceptions
-    def get_cognitive_category(self, category_id: int = None, category_name: str = None) -> CognitiveCategory:
+    def get_cognitive_category(self, category_id: int = None, category_name: str = None) -> CognitiveCategoryRecord:
         logger.info("Getting cognitive category")
         if category_id:
-            cursor = self.con.execute("SELECT * FROM cognitive_categories WHERE id = ?", (category_id,))
+            cursor = self.con.execute("SELECT id, name, version FROM cognitive_categories WHERE id = ?", (category_id,))
         elif category_name:
             cursor = self.con.execute(
-                "SELECT * FROM cognitive_categories WHERE name = ?",
+                "SELECT id, name, version FROM cognitive_categories WHERE name = ?",
                 (category_name,),
             )
         else:
@@ -251,17 +446,17 @@ class Database:
         if not row:
             raise NotFoundError(f"Cognitive category with ID {category_id} or name {category_name} not found.")
 
-        category = CognitiveCategory(id=row[0], name=row[1])
+        category = CognitiveCategoryRecord(*row)
         return category
 
     @handle_sqlite_exceptions
-    def get_cognitive_function(self, function_id: int = None, function_name: str = None) -> CognitiveFunction:
+    def get_cognitive_function(self, function_id: int = None, function_name: str = None) -> CognitiveFunctionRecord:
         logger.info("Getting cognitive function")
         if function_id:
-            cursor = self.con.execute("SELECT * FROM cognitive_functions WHERE id = ?", (function_id,))
+            cursor = self.con.execute("SELECT id, name, version FROM cognitive_functions WHERE id = ?", (function_id,))
         elif function_name:
             cursor = self.con.execute(
-                "SELECT * FROM cognitive_functions WHERE name = ?",
+                "SELECT id, name, version FROM cognitive_functions WHERE name = ?",
                 (function_name,),
             )
         else:
@@ -271,64 +466,127 @@ class Database:
         if not row:
             raise NotFoundError(f"Cognitive function with ID {function_id} or name {function_name} not found.")
 
-        function = CognitiveFunction(id=row[0], name=row[1])
+        function = CognitiveFunctionRecord(*row)
         return function
 
     @handle_sqlite_exceptions
-    def get_all_games(self) -> list[Game]:
+    def set_cognitive_category_parent(self, category_id: int, parent_id: Optional[int]):
+        """Move the category, with its descendants, under another one, or to the top level with None."""
+        self._set_parent("cognitive_categories", category_id, parent_id, "Cognitive category")
+
+    @handle_sqlite_exceptions
+    def set_cognitive_function_parent(self, function_id: int, parent_id: Optional[int]):
+        """Move the function, with its descendants, under another one, or to the top level with None."""
+        self._set_parent("cognitive_functions", function_id, parent_id, "Cognitive function")
+
+    @handle_sqlite_exceptions
+    def get_cognitive_category_parents(self) -> dict[int, Optional[int]]:
+        """Parent ID of every category, None at the top level."""
+        return dict(self.con.execute("SELECT id, parent_id FROM cognitive_categories"))
+
+    @handle_sqlite_exceptions
+    def get_cognitive_function_parents(self) -> dict[int, Optional[int]]:
+        """Parent ID of every function, None at the top level."""
+        return dict(self.con.execute("SELECT id, parent_id FROM cognitive_functions"))
+
+    @handle_sqlite_exceptions
+    def get_cognitive_category_descendants(self, category_ids: list[int]) -> list[int]:
+        """IDs of the categories and of all their descendants, at any depth."""
+        return self._descendants("cognitive_categories", category_ids)
+
+    @handle_sqlite_exceptions
+    def get_cognitive_function_descendants(self, function_ids: list[int]) -> list[int]:
+        """IDs of the functions and of all their descendants, at any depth."""
+        return self._descendants("cognitive_functions", function_ids)
+
+    def _set_parent(self, table: str, tag_id: int, parent_id: Optional[int], kind: str):
+        for node in (tag_id, parent_id):
+            if node is not None and self.con.execute(f"SELECT 1 FROM {table} WHERE id = ?", (node,)).fetchone() is None:
+                raise NotFoundError(f"{kind} with ID {node} not found.")
+        if parent_id is not None and self.con.execute(
+            f"SELECT 1 FROM {table}_closure WHERE ancestor = ? AND descendant = ?", (tag_id, parent_id)
+        ).fetchone():
+            raise ValueError(f"{kind} {tag_id} cannot be moved under itself or one of its descendants")
+        logger.info("Moving %s %s under %s", kind.lower(), tag_id, parent_id)
+        # The triggers of the closure table only rewrite the rows of the moved subtree
+        self.con.execute(
+            f"UPDATE {table} SET parent_id = ?, updated_at = {NOW}, version = version + 1 WHERE id = ?",
+            (parent_id, tag_id),
+        )
+        self.con.commit()
+        self.publish_changes()
+
+    def _descendants(self, table: str, tag_ids: list[int]) -> list[int]:
+        cursor = self.con.execute(
+            f"SELECT DISTINCT descendant FROM {table}_closure WHERE ancestor IN ({', '.join('?' * len(tag_ids))})",
+            tag_ids,
+        )
+        return sorted(row[0] for row in cursor)
+
+    @handle_sqlite_exceptions
+    def get_all_games(self, projection: Projection = None) -> list:
+        """Return every game, as a summary (no description nor cognitive tags) unless another projection is given."""
         logger.info("Getting all games")
-        cursor = self.con.execute("SELECT * FROM games")
-        rows = cursor.fetchall()
-        games = []
-        for row in rows:
-            game = Game(
-                id=row[0],
-                title=row[1],
-                description=row[2],
-                image=row[6],
-                categories=[],
-                functions=[],
-            )
-            games.append(game)
-        return games
+        projection = projection or Projection.SUMMARY
+        cursor = self.con.execute(f"SELECT {projection.value} FROM games")
+        return self._games_from_rows(cursor.fetchall(), projection)
 
     @handle_sqlite_exceptions
-    def get_all_cognitive_categories(self) -> list[CognitiveCategory]:
+    def search_game_titles(self, prefix: str = "", limit: int = 20) -> list[tuple[int, str]]:
+        """
+        Return the (id, title) of the first games whose title starts with the prefix, ignoring case and accents.
+
+        This is a range scan on the title_key index, so it stays fast on every keystroke.
+        """
+        key = title_key(prefix.strip())
+        cursor = self.con.execute(
+            """
+            SELECT id, title FROM games
+            WHERE title_key >= ? AND title_key < ?
+            ORDER BY title_key
+            LIMIT ?
+            """,
+            (key, key + "\U0010ffff", limit),
+        )
+        return cursor.fetchall()
+
+    @handle_sqlite_exceptions
+    def get_all_cognitive_categories(self) -> list[CognitiveCategoryRecord]:
         logger.info("Getting all cognitive categories")
-        cursor = self.con.execute("SELECT * FROM cognitive_categories")
+        cursor = self.con.execute("SELECT id, name, version FROM cognitive_categories")
         rows = cursor.fetchall()
         categories = []
         for row in rows:
-            category = CognitiveCategory(id=row[0], name=row[1])
+            category = CognitiveCategoryRecord(*row)
             categories.append(category)
         return categories
 
     @handle_sqlite_exceptions
-    def get_all_cognitive_functions(self) -> list[CognitiveFunction]:
+    def get_all_cognitive_functions(self) -> list[CognitiveFunctionRecord]:
         logger.info("Getting all cognitive functions")
-        cursor = self.con.execute("SELECT * FROM cognitive_functions")
+        cursor = self.con.execute("SELECT id, name, version FROM cognitive_functions")
         rows = cursor.fetchall()
         functions = []
         for row in rows:
-            function = CognitiveFunction(id=row[0], name=row[1])
+            function = CognitiveFunctionRecord(*row)
             functions.append(function)
         return functions
 
     @handle_sqlite_exceptions
-    def get_cognitive_category_by_id(self, category_id: int) -> CognitiveCategory:
-        cursor = self.con.execute("SELECT * FROM cognitive_categories WHERE id = ?", (category_id,))
+    def get_cognitive_category_by_id(self, category_id: int) -> CognitiveCategoryRecord:
+        cursor = self.con.execute("SELECT id, name, version FROM cognitive_categories WHERE id = ?", (category_id,))
         result = cursor.fetchone()
         if result is None:
             raise NotFoundError(f"Cognitive category with ID {category_id} not found.")
-        return CognitiveCategory(id=result[0], name=result[1])
+        return CognitiveCategoryRecord(*result)
 
     @handle_sqlite_exceptions
-    def get_cognitive_function_by_id(self, function_id: int) -> CognitiveFunction:
-        cursor = self.con.execute("SELECT * FROM cognitive_functions WHERE id = ?", (function_id,))
+    def get_cognitive_function_by_id(self, function_id: int) -> CognitiveFunctionRecord:
+        cursor = self.con.execute("SELECT id, name, version FROM cognitive_functions WHERE id = ?", (function_id,))
         result = cursor.fetchone()
         if result is None:
             raise NotFoundError(f"Cognitive function with ID {function_id} not found.")
-        return CognitiveFunction(id=result[0], name=result[1])
+        return CognitiveFunctionRecord(*result)
 
     @handle_sqlite_exceptions
     def get_games_with_filters(
@@ -337,54 +595,341 @@ class Database:
         cognitive_categories_ids: list[int] = None,
         cognitive_functions_ids: list[int] = None,
         materials: list[Material] = None,
-    ) -> list[Game]:
-        if cognitive_categories_ids is None:
-            cognitive_categories_ids = []
-        if cognitive_functions_ids is None:
-            cognitive_functions_ids = []
-        if materials is None:
-            materials = []
+        projection: Projection = None,
+        limit: int = None,
+        offset: int = 0,
+        include_descendants: bool = False,
+        search_query: str = None,
+    ) -> list:
+        """
+        The games matching every filter given: title containing `game_title`, any of the categories, any of the
+        functions, any of the materials and the `search_query` of the query language. With `include_descendants`,
+        the descendants of the categories and functions given match too.
+
+        Raises `query_language.QueryError` if the query cannot be parsed.
+        """
+        projection = projection or Projection.FULL
 
         logger.info("Fetching games with filters")
-        query = "SELECT * FROM games WHERE 1=1"
-        params = []
+        query, params = _filtered_games_query(
+            projection.value,
+            game_title,
+            cognitive_categories_ids,
+            cognitive_functions_ids,
+            materials,
+            include_descendants,
+            search_query,
+        )
+        if limit is not None or offset:
+            query += " ORDER BY id LIMIT ? OFFSET ?"
+            params += [-1 if limit is None else limit, offset]
+        cursor = self.con.execute(query, params)
+        return self._games_from_rows(cursor.fetchall(), projection)
 
-        # Filter by game title
-        if game_title:
-            query += " AND title LIKE ?"
-            params.append(f"%{game_title}%")
+    @handle_sqlite_exceptions
+    def get_games_by_ids(self, game_ids: list[int], projection: Projection = None) -> list:
+        """The games with these IDs, in the same order. Missing IDs are skipped."""
+        projection = projection or Projection.FULL
+        rows = {}
+        # Below the default limit of SQLite on the number of parameters
+        for start in range(0, len(game_ids), 900):
+            chunk = game_ids[start : start + 900]
+            cursor = self.con.execute(
+                f"SELECT {projection.value} FROM games WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            rows.update((row[0], row) for row in cursor.fetchall())
+        return self._games_from_rows([rows[game_id] for game_id in game_ids if game_id in rows], projection)
 
-        # Fetch games based on title filter
+    @handle_sqlite_exceptions
+    def iter_games_with_filters(
+        self,
+        game_title: str = None,
+        cognitive_categories_ids: list[int] = None,
+        cognitive_functions_ids: list[int] = None,
+        materials: list[Material] = None,
+        projection: Projection = None,
+        batch_size: int = 1000,
+        include_descendants: bool = False,
+        search_query: str = None,
+    ) -> Iterator:
+        """Like get_games_with_filters, but fetches the games batch by batch, so memory stays flat on any catalog."""
+        projection = projection or Projection.FULL
+
+        logger.info("Iterating over games with filters")
+        query, params = _filtered_games_query(
+            projection.value,
+            game_title,
+            cognitive_categories_ids,
+            cognitive_functions_ids,
+            materials,
+            include_descendants,
+            search_query,
+        )
         cursor = self.con.execute(query, params)
-        rows = cursor.fetchall()
+        taxonomies = self._taxonomies() if projection is Projection.FULL else None
+        while rows := cursor.fetchmany(batch_size):
+            yield from self._games_from_rows(rows, projection, taxonomies)
 
-        # Convert rows to Game objects
+    @handle_sqlite_exceptions
+    def get_facets(
+        self,
+        game_title: str = None,
+        cognitive_categories_ids: list[int] = None,
+        cognitive_functions_ids: list[int] = None,
+        materials: list[Material] = None,
+        include_descendants: bool = False,
+        search_query: str = None,
+    ) -> dict:
+        """
+        Number of games matching the filters, and how many of them have each category, function and material.
+
+        Counts are computed by SQLite over the JSON columns, no game is hydrated.
+        """
+        logger.info("Counting facets")
+        query, params = _filtered_games_query(
+            "id, cognitive_categories, cognitive_functions, materials",
+            game_title,
+            cognitive_categories_ids,
+            cognitive_functions_ids,
+            materials,
+            include_descendants,
+            search_query,
+        )
+        facets = {"games": self.con.execute(f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]}
+        for key, column, value in (
+            ("cognitive_categories", "cognitive_categories", "json_extract(value, '$[0]')"),
+            ("cognitive_functions", "cognitive_functions", "json_extract(value, '$[0]')"),
+            ("materials", "materials", "value"),
+        ):
+            cursor = self.con.execute(
+                f"""
+                WITH filtered AS ({query})
+                SELECT {value}, COUNT(DISTINCT filtered.id)
+                FROM filtered, json_each(COALESCE(NULLIF(filtered.{column}, ''), '[]'))
+                GROUP BY 1
+                """,
+                params,
+            )
+            facets[key] = dict(cursor.fetchall())
+        return facets
+
+    @handle_sqlite_exceptions
+    def get_stats(self) -> dict:
+        """Size of the catalog and of the database file."""
+        materials = self.con.execute(
+            """
+            SELECT value, COUNT(*) FROM games, json_each(COALESCE(NULLIF(materials, ''), '[]'))
+            GROUP BY value
+            """
+        ).fetchall()
+        page_size = self.con.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            "games": self.con.execute("SELECT COUNT(*) FROM games").fetchone()[0],
+            "cognitive_categories": self.con.execute("SELECT COUNT(*) FROM cognitive_categories").fetchone()[0],
+            "cognitive_functions": self.con.execute("SELECT COUNT(*) FROM cognitive_functions").fetchone()[0],
+            "materials": {material.name: 0 for material in Material} | dict(materials),
+            "schema_version": migrations.get_version(self.con),
+            "size_bytes": self.con.execute("PRAGMA page_count").fetchone()[0] * page_size,
+            "free_bytes": self.con.execute("PRAGMA freelist_count").fetchone()[0] * page_size,
+        }
+
+    @handle_sqlite_exceptions
+    def vacuum(self):
+        """Rebuild the database file, to give back the space left by deleted rows and compacted changes."""
+        self.compact_changes()
+        logger.info("Vacuuming database")
+        self.con.commit()
+        self.con.execute("VACUUM")
+
+    @handle_sqlite_exceptions
+    def changes_since(self, seq: int = 0, limit: int = None) -> list[Change]:
+        """
+        The changes committed after the given sequence number, oldest first, from any connection or process.
+
+        Consumers keep the `seq` of the last change they applied. Apply a change by re-reading the row:
+        a deleted row is gone, any other is inserted or updated. `compact_changes` can turn an insert into an update.
+        The tombstones merged by sync have entries of the `tombstones` table, which other consumers can ignore.
+        """
+        cursor = self.con.execute(
+            "SELECT seq, table_name, row_id, op FROM changes WHERE seq > ? ORDER BY seq LIMIT ?",
+            (seq, -1 if limit is None else limit),
+        )
+        return [Change(*row) for row in cursor.fetchall()]
+
+    @handle_sqlite_exceptions
+    def last_change_seq(self) -> int:
+        """Sequence number of the last change, to start following the feed from now."""
+        return self.con.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    @handle_sqlite_exceptions
+    def compact_changes(self) -> int:
+        """Only keep the last change of each row. Returns the number of entries removed."""
+        logger.info("Compacting the change feed")
+        with self.con:
+            cursor = self.con.execute(
+                """
+                DELETE FROM changes
+                WHERE seq NOT IN (SELECT MAX(seq) FROM changes GROUP BY table_name, row_id)
+                """
+            )
+        return cursor.rowcount
+
+    def subscribe(self, callback: Callable[[list[Change]], None]) -> Callable[[], None]:
+        """
+        Call `callback` with the new changes after each write made through this Database.
+
+        Changes made by other processes are picked up by `publish_changes`. Returns a function that unsubscribes.
+        """
+        if self._published_seq is None:
+            self._published_seq = self.last_change_seq()
+        self._subscribers.append(callback)
+
+        def unsubscribe():
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    def publish_changes(self):
+        """Send the changes committed since the last call to the subscribers."""
+        if not self._subscribers:
+            return
+        changes = self.changes_since(self._published_seq)
+        if not changes:
+            return
+        self._published_seq = changes[-1].seq
+        for callback in list(self._subscribers):
+            if callback in self._subscribers:  # Not unsubscribed by a previous callback
+                callback(changes)
+
+    def _check_swapped(self, cursor: sqlite3.Cursor, table: str, row_id: int, version: int = None):
+        """Raise, after rolling back, if the compare-and-swap statement of the cursor changed no row."""
+        if cursor.rowcount or version is None:
+            return
+        exists = self.con.execute(f"SELECT 1 FROM {table} WHERE id = ?", (row_id,)).fetchone()
+        self.con.rollback()
+        if exists:
+            raise ConflictError(f"Row {row_id} of {table} was modified by someone else since version {version}.")
+        raise NotFoundError(f"Row {row_id} of {table} not found.")
+
+    def _taxonomies(self) -> tuple[dict[int, CognitiveCategoryRecord], dict[int, CognitiveFunctionRecord]]:
+        categories = {category.id: category for category in self.get_all_cognitive_categories()}
+        functions = {function.id: function for function in self.get_all_cognitive_functions()}
+        return categories, functions
+
+    def _games_from_rows(self, rows: list[tuple], projection: Projection, taxonomies: tuple = None) -> list:
+        """
+        Build the objects of the given projection from rows selected with its columns.
+
+        Rows come from our own tables, so games are hydrated as trusted records, without pydantic validation.
+        """
+        if projection is Projection.IDS:
+            return [row[0] for row in rows]
+        if projection is Projection.TITLES:
+            return [(row[0], row[1]) for row in rows]
+        if projection is Projection.SUMMARY:
+            return [
+                GameRecord(
+                    id=row[0],
+                    title=row[1],
+                    image=row[2],
+                    materials=[Material[material] for material in json.loads(row[3] or "[]")],
+                    categories=[],
+                    functions=[],
+                )
+                for row in rows
+            ]
+
+        if not rows:
+            return []
+        # The taxonomies are small: load them once instead of querying each tag of each game
+        categories, functions = taxonomies or self._taxonomies()
         games = []
         for row in rows:
-            game = Game(
+            game = GameRecord(
                 id=row[0],
                 title=row[1],
                 description=row[2],
-                materials=[Material[material] for material in json.loads(row[5] or "[]")],
-                categories=[(self.get_cognitive_category_by_id(cat[0]), cat[1]) for cat in json.loads(row[4] or "[]")],
+                materials=[
+                    Material[material] for material in json.loads(row[5] or "[]")
+                ],  # Handle None or empty string for materials
+                categories=[
+                    (_lookup(categories, cat[0], "Cognitive category"), cat[1]) for cat in json.loads(row[4] or "[]")
+                ],  # Deserialize category IDs
                 functions=[
-                    (self.get_cognitive_function_by_id(func[0]), func[1]) for func in json.loads(row[3] or "[]")
-                ],
+                    (_lookup(functions, func[0], "Cognitive function"), func[1]) for func in json.loads(row[3] or "[]")
+                ],  # Deserialize function IDs
                 image=row[6],
+                version=row[7],
             )
             games.append(game)
+        return games
 
-        # Filter games by cognitive categories
-        if cognitive_categories_ids:
-            games = [game for game in games if any(cat[0].id in cognitive_categories_ids for cat in game.categories)]
-
-        # Filter games by cognitive functions
-        if cognitive_functions_ids:
-            games = [game for game in games if any(func[0].id in cognitive_functions_ids for func in game.functions)]
-
-        # Filter games by materials
-        if materials:
-            material_names = [material.name for material in materials]
-            games = [game for game in games if any(material.name in material_names for material in game.materials)]
 
-        return games
+def _tag_set(table: str, count: int, include_descendants: bool) -> str:
+    """SQL set of `count` tag IDs given as parameters, or of these tags and their descendants."""
+    placeholders = ", ".join("?" * count)
+    if include_descendants:
+        return f"SELECT descendant FROM {table}_closure WHERE ancestor IN ({placeholders})"
+    return placeholders
+
+
+def _filtered_games_query(
+    columns: str,
+    game_title: str = None,
+    cognitive_categories_ids: list[int] = None,
+    cognitive_functions_ids: list[int] = None,
+    materials: list[Material] = None,
+    include_descendants: bool = False,
+    search_query: str = None,
+) -> tuple[str, list]:
+    query = f"SELECT {columns} FROM games WHERE 1=1"
+    params = []
+
+    # A query of the search language, compiled into a condition on the same row
+    if search_query:
+        where, query_params = compile_query(search_query, include_descendants)
+        query += f" AND {where}"
+        params.extend(query_params)
+
+    # Filter by game title
+    if game_title:
+        query += " AND title LIKE ?"
+        params.append(f"%{game_title}%")
+
+    # The tag and material filters are evaluated by SQLite on the JSON columns,
+    # so that games which do not match are never read nor hydrated
+    if cognitive_categories_ids:
+        tag_set = _tag_set("cognitive_categories", len(cognitive_categories_ids), include_descendants)
+        query += f"""
+            AND EXISTS (
+                SELECT 1 FROM json_each(COALESCE(NULLIF(cognitive_categories, ''), '[]'))
+                WHERE json_extract(value, '$[0]') IN ({tag_set})
+            )"""
+        params.extend(cognitive_categories_ids)
+
+    if cognitive_functions_ids:
+        tag_set = _tag_set("cognitive_functions", len(cognitive_functions_ids), include_descendants)
+        query += f"""
+            AND EXISTS (
+                SELECT 1 FROM json_each(COALESCE(NULLIF(cognitive_functions, ''), '[]'))
+                WHERE json_extract(value, '$[0]') IN ({tag_set})
+            )"""
+        params.extend(cognitive_functions_ids)
+
+    if materials:
+        query += f"""
+            AND EXISTS (
+                SELECT 1 FROM json_each(COALESCE(NULLIF(materials, ''), '[]'))
+                WHERE value IN ({", ".join("?" * len(materials))})
+            )"""
+        params.extend(material.name for material in materials)
+
+    return query, params
+
+
+def _lookup(entries: dict, entry_id: int, kind: str):
+    try:
+        return entries[entry_id]
+    except KeyError:
+        raise NotFoundError(f"{kind} with ID {entry_id} not found.") from None
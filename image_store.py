@@ -0,0 +1,233 @@
+"""
+Images stored in the database, so that the catalog is a single file to copy.
+
+    python3 . images --to-database              thumbnails in the database, originals left in images/
+    python3 . images --to-database --originals  the originals too, removing their files
+    python3 . images --to-files                 everything back to images/
+
+Each image moved to the database is a row of the `images` table, and the games showing it reference it by row ID
+as `blob:<id>` instead of a file path. A row always has a thumbnail, which is all the lists show, and has the
+original image unless it stays in its file. Its `name` is the path of that file, to move it back.
+
+Blobs are read and written with incremental blob I/O: opening an image reads nothing, and Pillow only fetches the
+bytes it decodes, in place of loading the whole value in memory.
+"""
+
+import io
+import logging
+import os
+import sqlite3
+from typing import BinaryIO, Callable, Optional
+
+from database import NOW, Database, DatabaseError
+
+logger = logging.getLogger(__name__)
+
+BLOB_PREFIX = "blob:"
+THUMBNAIL_SIZE = (150, 150)
+CHUNK_SIZE = 1 << 16
+BATCH_SIZE = 50
+
+
+class ImageStoreError(Exception):
+    pass
+
+
+def blob_id(image: Optional[str]) -> Optional[int]:
+    """The row ID of an image stored in the database, or None for a file path."""
+    if image and image.startswith(BLOB_PREFIX):
+        return int(image[len(BLOB_PREFIX) :])
+    return None
+
+
+def _file_path(db: Database, name: str) -> str:
+    """Images are stored as given by the user: relative paths are relative to the database directory."""
+    return os.path.join(os.path.dirname(os.path.abspath(db.file)), name)
+
+
+def _open_blob(con: sqlite3.Connection, column: str, row_id: int, readonly: bool = True):
+    return con.blobopen("images", column, row_id, readonly=readonly)
+
+
+def open_image(db: Database, image: str) -> BinaryIO:
+    """A binary file object over the original image, whether in the database or in a file."""
+    row_id = blob_id(image)
+    if row_id is None:
+        return open(_file_path(db, image), "rb")
+    try:
+        row = db.con.execute("SELECT name, original IS NOT NULL FROM images WHERE id = ?", (row_id,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"No image {image} in the database")
+        if not row[1]:
+            return open(_file_path(db, row[0]), "rb")
+        return _open_blob(db.con, "original", row_id)
+    except sqlite3.Error as e:
+        raise DatabaseError(f"An error occurred with the database: {e}") from e
+
+
+def read_original(db: Database, image: str) -> Optional[tuple[bytes, str]]:
+    """The content and file extension of an image stored in the database, None if it is missing."""
+    try:
+        with open_image(db, image) as source:
+            data = source.read()
+        name = db.con.execute("SELECT name FROM images WHERE id = ?", (blob_id(image),)).fetchone()[0]
+    except OSError:
+        return None
+    return data, os.path.splitext(name)[1].lower()
+
+
+def read_thumbnail(db: Database, image: str) -> Optional[bytes]:
+    """The PNG thumbnail of an image stored in the database, None for a file path or a missing image."""
+    row_id = blob_id(image)
+    if row_id is None:
+        return None
+    try:
+        with _open_blob(db.con, "thumbnail", row_id) as blob:
+            return blob.read()
+    except sqlite3.OperationalError:
+        # No such row
+        return None
+    except sqlite3.Error as e:
+        raise DatabaseError(f"An error occurred with the database: {e}") from e
+
+
+def make_thumbnail(source: BinaryIO) -> bytes:
+    """An upright PNG thumbnail of the image, at most THUMBNAIL_SIZE."""
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(THUMBNAIL_SIZE)
+        output = io.BytesIO()
+        image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def _write_blob(con: sqlite3.Connection, row_id: int, column: str, source: BinaryIO):
+    """Copy a file into a blob allocated with zeroblob() to its size, one chunk at a time."""
+    with _open_blob(con, column, row_id, readonly=False) as blob:
+        while chunk := source.read(CHUNK_SIZE):
+            blob.write(chunk)
+
+
+def _insert_original(con: sqlite3.Connection, row_id: int, path: str):
+    con.execute("UPDATE images SET original = zeroblob(?) WHERE id = ?", (os.path.getsize(path), row_id))
+    with open(path, "rb") as source:
+        _write_blob(con, row_id, "original", source)
+
+
+def move_to_database(
+    db: Database, originals: bool = False, progress: Optional[Callable[[int, int], None]] = None
+) -> dict:
+    """
+    Store a thumbnail of every image file of the games in the database, and with `originals` the image itself,
+    whose file is then removed. Images already in the database get their original if it is still a file.
+    Returns counts of what was moved, and the images which could not be.
+    """
+    if not hasattr(sqlite3.Connection, "blobopen"):
+        raise ImageStoreError("Storing images in the database needs Python 3.11 or later")
+    con = db.con
+    try:
+        files = [row[0] for row in con.execute("SELECT DISTINCT image FROM games WHERE image <> '' ORDER BY 1")]
+        files = [image for image in files if blob_id(image) is None]
+        thumbnails_only = []
+        if originals:
+            thumbnails_only = con.execute("SELECT id, name FROM images WHERE original IS NULL ORDER BY id").fetchall()
+    except sqlite3.Error as e:
+        raise DatabaseError(f"An error occurred with the database: {e}") from e
+
+    report = {"thumbnails": 0, "originals": 0, "failed": []}
+    total = len(files) + len(thumbnails_only)
+    removable: list[str] = []
+
+    def commit():
+        con.commit()
+        db.publish_changes()
+        # Only once the database has them
+        for path in removable:
+            if os.path.exists(path):
+                os.remove(path)
+        removable.clear()
+
+    try:
+        for done, image in enumerate(files, 1):
+            path = _file_path(db, image)
+            try:
+                with open(path, "rb") as source:
+                    thumbnail = make_thumbnail(source)
+            except Exception as e:
+                logger.warning("Cannot store image %s: %s", image, e)
+                report["failed"].append({"image": image, "error": str(e) or type(e).__name__})
+                continue
+            cursor = con.execute("INSERT INTO images (name, thumbnail) VALUES (?, ?)", (image, thumbnail))
+            report["thumbnails"] += 1
+            if originals:
+                _insert_original(con, cursor.lastrowid, path)
+                report["originals"] += 1
+                removable.append(path)
+            con.execute(
+                f"UPDATE games SET image = ?, updated_at = {NOW}, version = version + 1 WHERE image = ?",
+                (f"{BLOB_PREFIX}{cursor.lastrowid}", image),
+            )
+            if done % BATCH_SIZE == 0:
+                commit()
+            if progress:
+                progress(done, total)
+        for done, (row_id, name) in enumerate(thumbnails_only, len(files) + 1):
+            path = _file_path(db, name)
+            if not os.path.isfile(path):
+                report["failed"].append({"image": name, "error": "missing file"})
+                continue
+            _insert_original(con, row_id, path)
+            report["originals"] += 1
+            removable.append(path)
+            if done % BATCH_SIZE == 0:
+                commit()
+            if progress:
+                progress(done, total)
+        commit()
+    except sqlite3.Error as e:
+        con.rollback()
+        raise DatabaseError(f"An error occurred with the database: {e}") from e
+    except BaseException:
+        con.rollback()
+        raise
+    logger.info("Moved %d thumbnails and %d originals to the database", report["thumbnails"], report["originals"])
+    return report
+
+
+def move_to_files(db: Database, progress: Optional[Callable[[int, int], None]] = None) -> dict:
+    """Write the originals stored in the database back to their files, and reference the files again."""
+    con = db.con
+    try:
+        rows = con.execute("SELECT id, name, original IS NOT NULL FROM images ORDER BY id").fetchall()
+        report = {"files": 0, "images": len(rows)}
+        for done, (row_id, name, stored) in enumerate(rows, 1):
+            if stored:
+                path = _file_path(db, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with _open_blob(con, "original", row_id) as blob, open(path + ".partial", "wb") as target:
+                    while chunk := blob.read(CHUNK_SIZE):
+                        target.write(chunk)
+                os.replace(path + ".partial", path)
+                report["files"] += 1
+            con.execute(
+                f"UPDATE games SET image = ?, updated_at = {NOW}, version = version + 1 WHERE image = ?",
+                (name, f"{BLOB_PREFIX}{row_id}"),
+            )
+            con.execute("DELETE FROM images WHERE id = ?", (row_id,))
+            if done % BATCH_SIZE == 0:
+                con.commit()
+                db.publish_changes()
+            if progress:
+                progress(done, len(rows))
+        con.commit()
+        db.publish_changes()
+    except sqlite3.Error as e:
+        con.rollback()
+        raise DatabaseError(f"An error occurred with the database: {e}") from e
+    except BaseException:
+        con.rollback()
+        raise
+    logger.info("Moved %d images back to files", report["files"])
+    return report
@@ -0,0 +1,153 @@
+"""
+Bulk image ingestion, to attach the photos of a whole collection at once.
+
+    python3 . ingest-images photos/ --mapping photos.csv --workers 4
+
+The mapping gives the game title of each file, as a CSV file with `file,title` rows or a JSON object. Images are
+decoded, turned upright according to their EXIF orientation, downscaled to MAX_SIZE and re-encoded by a pool of
+processes, while this process stores the games of the finished images, one transaction per batch.
+
+Images are stored in images/ next to the database, named after their content: the same photo is only stored once.
+A file which cannot be read or decoded is reported and skipped, without stopping the others.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Optional
+
+from database import Database, Projection
+
+logger = logging.getLogger(__name__)
+
+IMAGES_DIR = "images"
+MAX_SIZE = 1024
+JPEG_QUALITY = 85
+BATCH_SIZE = 100
+
+
+class IngestError(Exception):
+    pass
+
+
+def load_mapping(path: str) -> dict[str, str]:
+    """Read the file name to game title mapping of a CSV or JSON file."""
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            if path.lower().endswith(".json"):
+                mapping = json.load(f)
+                if not isinstance(mapping, dict):
+                    raise ValueError("expected an object of file names to titles")
+            else:
+                rows = [row for row in csv.reader(f) if row]
+                if rows and [cell.strip().lower() for cell in rows[0]] == ["file", "title"]:
+                    rows = rows[1:]
+                mapping = {row[0].strip(): row[1].strip() for row in rows}
+    except (OSError, ValueError, IndexError) as e:
+        raise IngestError(f"Cannot read mapping {path}: {e}") from e
+    return mapping
+
+
+def convert_image(source: str, images_dir: str, max_size: int = MAX_SIZE) -> tuple[str, int, int]:
+    """
+    Store an upright copy of the image at most `max_size` pixels wide and high: JPEG, or PNG if it is transparent.
+    Returns its path relative to the folder of `images_dir`, and the sizes read and written. Runs in the workers.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        image.load()
+        image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_size, max_size))
+    output = io.BytesIO()
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image.save(output, format="PNG", optimize=True)
+        extension = ".png"
+    else:
+        image.convert("RGB").save(output, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+        extension = ".jpg"
+    data = output.getvalue()
+    name = hashlib.sha256(data).hexdigest() + extension
+    path = os.path.join(images_dir, name)
+    if not os.path.exists(path):
+        # Another worker may write the same image meanwhile: each one writes its own file before the rename
+        temporary = f"{path}.{os.getpid()}.partial"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+    return f"{os.path.basename(images_dir)}/{name}", os.path.getsize(source), len(data)
+
+
+def ingest_images(
+    db: Database,
+    folder: str,
+    mapping: dict[str, str],
+    workers: int = None,
+    max_size: int = MAX_SIZE,
+    batch_size: int = BATCH_SIZE,
+    progress: Optional[Callable[[int, int, float], None]] = None,
+) -> dict:
+    """
+    Convert the images of `folder` listed in `mapping` across `workers` processes (one per CPU by default), and set
+    them as the images of their games. `progress` is called with the number of files done, their total and the
+    elapsed seconds after each file. Returns a report of what was ingested and what failed.
+    """
+    start = time.perf_counter()
+    games = {title: game_id for game_id, title in db.get_all_games(projection=Projection.TITLES)}
+    images_dir = os.path.join(os.path.dirname(os.path.abspath(db.file)), IMAGES_DIR)
+    os.makedirs(images_dir, exist_ok=True)
+
+    failed = []
+    jobs = {}
+    for file_name, title in mapping.items():
+        if title not in games:
+            failed.append({"file": file_name, "error": f"No game titled {title!r}"})
+        else:
+            jobs[file_name] = games[title]
+
+    ingested = bytes_read = bytes_written = 0
+    pending: list[tuple[int, str]] = []
+
+    def store():
+        nonlocal ingested
+        if pending:
+            ingested += db.set_game_images(pending)
+            pending.clear()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(convert_image, os.path.join(folder, file_name), images_dir, max_size): file_name
+            for file_name in jobs
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            file_name = futures[future]
+            try:
+                path, size, converted_size = future.result()
+            except Exception as e:
+                logger.warning("Cannot ingest %s: %s", file_name, e)
+                failed.append({"file": file_name, "error": str(e) or type(e).__name__})
+            else:
+                pending.append((jobs[file_name], path))
+                bytes_read += size
+                bytes_written += converted_size
+                if len(pending) >= batch_size:
+                    store()
+            if progress:
+                progress(done, len(futures), time.perf_counter() - start)
+        store()
+
+    seconds = time.perf_counter() - start
+    logger.info("Ingested %d images in %.1fs, %d failed", ingested, seconds, len(failed))
+    return {
+        "ingested": ingested,
+        "failed": sorted(failed, key=lambda failure: failure["file"]),
+        "seconds": round(seconds, 3),
+        "images_per_second": round(ingested / seconds, 1) if seconds else None,
+        "megabytes_read": round(bytes_read / 1e6, 1),
+        "megabytes_written": round(bytes_written / 1e6, 1),
+    }
@@ -0,0 +1,248 @@
+"""
+Opt-in instrumentation of the Database methods.
+
+When enabled, every method wrapped by `handle_sqlite_exceptions` records its call count, errors, latency histogram
+and number of SQL statements. Statements slower than a threshold are logged with their EXPLAIN QUERY PLAN.
+When disabled (the default), the wrapper only checks that `current` is None.
+
+    import instrumentation
+    instrumentation.enable(slow_threshold=0.05)
+    ...
+    print(instrumentation.current.report())
+
+The application enables it when NEUROPSY_INSTRUMENTATION is set: to "1" to print the report on stderr on exit,
+or to a file path to write the snapshot there as JSON. NEUROPSY_SLOW_QUERY_MS sets the slow statement threshold.
+"""
+
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+ENABLE_ENV_VAR = "NEUROPSY_INSTRUMENTATION"
+SLOW_QUERY_ENV_VAR = "NEUROPSY_SLOW_QUERY_MS"
+
+# Upper bounds of the latency histogram buckets, in seconds. The last bucket is unbounded.
+HISTOGRAM_BUCKETS: tuple[float, ...] = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+MAX_SLOW_STATEMENTS = 100
+
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+
+class MethodStats:
+    __slots__ = ("calls", "errors", "total", "max", "statements", "histogram")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.statements = 0
+        self.histogram = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+
+    def as_dict(self) -> dict:
+        labels = [f"<={bound * 1000:g}ms" for bound in HISTOGRAM_BUCKETS] + [f">{HISTOGRAM_BUCKETS[-1] * 1000:g}ms"]
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total": self.total,
+            "mean": self.total / self.calls if self.calls else 0.0,
+            "max": self.max,
+            "statements": self.statements,
+            "histogram": dict(zip(labels, self.histogram)),
+        }
+
+
+class _Frame:
+    __slots__ = ("statements",)
+
+    def __init__(self):
+        self.statements = 0
+
+
+class TracedConnection(sqlite3.Connection):
+    """A connection remembering its trace callback, which sqlite3 does not expose, so that it can be restored."""
+
+    trace_callback: Optional[Callable[[str], None]] = None
+
+    def set_trace_callback(self, trace_callback: Optional[Callable[[str], None]]):
+        super().set_trace_callback(trace_callback)
+        self.trace_callback = trace_callback
+
+
+class Instrumentation:
+    """Statistics of the Database method calls. Use `enable()` rather than creating one directly."""
+
+    slow_threshold: float
+    methods: dict[str, MethodStats]
+    slow_statements: deque
+
+    def __init__(self, slow_threshold: float = 0.05):
+        self.slow_threshold = slow_threshold
+        self.methods = {}
+        self.slow_statements = deque(maxlen=MAX_SLOW_STATEMENTS)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def call(self, name: str, func: Callable, args: tuple, kwargs: dict):
+        """Call a Database method and record it."""
+        local = self._local
+        if not hasattr(local, "stack"):
+            local.stack = []
+        stack = local.stack
+        con = getattr(args[0], "con", None) if args else None
+        outermost = not stack and isinstance(con, sqlite3.Connection)
+        if outermost:
+            # Statements are timed from one trace callback to the next, which includes fetching their rows
+            local.pending = None
+            local.slow = []
+            # Set through the base class, so that the callback set by the application is still the remembered one
+            previous = getattr(con, "trace_callback", None)
+            sqlite3.Connection.set_trace_callback(con, self._trace(previous))
+        stack.append(_Frame())
+
+        error = False
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            error = True
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            frame = stack.pop()
+            if stack:
+                stack[-1].statements += frame.statements
+            if outermost:
+                self._close_statement(time.perf_counter())
+                sqlite3.Connection.set_trace_callback(con, previous)
+                for sql, statement_duration in local.slow:
+                    self._log_slow_statement(con, name, sql, statement_duration)
+            self._record(name, duration, frame.statements, error)
+
+    def _trace(self, previous: Optional[Callable[[str], None]]) -> Callable[[str], None]:
+        """The trace callback recording the statements, which still passes them to the previous one if any."""
+        if previous is None:
+            return self._on_statement
+
+        def trace(sql: str):
+            self._on_statement(sql)
+            previous(sql)
+
+        return trace
+
+    def _on_statement(self, sql: str):
+        now = time.perf_counter()
+        self._close_statement(now)
+        # Statements run by triggers are reported as comments, and are part of their parent statement
+        if sql.startswith("--"):
+            return
+        local = self._local
+        local.stack[-1].statements += 1
+        local.pending = (sql, now)
+
+    def _close_statement(self, now: float):
+        local = self._local
+        if local.pending is None:
+            return
+        sql, start = local.pending
+        local.pending = None
+        if now - start >= self.slow_threshold:
+            local.slow.append((sql, now - start))
+
+    def _log_slow_statement(self, con: sqlite3.Connection, method: str, sql: str, duration: float):
+        plan = []
+        if sql.lstrip().upper().startswith(_EXPLAINABLE):
+            try:
+                plan = [row[-1] for row in con.execute("EXPLAIN QUERY PLAN " + sql).fetchall()]
+            except sqlite3.Error as e:
+                plan = [f"unavailable: {e}"]
+        entry = {"method": method, "duration": duration, "sql": sql, "plan": plan}
+        with self._lock:
+            self.slow_statements.append(entry)
+        logger.warning("Slow statement in %s (%.1f ms): %s\n  %s", method, duration * 1000, sql, "\n  ".join(plan))
+
+    def _record(self, name: str, duration: float, statements: int, error: bool):
+        with self._lock:
+            stats = self.methods.get(name)
+            if stats is None:
+                stats = self.methods[name] = MethodStats()
+            stats.calls += 1
+            stats.errors += error
+            stats.total += duration
+            stats.max = max(stats.max, duration)
+            stats.statements += statements
+            stats.histogram[bisect_left(HISTOGRAM_BUCKETS, duration)] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "slow_threshold": self.slow_threshold,
+                "methods": {name: stats.as_dict() for name, stats in sorted(self.methods.items())},
+                "slow_statements": list(self.slow_statements),
+            }
+
+    def report(self) -> str:
+        snapshot = self.snapshot()
+        lines = [f"{'Database method':<40}{'calls':>8}{'errors':>8}{'mean ms':>10}{'max ms':>10}{'statements':>12}"]
+        for name, stats in snapshot["methods"].items():
+            lines.append(
+                f"{name:<40}{stats['calls']:>8}{stats['errors']:>8}"
+                f"{stats['mean'] * 1000:>10.2f}{stats['max'] * 1000:>10.2f}{stats['statements']:>12}"
+            )
+        if snapshot["slow_statements"]:
+            lines.append(f"Statements slower than {self.slow_threshold * 1000:g} ms:")
+            for entry in snapshot["slow_statements"]:
+                lines.append(f"  {entry['method']} ({entry['duration'] * 1000:.1f} ms): {entry['sql']}")
+                lines.extend(f"    {detail}" for detail in entry["plan"])
+        return "\n".join(lines)
+
+    def dump(self, path: str = None):
+        """Write the snapshot as JSON to `path`, or the report to stderr."""
+        if path:
+            with open(path, "w") as f:
+                json.dump(self.snapshot(), f, indent=2)
+        else:
+            print(self.report(), file=sys.stderr)
+
+
+# The enabled instrumentation, or None. Read on every Database method call.
+current: Optional[Instrumentation] = None
+
+
+def enable(slow_threshold: float = 0.05, dump_on_exit: bool = False, dump_path: str = None) -> Instrumentation:
+    """Start recording the Database method calls, optionally dumping the results when the process exits."""
+    global current
+    current = Instrumentation(slow_threshold)
+    if dump_on_exit:
+        atexit.register(current.dump, dump_path)
+    return current
+
+
+def disable() -> Optional[Instrumentation]:
+    """Stop recording, and return the instrumentation which was enabled."""
+    global current
+    previous, current = current, None
+    return previous
+
+
+def snapshot() -> dict:
+    return current.snapshot() if current else {}
+
+
+def enable_from_env() -> Optional[Instrumentation]:
+    value = os.environ.get(ENABLE_ENV_VAR)
+    if not value:
+        return None
+    slow_threshold = float(os.environ.get(SLOW_QUERY_ENV_VAR, "50")) / 1000
+    return enable(slow_threshold, dump_on_exit=True, dump_path=None if value == "1" else value)
@@ -0,0 +1,224 @@
+"""
+Routine maintenance of the database, run when the application is idle and by `python3 . maintain`.
+
+- Integrity: `PRAGMA quick_check`, and the category and function IDs of the games which no longer exist.
+  These make `get_game` raise NotFoundError, so they are removed from the games.
+- Statistics: `ANALYZE` once enough rows changed since the last one, so the query planner knows the data.
+- Free pages: `PRAGMA incremental_vacuum` when deletes left too many of them, a few pages per transaction.
+
+`Database.close` also runs `PRAGMA optimize`, which refreshes the statistics SQLite found worth it.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from database import NOW, Database, DatabaseError
+
+logger = logging.getLogger(__name__)
+
+# Rows changed since the last ANALYZE which trigger a new one
+ANALYZE_THRESHOLD = 500
+# Share of free pages above which they are given back, when there are at least FREELIST_MIN_PAGES of them
+FREELIST_THRESHOLD = 0.1
+FREELIST_MIN_PAGES = 64
+# Pages freed per transaction, so that the other connections are never blocked for long
+VACUUM_STEP = 256
+
+IDLE_DELAY = 30.0
+IDLE_POLL_INTERVAL = 5.0
+
+TAG_TABLES = ("cognitive_categories", "cognitive_functions")
+
+
+@dataclass(slots=True)
+class MaintenanceReport:
+    timings: dict[str, float] = field(default_factory=dict)
+    problems: list[str] = field(default_factory=list)
+    repaired_games: int = 0
+    analyzed: bool = False
+    freed_pages: int = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "timings_ms": {task: round(duration * 1000, 3) for task, duration in self.timings.items()},
+            "problems": self.problems,
+            "repaired_games": self.repaired_games,
+            "analyzed": self.analyzed,
+            "freed_pages": self.freed_pages,
+        }
+
+
+def _get_state(db: Database, name: str, default=None):
+    row = db.con.execute("SELECT value FROM maintenance WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else default
+
+
+def _set_state(db: Database, name: str, value):
+    db.con.execute("INSERT OR REPLACE INTO maintenance (name, value) VALUES (?, ?)", (name, value))
+
+
+def dangling_tags(db: Database) -> dict[str, list[tuple[int, int]]]:
+    """(game ID, tag ID) of the tags of games which are not in their table anymore, by table."""
+    dangling = {}
+    for table in TAG_TABLES:
+        cursor = db.con.execute(
+            f"""
+            SELECT games.id, json_extract(tag.value, '$[0]')
+            FROM games, json_each(COALESCE(NULLIF(games.{table}, ''), '[]')) AS tag
+            WHERE json_extract(tag.value, '$[0]') NOT IN (SELECT id FROM {table})
+            """
+        )
+        dangling[table] = cursor.fetchall()
+    return dangling
+
+
+def repair_dangling_tags(db: Database, dangling: dict[str, list[tuple[int, int]]]) -> int:
+    """Remove the dangling tags from their games. Returns the number of games repaired."""
+    repaired = set()
+    with db.con:
+        for table, pairs in dangling.items():
+            by_game: dict[int, set[int]] = {}
+            for game_id, tag_id in pairs:
+                by_game.setdefault(game_id, set()).add(tag_id)
+            for game_id, tag_ids in by_game.items():
+                tags = json.loads(db.con.execute(f"SELECT {table} FROM games WHERE id = ?", (game_id,)).fetchone()[0])
+                tags = [(tag_id, weight) for tag_id, weight in tags if tag_id not in tag_ids]
+                # A change like any other: sync peers and open edit windows see it
+                db.con.execute(
+                    f"UPDATE games SET {table} = ?, updated_at = {NOW}, version = version + 1 WHERE id = ?",
+                    (json.dumps(tags), game_id),
+                )
+                repaired.add(game_id)
+    return len(repaired)
+
+
+def check_integrity(db: Database, report: MaintenanceReport, repair: bool = True):
+    result = [row[0] for row in db.con.execute("PRAGMA quick_check")]
+    if result != ["ok"]:
+        report.problems.extend(result)
+    dangling = dangling_tags(db)
+    for table, pairs in dangling.items():
+        if pairs:
+            report.problems.append(f"{len(pairs)} {table} IDs of games do not exist")
+    if repair and any(dangling.values()):
+        report.repaired_games = repair_dangling_tags(db, dangling)
+        db.publish_changes()
+
+
+def analyze_if_needed(db: Database, report: MaintenanceReport, threshold: int = ANALYZE_THRESHOLD):
+    """ANALYZE if enough rows changed since the last time, or if it never ran."""
+    seq = db.last_change_seq()
+    last = _get_state(db, "analyze_seq")
+    if last is not None and seq - last < threshold:
+        return
+    with db.con:
+        db.con.execute("ANALYZE")
+        _set_state(db, "analyze_seq", seq)
+    report.analyzed = True
+
+
+def vacuum_if_needed(
+    db: Database,
+    report: MaintenanceReport,
+    threshold: float = FREELIST_THRESHOLD,
+    min_pages: int = FREELIST_MIN_PAGES,
+    step: int = VACUUM_STEP,
+):
+    """Give back the free pages to the file system when there are too many of them."""
+    free = db.con.execute("PRAGMA freelist_count").fetchone()[0]
+    total = db.con.execute("PRAGMA page_count").fetchone()[0]
+    if free < min_pages or free < threshold * total:
+        return
+    if db.con.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        # Databases created before incremental vacuum was enabled: a full VACUUM once converts them
+        logger.info("Enabling incremental vacuum")
+        db.con.commit()
+        db.con.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        db.vacuum()
+        report.freed_pages = free
+        return
+    while True:
+        db.con.execute(f"PRAGMA incremental_vacuum({int(step)})").fetchall()
+        remaining = db.con.execute("PRAGMA freelist_count").fetchone()[0]
+        if remaining >= free:
+            break
+        report.freed_pages += free - remaining
+        free = remaining
+        if not free:
+            break
+
+
+def run(db: Database, repair: bool = True) -> MaintenanceReport:
+    """Run every task, timing each of them."""
+    report = MaintenanceReport()
+    for name, task in (
+        ("integrity check", lambda: check_integrity(db, report, repair)),
+        ("analyze", lambda: analyze_if_needed(db, report)),
+        ("incremental vacuum", lambda: vacuum_if_needed(db, report)),
+    ):
+        start = time.perf_counter()
+        try:
+            task()
+        except sqlite3.Error as e:
+            raise DatabaseError(f"Maintenance task {name} failed: {e}") from e
+        report.timings[name] = time.perf_counter() - start
+    for problem in report.problems:
+        logger.warning("Database integrity: %s", problem)
+    logger.info("Maintenance done: %s", report.as_dict())
+    return report
+
+
+class IdleMaintenance:
+    """
+    Runs the maintenance on a worker thread, with its own connection, once the user did nothing for `delay` seconds.
+
+    It runs once per session, then again only after other changes were made.
+    """
+
+    def __init__(self, widget, db: Database, delay: float = IDLE_DELAY, poll_interval: float = IDLE_POLL_INTERVAL):
+        self.widget = widget
+        self.db = db
+        self.delay = delay
+        self.poll_interval = poll_interval
+        self.last_input = time.monotonic()
+        self.last_seq: Optional[int] = None
+        self.last_report: Optional[MaintenanceReport] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        for sequence in ("<Any-KeyPress>", "<Any-ButtonPress>", "<Motion>"):
+            self.widget.bind_all(sequence, self._on_input, add="+")
+        self._schedule()
+
+    def _on_input(self, event=None):
+        self.last_input = time.monotonic()
+
+    def _schedule(self):
+        self.widget.after(int(self.poll_interval * 1000), self._poll)
+
+    def _poll(self):
+        self._schedule()
+        if self._thread and self._thread.is_alive():
+            return
+        if time.monotonic() - self.last_input < self.delay:
+            return
+        seq = self.db.last_change_seq()
+        if seq == self.last_seq:
+            return
+        self.last_seq = seq
+        self._thread = threading.Thread(target=self._run, name="maintenance", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        db = Database(file=self.db.file)
+        try:
+            self.last_report = run(db)
+        except Exception as e:
+            logger.error("Maintenance failed: %s", e)
+        finally:
+            db.close()
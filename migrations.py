@@ -0,0 +1,335 @@
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Callable
+
+from models import title_key
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_FILE = Path(__file__).parent / "database.sql"
+
+Migration = Callable[[sqlite3.Connection], None]
+
+# Ordered registry of (version, name, migration). The version of a database is stored in PRAGMA user_version.
+MIGRATIONS: list[tuple[int, str, Migration]] = []
+
+
+def migration(version: int, name: str):
+    """Register the decorated function as the migration bringing the schema to the given version."""
+
+    def decorator(func: Migration) -> Migration:
+        if MIGRATIONS and version <= MIGRATIONS[-1][0]:
+            raise ValueError(f"Migration {version} ({name}) is registered out of order")
+        MIGRATIONS.append((version, name, func))
+        return func
+
+    return decorator
+
+
+def execute_script(con: sqlite3.Connection, script: str):
+    """
+    Execute a SQL script one statement at a time.
+
+    Unlike `Connection.executescript`, this does not commit, so the script runs inside the migration transaction.
+    """
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            con.execute(statement)
+            statement = ""
+    if statement.strip():
+        con.execute(statement)
+
+
+def get_version(con: sqlite3.Connection) -> int:
+    return con.execute("PRAGMA user_version").fetchone()[0]
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def migrate(con: sqlite3.Connection) -> list[int]:
+    """
+    Apply the pending migrations in order, each one in its own transaction.
+
+    Several instances may start on the same file at once: each migration takes the write lock first, and is skipped
+    if another instance applied it meanwhile.
+
+    Returns the versions that have been applied, which is empty when the database is already up to date.
+    """
+    version = get_version(con)
+    if version > latest_version():
+        logger.warning("Database schema version %d is newer than this application (%d)", version, latest_version())
+    applied = []
+    for target, name, func in MIGRATIONS:
+        if target <= version:
+            continue
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            version = get_version(con)
+            if target <= version:
+                con.rollback()
+                continue
+            logger.info("Migrating database to version %d: %s", target, name)
+            func(con)
+            con.execute(f"PRAGMA user_version = {int(target)}")
+        except BaseException:
+            con.rollback()
+            raise
+        con.commit()
+        applied.append(target)
+    return applied
+
+
+@migration(1, "initial schema")
+def _initial_schema(con: sqlite3.Connection):
+    execute_script(con, SCHEMA_FILE.read_text())
+
+
+@migration(2, "indexed title keys for prefix search")
+def _title_keys(con: sqlite3.Connection):
+    con.execute("ALTER TABLE games ADD COLUMN `title_key` TEXT")
+    rows = con.execute("SELECT id, title FROM games").fetchall()
+    con.executemany("UPDATE games SET title_key = ? WHERE id = ?", [(title_key(title), _id) for _id, title in rows])
+    con.execute("CREATE INDEX IF NOT EXISTS idx_games_title_key ON games (title_key)")
+
+
+CHANGE_FEED_TABLES = ("games", "cognitive_categories", "cognitive_functions")
+
+
+@migration(3, "change feed")
+def _change_feed(con: sqlite3.Connection):
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS changes (
+            `seq` INTEGER PRIMARY KEY AUTOINCREMENT,
+            `table_name` TEXT NOT NULL,
+            `row_id` INTEGER NOT NULL,
+            `op` TEXT NOT NULL -- insert, update or delete
+        )
+        """
+    )
+    for table in CHANGE_FEED_TABLES:
+        for op, row in (("insert", "NEW"), ("update", "NEW"), ("delete", "OLD")):
+            con.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_{op}_change AFTER {op.upper()} ON {table}
+                BEGIN
+                    INSERT INTO changes (table_name, row_id, op) VALUES ('{table}', {row}.id, '{op}');
+                END
+                """
+            )
+
+
+# Same as database.NOW, frozen here like the rest of the migrations
+_NOW = "strftime('%Y-%m-%dT%H:%M:%fZ', 'now')"
+
+
+@migration(4, "modification times and tombstones for delta sync")
+def _sync_metadata(con: sqlite3.Connection):
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tombstones (
+            `table_name` TEXT NOT NULL,
+            `key` TEXT NOT NULL, -- title or name of the deleted or renamed row
+            `row_id` INTEGER,
+            `deleted_at` TEXT NOT NULL,
+            PRIMARY KEY (table_name, key)
+        )
+        """
+    )
+    con.execute("CREATE INDEX IF NOT EXISTS idx_tombstones_row_id ON tombstones (table_name, row_id)")
+    # Rows and tombstones are identified across catalogs by their unique title or name.
+    # The updated_at of the existing rows is left NULL, read as their created_at, not to fill the change feed.
+    for table, key in (("games", "title"), ("cognitive_categories", "name"), ("cognitive_functions", "name")):
+        con.execute(f"ALTER TABLE {table} ADD COLUMN `updated_at` TEXT")
+        con.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_insert_tombstone AFTER INSERT ON {table}
+            BEGIN
+                DELETE FROM tombstones WHERE table_name = '{table}' AND key = NEW.{key};
+            END
+            """
+        )
+        con.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_rename_tombstone AFTER UPDATE OF {key} ON {table}
+            WHEN OLD.{key} <> NEW.{key}
+            BEGIN
+                DELETE FROM tombstones WHERE table_name = '{table}' AND key = NEW.{key};
+                INSERT OR REPLACE INTO tombstones (table_name, key, row_id, deleted_at)
+                VALUES ('{table}', OLD.{key}, OLD.id, COALESCE(NEW.updated_at, {_NOW}));
+            END
+            """
+        )
+        con.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_delete_tombstone AFTER DELETE ON {table}
+            BEGIN
+                INSERT OR REPLACE INTO tombstones (table_name, key, row_id, deleted_at)
+                VALUES ('{table}', OLD.{key}, OLD.id, {_NOW});
+            END
+            """
+        )
+    # Change feed position of the last bundle exported to each peer
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sync_peers (
+            `name` TEXT PRIMARY KEY,
+            `seq` INTEGER NOT NULL
+        )
+        """
+    )
+
+
+@migration(5, "maintenance state")
+def _maintenance_state(con: sqlite3.Connection):
+    # Bookkeeping of the maintenance tasks, such as the change feed position of the last ANALYZE
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS maintenance (
+            `name` TEXT PRIMARY KEY,
+            `value`
+        )
+        """
+    )
+
+
+@migration(6, "row versions for optimistic concurrency")
+def _row_versions(con: sqlite3.Connection):
+    # Incremented by every update: an update made with the version read is refused if another one came in between
+    for table in ("games", "cognitive_categories", "cognitive_functions"):
+        con.execute(f"ALTER TABLE {table} ADD COLUMN `version` INTEGER NOT NULL DEFAULT 0")
+
+
+@migration(7, "images stored in the database")
+def _image_blobs(con: sqlite3.Connection):
+    # Games reference a row as "blob:<id>". name is the path of the file the image was moved from, where the
+    # original stays when it is not stored here.
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS images (
+            `id` INTEGER PRIMARY KEY,
+            `name` TEXT NOT NULL,
+            `thumbnail` BLOB NOT NULL,
+            `original` BLOB
+        )
+        """
+    )
+
+
+@migration(8, "cached reports")
+def _reports(con: sqlite3.Connection):
+    # Reports computed from the whole catalog, kept with the change feed seq they were computed at
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reports (
+            `name` TEXT PRIMARY KEY,
+            `seq` INTEGER NOT NULL,
+            `parameters` TEXT NOT NULL,
+            `value` TEXT NOT NULL
+        )
+        """
+    )
+
+
+TAXONOMY_TABLES = ("cognitive_categories", "cognitive_functions")
+
+
+@migration(9, "taxonomy hierarchy")
+def _taxonomy_hierarchy(con: sqlite3.Connection):
+    # Each category and function may have a parent of the same table. {table}_closure has a row for every pair of
+    # a node and one of its descendants, itself included at depth 0, so that a subtree is one indexed lookup.
+    # It is maintained by triggers, whichever connection writes: moving a subtree rewrites the rows of its nodes only.
+    for table in TAXONOMY_TABLES:
+        closure = f"{table}_closure"
+        con.execute(f"ALTER TABLE {table} ADD COLUMN `parent_id` INTEGER")
+        con.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {closure} (
+                `ancestor` INTEGER NOT NULL,
+                `descendant` INTEGER NOT NULL,
+                `depth` INTEGER NOT NULL,
+                PRIMARY KEY (ancestor, descendant)
+            ) WITHOUT ROWID
+            """
+        )
+        con.execute(f"CREATE INDEX IF NOT EXISTS idx_{closure}_descendant ON {closure} (descendant, ancestor)")
+        con.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_parent_id ON {table} (parent_id)")
+        con.execute(f"INSERT INTO {closure} (ancestor, descendant, depth) SELECT id, id, 0 FROM {table}")
+        con.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_insert_closure AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO {closure} (ancestor, descendant, depth) VALUES (NEW.id, NEW.id, 0);
+                INSERT INTO {closure} (ancestor, descendant, depth)
+                SELECT ancestor, NEW.id, depth + 1 FROM {closure} WHERE descendant = NEW.parent_id;
+            END
+            """
+        )
+        con.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_parent_cycle BEFORE UPDATE OF parent_id ON {table}
+            WHEN NEW.parent_id IN (SELECT descendant FROM {closure} WHERE ancestor = NEW.id)
+            BEGIN
+                SELECT RAISE(ABORT, 'a node cannot be moved under itself');
+            END
+            """
+        )
+        con.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_move_closure AFTER UPDATE OF parent_id ON {table}
+            WHEN OLD.parent_id IS NOT NEW.parent_id
+            BEGIN
+                -- Detach the subtree from its former ancestors
+                DELETE FROM {closure}
+                WHERE descendant IN (SELECT descendant FROM {closure} WHERE ancestor = NEW.id)
+                AND ancestor NOT IN (SELECT descendant FROM {closure} WHERE ancestor = NEW.id);
+                -- Attach it below the ancestors of the new parent
+                INSERT INTO {closure} (ancestor, descendant, depth)
+                SELECT above.ancestor, below.descendant, above.depth + below.depth + 1
+                FROM {closure} AS above, {closure} AS below
+                WHERE above.descendant = NEW.parent_id AND below.ancestor = NEW.id;
+            END
+            """
+        )
+        con.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_delete_closure AFTER DELETE ON {table}
+            BEGIN
+                -- The children of a deleted node move up to its parent
+                UPDATE {table} SET parent_id = OLD.parent_id, updated_at = {_NOW}, version = version + 1
+                WHERE parent_id = OLD.id;
+                DELETE FROM {closure} WHERE descendant = OLD.id OR ancestor = OLD.id;
+            END
+            """
+        )
+
+
+@migration(10, "saved searches")
+def _saved_searches(con: sqlite3.Connection):
+    # Named queries of the search language and the IDs of the games matching them, up to date with the change feed
+    # as of `seq`: only the games changed since are checked against the query again
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS saved_searches (
+            `id` INTEGER PRIMARY KEY AUTOINCREMENT,
+            `name` TEXT NOT NULL UNIQUE,
+            `query` TEXT NOT NULL,
+            `include_descendants` INTEGER NOT NULL DEFAULT 0,
+            `seq` INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS saved_search_games (
+            `search_id` INTEGER NOT NULL,
+            `game_id` INTEGER NOT NULL,
+            PRIMARY KEY (search_id, game_id)
+        ) WITHOUT ROWID
+        """
+    )
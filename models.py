@@ -1,6 +1,14 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+from dataclasses import dataclass, field
 from enum import Enum
 from typing import Optional
+import unicodedata
+
+
+def title_key(title: str) -> str:
+    """Case- and accent-insensitive form of a title, used for indexed prefix searches."""
+    decomposed = unicodedata.normalize("NFKD", title.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
 
 
 class Material(Enum):
@@ -10,17 +18,29 @@ class Material(Enum):
     AUDITORY = 4
 
 
+# Validated models, used on the write path. from_attributes lets them validate the records below.
+
+
 class CognitiveCategory(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: Optional[int] = None
     name: str
+    # Version read with the row: an update is refused if the row changed since. None to overwrite.
+    version: Optional[int] = None
 
 
 class CognitiveFunction(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: Optional[int] = None
     name: str
+    version: Optional[int] = None
 
 
 class Game(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: Optional[int] = None
     title: str
     description: str = ""
@@ -28,3 +48,44 @@ class Game(BaseModel):
     materials: list[Material] = []
     categories: list[tuple[CognitiveCategory, int]]
     functions: list[tuple[CognitiveFunction, int]]
+    version: Optional[int] = None
+
+
+# Trusted read models, hydrated from the database without validation.
+# They have the same attributes as the models above, for a fraction of the time and memory.
+
+
+@dataclass(slots=True)
+class CognitiveCategoryRecord:
+    id: int
+    name: str
+    version: int = 0
+
+
+@dataclass(slots=True)
+class CognitiveFunctionRecord:
+    id: int
+    name: str
+    version: int = 0
+
+
+@dataclass(slots=True)
+class GameRecord:
+    id: int
+    title: str
+    description: str = ""
+    image: Optional[str] = None
+    materials: list[Material] = field(default_factory=list)
+    categories: list[tuple[CognitiveCategoryRecord, int]] = field(default_factory=list)
+    functions: list[tuple[CognitiveFunctionRecord, int]] = field(default_factory=list)
+    version: int = 0
+
+
+@dataclass(slots=True, frozen=True)
+class Change:
+    """An entry of the change feed: a row of `table` has been inserted, updated or deleted."""
+
+    seq: int
+    table: str
+    row_id: int
+    op: str
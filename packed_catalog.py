@@ -0,0 +1,438 @@
+"""
+Read-only packed catalog, for the kiosk machines which only browse: `export_pack` writes a compact binary file, and
+`PackedCatalog` maps it in memory and searches it with the same interface as `Database`, without SQLite.
+
+    python3 . export-pack --output catalog.pack
+    NEUROPSY_KIOSK=catalog.pack python3 .
+
+Opening a pack only reads its header: the sections are used in place, as arrays over the mapped file. Layout, all
+integers little-endian:
+
+    header      MAGIC, FORMAT_VERSION, number of games, change feed seq of the export, offset and length of each
+                section of SECTIONS
+    game_*      one array entry per game, ordered by ID; *_offsets have one more entry, the end of the last game
+    titles      the titles in UTF-8, each followed by a NUL byte, so that a title search is a regex over the section
+    materials   the materials of the games, from game_material_offsets
+    tag_*       the category then function (ID, weight) pairs of the games, from game_tag_offsets
+    {kind}_*    the category and function dictionaries: IDs, versions, name offsets and names
+    index_*     the inverted index: sorted tag IDs and, for each, a bitmap of the positions of its games, then one
+                bitmap per material. Bitmaps are (number of games + 7) // 8 bytes long.
+"""
+
+import array
+import bisect
+import json
+import logging
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import sys
+from typing import Callable
+
+from bitmap_index import bitmap_ids
+from database import Database, DatabaseError, NotFoundError, Projection
+from models import (
+    Change,
+    CognitiveCategoryRecord,
+    CognitiveFunctionRecord,
+    GameRecord,
+    Material,
+)
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"NPGPACK\0"
+FORMAT_VERSION = 1
+
+SECTIONS = (
+    "game_ids",
+    "game_versions",
+    "game_material_offsets",
+    "game_images",
+    "game_title_offsets",
+    "game_description_offsets",
+    "game_image_offsets",
+    "game_tag_offsets",
+    "game_category_counts",
+    "titles",
+    "descriptions",
+    "images",
+    "materials",
+    "tag_ids",
+    "tag_weights",
+    "category_ids",
+    "category_versions",
+    "category_name_offsets",
+    "category_names",
+    "function_ids",
+    "function_versions",
+    "function_name_offsets",
+    "function_names",
+    "index_category_ids",
+    "index_categories",
+    "index_function_ids",
+    "index_functions",
+    "index_materials",
+)
+# Array type of the sections which are not raw bytes
+TYPECODES = {
+    "game_ids": "I",
+    "game_versions": "I",
+    "game_material_offsets": "I",
+    "materials": "B",
+    "game_images": "B",
+    "game_title_offsets": "I",
+    "game_description_offsets": "I",
+    "game_image_offsets": "I",
+    "game_tag_offsets": "I",
+    "game_category_counts": "B",
+    "tag_ids": "I",
+    "tag_weights": "h",
+    "category_ids": "I",
+    "category_versions": "I",
+    "category_name_offsets": "I",
+    "function_ids": "I",
+    "function_versions": "I",
+    "function_name_offsets": "I",
+    "index_category_ids": "I",
+    "index_function_ids": "I",
+}
+# Singular and plural of the tag kinds, as used in the section names
+KINDS = (("category", "categories"), ("function", "functions"))
+HEADER = struct.Struct(f"<8sIIQ{2 * len(SECTIONS)}Q")
+
+# Characters of the titles, as the single-character wildcard of LIKE matches: one UTF-8 encoded character
+_CHARACTER = rb"(?:[\x01-\x7f]|[\xc0-\xff][\x80-\xbf]*)"
+
+
+class PackError(Exception):
+    pass
+
+
+def _strings(values: list[str]) -> tuple[array.array, bytes]:
+    offsets = array.array("I", [0])
+    data = bytearray()
+    for value in values:
+        data += value.encode()
+        offsets.append(len(data))
+    return offsets, bytes(data)
+
+
+def export_pack(db: Database, path: str) -> dict:
+    """Write the catalog to `path`, replacing the previous pack at once. Returns a summary."""
+    seq = db.last_change_seq()
+    try:
+        rows = db.con.execute(
+            "SELECT id, title, description, cognitive_categories, cognitive_functions, materials, image, version "
+            "FROM games ORDER BY id"
+        ).fetchall()
+    except sqlite3.Error as e:
+        raise DatabaseError(f"An error occurred with the database: {e}") from e
+    count = len(rows)
+    stride = (count + 7) // 8
+    sections: dict[str, bytes | array.array] = {}
+
+    sections["game_ids"] = array.array("I", [row[0] for row in rows])
+    sections["game_versions"] = array.array("I", [row[7] for row in rows])
+    material_offsets = array.array("I", [0])
+    material_values = array.array("B")
+    tag_offsets = array.array("I", [0])
+    category_counts = array.array("B")
+    tag_ids = array.array("I")
+    tag_weights = array.array("h")
+    postings: dict[str, dict[int, list[int]]] = {"categories": {}, "functions": {}}
+    material_postings: dict[Material, list[int]] = {material: [] for material in Material}
+    for position, row in enumerate(rows):
+        materials = [Material[name] for name in json.loads(row[5] or "[]")]
+        material_values.extend(material.value for material in materials)
+        material_offsets.append(len(material_values))
+        for material in set(materials):
+            material_postings[material].append(position)
+        categories = json.loads(row[3] or "[]")
+        functions = json.loads(row[4] or "[]")
+        if len(categories) > 255:
+            raise PackError(f"Game {row[0]} has more than 255 categories")
+        category_counts.append(len(categories))
+        for kind, tags in (("categories", categories), ("functions", functions)):
+            for tag_id, weight in tags:
+                tag_ids.append(tag_id)
+                tag_weights.append(weight)
+                postings[kind].setdefault(tag_id, []).append(position)
+        tag_offsets.append(len(tag_ids))
+    sections["game_material_offsets"] = material_offsets
+    sections["materials"] = material_values
+    sections["game_images"] = array.array("B", [row[6] is not None for row in rows])
+    sections["game_tag_offsets"] = tag_offsets
+    sections["game_category_counts"] = category_counts
+    sections["tag_ids"] = tag_ids
+    sections["tag_weights"] = tag_weights
+
+    sections["game_title_offsets"], sections["titles"] = _strings([row[1] + "\0" for row in rows])
+    sections["game_description_offsets"], sections["descriptions"] = _strings([row[2] or "" for row in rows])
+    sections["game_image_offsets"], sections["images"] = _strings([row[6] or "" for row in rows])
+
+    for kind, records in (
+        ("category", db.get_all_cognitive_categories()),
+        ("function", db.get_all_cognitive_functions()),
+    ):
+        records = sorted(records, key=lambda record: record.id)
+        sections[f"{kind}_ids"] = array.array("I", [record.id for record in records])
+        sections[f"{kind}_versions"] = array.array("I", [record.version for record in records])
+        sections[f"{kind}_name_offsets"], sections[f"{kind}_names"] = _strings([record.name for record in records])
+
+    def bitmap(positions: list[int]) -> bytes:
+        buffer = bytearray(stride)
+        for position in positions:
+            buffer[position >> 3] |= 1 << (position & 7)
+        return bytes(buffer)
+
+    for kind, kinds in KINDS:
+        ids = sorted(postings[kinds])
+        sections[f"index_{kind}_ids"] = array.array("I", ids)
+        sections[f"index_{kinds}"] = b"".join(bitmap(postings[kinds][tag_id]) for tag_id in ids)
+    sections["index_materials"] = b"".join(bitmap(material_postings[material]) for material in Material)
+
+    body = bytearray()
+    table = []
+    for name in SECTIONS:
+        data = sections[name]
+        data = data.tobytes() if isinstance(data, array.array) else data
+        if sys.byteorder == "big" and name in TYPECODES:
+            swapped = array.array(TYPECODES[name], data)
+            swapped.byteswap()
+            data = swapped.tobytes()
+        # Aligned on 8 bytes, so that every array can be used in place
+        body += b"\0" * (-(HEADER.size + len(body)) % 8)
+        table += [HEADER.size + len(body), len(data)]
+        body += data
+
+    temporary = path + ".partial"
+    with open(temporary, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, count, seq, *table))
+        f.write(body)
+    os.replace(temporary, path)
+    logger.info("Packed %d games into %s", count, path)
+    return {"games": count, "seq": seq, "size_bytes": HEADER.size + len(body)}
+
+
+class PackedCatalog:
+    """
+    Read-only catalog mapped from a file written by `export_pack`, answering the queries the search UI makes.
+
+    Records are built directly from the arrays, only for the games returned.
+    """
+
+    read_only = True
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise PackError("Packed catalogs can only be read on little-endian machines")
+        self.file = path
+        with open(path, "rb") as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise PackError(f"{path} is empty") from e
+        if len(self._map) < HEADER.size:
+            raise PackError(f"{path} is not a packed catalog")
+        magic, version, self.count, self.seq, *table = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise PackError(f"{path} is not a packed catalog")
+        if version != FORMAT_VERSION:
+            raise PackError(f"{path} has format version {version}, this version reads {FORMAT_VERSION}")
+        view = memoryview(self._map)
+        self._views = [view]
+        for i, name in enumerate(SECTIONS):
+            offset, length = table[2 * i], table[2 * i + 1]
+            if offset + length > len(self._map):
+                raise PackError(f"{path} is truncated")
+            section = view[offset : offset + length]
+            if name in TYPECODES:
+                section = section.cast(TYPECODES[name])
+            self._views.append(section)
+            setattr(self, "_" + name, section)
+        self._stride = (self.count + 7) // 8
+        self._taxonomies = None
+
+    def close(self):
+        # Views must be released before the map can be closed
+        for view in reversed(self._views):
+            view.release()
+        self._views.clear()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # The file never changes: the same interface as Database, without changes to follow
+
+    def subscribe(self, callback: Callable[[list[Change]], None]) -> Callable[[], None]:
+        return lambda: None
+
+    def publish_changes(self):
+        pass
+
+    def get_all_cognitive_categories(self) -> list[CognitiveCategoryRecord]:
+        return self._tags("category", CognitiveCategoryRecord)
+
+    def get_all_cognitive_functions(self) -> list[CognitiveFunctionRecord]:
+        return self._tags("function", CognitiveFunctionRecord)
+
+    def get_game(self, game_id: int = None, game_title: str = None, projection: Projection = None) -> GameRecord:
+        projection = projection or Projection.FULL
+        if game_id:
+            position = bisect.bisect_left(self._game_ids, game_id)
+            found = position < self.count and self._game_ids[position] == game_id
+        elif game_title:
+            position = next((i for i in range(self.count) if self._title(i) == game_title), None)
+            found = position is not None
+        else:
+            raise ValueError("Either game_id or game_title must be provided")
+        if not found:
+            raise NotFoundError(f"Game with ID {game_id} or title {game_title} not found.")
+        return self._records([position], projection)[0]
+
+    def get_all_games(self, projection: Projection = None) -> list:
+        return self._records(range(self.count), projection or Projection.SUMMARY)
+
+    def get_games_with_filters(
+        self,
+        game_title: str = None,
+        cognitive_categories_ids: list[int] = None,
+        cognitive_functions_ids: list[int] = None,
+        materials: list[Material] = None,
+        projection: Projection = None,
+        limit: int = None,
+        offset: int = 0,
+    ) -> list:
+        bitmap = self._search(game_title, cognitive_categories_ids, cognitive_functions_ids, materials)
+        positions = bitmap_ids(bitmap, offset, limit)
+        return self._records(positions, projection or Projection.FULL)
+
+    def get_facets(
+        self,
+        game_title: str = None,
+        cognitive_categories_ids: list[int] = None,
+        cognitive_functions_ids: list[int] = None,
+        materials: list[Material] = None,
+    ) -> dict:
+        bitmap = self._search(game_title, cognitive_categories_ids, cognitive_functions_ids, materials)
+        facets = {"games": bitmap.bit_count()}
+        for kind, kinds in KINDS:
+            ids = getattr(self, f"_index_{kind}_ids")
+            counts = {tag_id: (bitmap & self._bitmap(kinds, i)).bit_count() for i, tag_id in enumerate(ids)}
+            facets[f"cognitive_{kinds}"] = {tag_id: count for tag_id, count in counts.items() if count}
+        counts = {material.name: (bitmap & self._material(material)).bit_count() for material in Material}
+        facets["materials"] = {name: count for name, count in counts.items() if count}
+        return facets
+
+    def _search(self, game_title, categories_ids, functions_ids, materials) -> int:
+        """Bitmap of the positions of the matching games."""
+        result = (1 << self.count) - 1
+        for (kind, kinds), tag_ids in zip(KINDS, (categories_ids, functions_ids)):
+            if tag_ids:
+                ids = getattr(self, f"_index_{kind}_ids")
+                union = 0
+                for tag_id in tag_ids:
+                    i = bisect.bisect_left(ids, tag_id)
+                    if i < len(ids) and ids[i] == tag_id:
+                        union |= self._bitmap(kinds, i)
+                result &= union
+        if materials:
+            union = 0
+            for material in materials:
+                union |= self._material(material)
+            result &= union
+        if game_title and result:
+            result &= self._title_bitmap(game_title)
+        return result
+
+    def _title_bitmap(self, game_title: str) -> int:
+        """Positions of the titles matching `LIKE '%game_title%'`: ASCII letters ignore case, % and _ are wildcards."""
+        pattern = b"".join(
+            rb"[^\0]*" if c == "%" else _CHARACTER if c == "_" else re.escape(c.encode()) for c in game_title
+        )
+        offsets = self._game_title_offsets
+        bitmap = 0
+        end = 0
+        for match in re.finditer(pattern, self._titles, re.IGNORECASE):
+            if match.start() < end:
+                continue  # Another match in a title already matched
+            position = bisect.bisect_right(offsets, match.start()) - 1
+            if position == self.count:
+                break  # Empty match after the last title
+            bitmap |= 1 << position
+            end = offsets[position + 1]
+        return bitmap
+
+    def _bitmap(self, kinds: str, i: int) -> int:
+        section = getattr(self, f"_index_{kinds}")
+        return int.from_bytes(section[i * self._stride : (i + 1) * self._stride], "little")
+
+    def _material(self, material: Material) -> int:
+        i = list(Material).index(material)
+        return int.from_bytes(self._index_materials[i * self._stride : (i + 1) * self._stride], "little")
+
+    def _string(self, offsets, data, i: int) -> str:
+        return str(data[offsets[i] : offsets[i + 1]], "utf-8")
+
+    def _title(self, i: int) -> str:
+        return self._string(self._game_title_offsets, self._titles, i)[:-1]
+
+    def _tags(self, kind: str, record) -> list:
+        ids, versions = getattr(self, f"_{kind}_ids"), getattr(self, f"_{kind}_versions")
+        offsets, names = getattr(self, f"_{kind}_name_offsets"), getattr(self, f"_{kind}_names")
+        return [record(tag_id, self._string(offsets, names, i), versions[i]) for i, tag_id in enumerate(ids)]
+
+    def _records(self, positions, projection: Projection) -> list:
+        ids = self._game_ids
+        if projection is Projection.IDS:
+            return [ids[i] for i in positions]
+        if projection is Projection.TITLES:
+            return [(ids[i], self._title(i)) for i in positions]
+        if projection is Projection.FULL and self._taxonomies is None:
+            self._taxonomies = (
+                {category.id: category for category in self.get_all_cognitive_categories()},
+                {function.id: function for function in self.get_all_cognitive_functions()},
+            )
+        games = []
+        for i in positions:
+            game = GameRecord(
+                id=ids[i],
+                title=self._title(i),
+                image=self._string(self._game_image_offsets, self._images, i) if self._game_images[i] else None,
+                materials=[
+                    Material(value)
+                    for value in self._materials[self._game_material_offsets[i] : self._game_material_offsets[i + 1]]
+                ],
+                categories=[],
+                functions=[],
+            )
+            if projection is Projection.FULL:
+                categories, functions = self._taxonomies
+                start, end = self._game_tag_offsets[i], self._game_tag_offsets[i + 1]
+                middle = start + self._game_category_counts[i]
+                game.description = self._string(self._game_description_offsets, self._descriptions, i)
+                game.categories = [
+                    (_lookup(categories, self._tag_ids[j], "Cognitive category"), self._tag_weights[j])
+                    for j in range(start, middle)
+                ]
+                game.functions = [
+                    (_lookup(functions, self._tag_ids[j], "Cognitive function"), self._tag_weights[j])
+                    for j in range(middle, end)
+                ]
+                game.version = self._game_versions[i]
+            games.append(game)
+        return games
+
+
+def _lookup(entries: dict, entry_id: int, kind: str):
+    try:
+        return entries[entry_id]
+    except KeyError:
+        raise NotFoundError(f"{kind} with ID {entry_id} not found.") from None
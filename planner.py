@@ -0,0 +1,225 @@
+"""
+Session planner: a few games which together cover target cognitive functions and categories.
+
+A target such as "working memory >= 7" is covered by the games with at least that weight for it. Each game is reduced
+to the bitset of the targets it covers, so that choosing the games is a set cover over a handful of bits:
+
+- Games with the same bitset are interchangeable for the cover, and those covering a subset of another bitset are
+  never needed: only the remaining distinct bitsets are searched, whatever the size of the catalog.
+- A greedy pass, always taking the bitset covering most of the uncovered targets, gives a first plan.
+- A branch-and-bound search then looks for plans with fewer games, within a time budget, and collects the
+  alternatives of the same size.
+
+Plans are ranked by number of games, then by strength: the sum over the targets of the best weight of the plan.
+"""
+
+import json
+import logging
+import math
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from database import Database, DatabaseError
+from models import Material
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ALTERNATIVES = 3
+# Seconds the exact search may take before the best plans found so far are returned
+DEFAULT_TIME_BUDGET = 0.2
+# Games kept per bitset, to build the alternative plans
+GAMES_PER_COVER = 3
+# Plans of the best size collected by the exact search
+MAX_COVERS = 50
+
+TAG_TABLES = ("cognitive_categories", "cognitive_functions")
+
+
+@dataclass(slots=True, frozen=True)
+class Target:
+    table: str
+    tag_id: int
+    weight: int
+
+
+@dataclass(slots=True)
+class Plan:
+    game_ids: list[int]
+    strength: int
+    # Targets no game of the catalog covers, whatever the plan
+    uncovered: list[Target] = field(default_factory=list)
+    # False when the exact search was skipped or ran out of time: a plan with fewer games may exist
+    optimal: bool = False
+
+
+def targets(functions: dict[int, int] = None, categories: dict[int, int] = None) -> list[Target]:
+    """Targets from minimum weights by function and category ID."""
+    return [Target("cognitive_functions", tag_id, weight) for tag_id, weight in (functions or {}).items()] + [
+        Target("cognitive_categories", tag_id, weight) for tag_id, weight in (categories or {}).items()
+    ]
+
+
+def plan_session(
+    db: Database,
+    goals: list[Target],
+    materials: list[Material] = None,
+    alternatives: int = DEFAULT_ALTERNATIVES,
+    exact: bool = True,
+    time_budget: float = DEFAULT_TIME_BUDGET,
+) -> list[Plan]:
+    """
+    The best plans covering the goals, best first, using only games whose materials are all in `materials`
+    (any material when None).
+    """
+    if not goals:
+        return []
+    games = _candidates(db, goals, materials)
+
+    # Interchangeable games grouped by bitset, strongest first
+    by_cover: dict[int, list[tuple[int, int]]] = {}
+    for game_id, (cover, weights) in games.items():
+        by_cover.setdefault(cover, []).append((sum(weights.values()), game_id))
+    for ranked in by_cover.values():
+        ranked.sort(key=lambda entry: (-entry[0], entry[1]))
+        del ranked[GAMES_PER_COVER:]
+    covers = _undominated(list(by_cover))
+
+    reachable = 0
+    for cover in covers:
+        reachable |= cover
+    uncovered = [goal for bit, goal in enumerate(goals) if not reachable >> bit & 1]
+    if not reachable:
+        return []
+
+    solutions = [_greedy(covers, reachable)]
+    optimal = False
+    if exact:
+        deadline = time.perf_counter() + time_budget
+        found, optimal = _branch_and_bound(covers, reachable, len(solutions[0]), deadline)
+        solutions = found or solutions
+    logger.info(
+        "Planned %d targets over %d games (%d bitsets): %d games, optimal %s",
+        len(goals),
+        len(games),
+        len(covers),
+        len(solutions[0]),
+        optimal,
+    )
+
+    plans = {}
+    for solution in solutions:
+        # The strongest games of each bitset, then each second best one instead, as alternatives
+        choices = [by_cover[cover] for cover in solution]
+        candidates = [[ranked[0][1] for ranked in choices]]
+        for position, ranked in enumerate(choices):
+            for _, game_id in ranked[1:]:
+                candidates.append([*candidates[0][:position], game_id, *candidates[0][position + 1 :]])
+        for game_ids in candidates:
+            key = tuple(sorted(game_ids))
+            if key not in plans:
+                plans[key] = Plan(list(key), _strength(games, key, len(goals)), list(uncovered), optimal)
+    ranked_plans = sorted(plans.values(), key=lambda plan: (len(plan.game_ids), -plan.strength, plan.game_ids))
+    return ranked_plans[:alternatives]
+
+
+def _candidates(db: Database, goals: list[Target], materials: Optional[list[Material]]) -> dict:
+    """(bitset of covered goals, weight by goal bit) of every allowed game covering at least one goal, by game ID."""
+    allowed = None if materials is None else {material.name for material in materials}
+    games: dict[int, tuple[int, dict[int, int]]] = {}
+    try:
+        for table in TAG_TABLES:
+            bits: dict[int, list[tuple[int, int]]] = {}
+            for bit, goal in enumerate(goals):
+                if goal.table == table:
+                    bits.setdefault(goal.tag_id, []).append((bit, goal.weight))
+            if not bits:
+                continue
+            placeholders = ", ".join("?" * len(bits))
+            cursor = db.con.execute(
+                f"""
+                SELECT games.id, games.materials, json_extract(tag.value, '$[0]'), json_extract(tag.value, '$[1]')
+                FROM games, json_each(COALESCE(NULLIF(games.{table}, ''), '[]')) AS tag
+                WHERE json_extract(tag.value, '$[0]') IN ({placeholders})
+                """,
+                list(bits),
+            )
+            for game_id, game_materials, tag_id, weight in cursor:
+                if allowed is not None and not allowed.issuperset(json.loads(game_materials or "[]")):
+                    continue
+                for bit, minimum in bits[tag_id]:
+                    if weight >= minimum:
+                        cover, weights = games.get(game_id, (0, {}))
+                        weights[bit] = weight
+                        games[game_id] = (cover | 1 << bit, weights)
+    except sqlite3.Error as e:
+        raise DatabaseError(f"An error occurred with the database: {e}") from e
+    return games
+
+
+def _undominated(covers: list[int]) -> list[int]:
+    """The bitsets which are not a subset of another one, largest first."""
+    covers = sorted(covers, key=lambda cover: (-cover.bit_count(), cover))
+    kept = []
+    for cover in covers:
+        if not any(cover | other == other for other in kept):
+            kept.append(cover)
+    return kept
+
+
+def _greedy(covers: list[int], full: int) -> list[int]:
+    solution = []
+    covered = 0
+    while covered != full:
+        best = max(covers, key=lambda cover: (cover & ~covered).bit_count())
+        solution.append(best)
+        covered |= best
+    return solution
+
+
+def _branch_and_bound(covers: list[int], full: int, upper_bound: int, deadline: float) -> tuple[list[list[int]], bool]:
+    """
+    Every smallest cover (up to MAX_COVERS of them), and whether the search completed before the deadline.
+
+    Each step branches on the uncovered target with the fewest covering bitsets. A branch is cut when even the
+    largest bitset could not cover the rest with the games left.
+    """
+    by_bit = {
+        bit: [cover for cover in covers if cover >> bit & 1] for bit in range(full.bit_length()) if full >> bit & 1
+    }
+    largest = covers[0].bit_count()
+    best = upper_bound
+    found: dict[frozenset, list[int]] = {}
+    completed = True
+
+    def visit(chosen: list[int], covered: int):
+        nonlocal best, completed
+        if covered == full:
+            if len(chosen) < best:
+                best = len(chosen)
+                found.clear()
+            if len(found) < MAX_COVERS:
+                found.setdefault(frozenset(chosen), list(chosen))
+            return
+        if time.perf_counter() > deadline:
+            completed = False
+            return
+        rest = full & ~covered
+        needed = len(chosen) + math.ceil(rest.bit_count() / largest)
+        if needed > best or (needed == best and len(found) >= MAX_COVERS):
+            return
+        bit = min((bit for bit in by_bit if rest >> bit & 1), key=lambda bit: len(by_bit[bit]))
+        for cover in sorted(by_bit[bit], key=lambda cover: -(cover & rest).bit_count()):
+            chosen.append(cover)
+            visit(chosen, covered | cover)
+            chosen.pop()
+            if not completed:
+                return
+
+    visit([], 0)
+    return list(found.values()), completed
+
+
+def _strength(games: dict, game_ids: tuple[int, ...], goal_count: int) -> int:
+    return sum(max(games[game_id][1].get(bit, 0) for game_id in game_ids) for bit in range(goal_count))
@@ -0,0 +1,240 @@
+"""
+Search query language, compiled into the WHERE clause of a single parameterized statement on the games table.
+
+    func:"working memory">=7 cat:attention mat:VISUAL -mat:VERBAL dobble
+
+- Bare words and "quoted phrases" are searched in the titles, case and accents ignored. `title:` does the same and
+  `desc:` searches the descriptions. In a quoted phrase, `\\"` stands for a quote and `\\\\` for a backslash.
+- `cat:NAME` and `func:NAME` match the games having that category or function, whatever its weight, or only with a
+  weight compared to a number with `>=`, `>`, `<=`, `<` or `=`. Names are case-insensitive.
+- `mat:NAME` matches the games using that material.
+- Terms are all required; `OR` between two terms makes either of them enough, `-` or `NOT` before a term excludes
+  the games it matches, and parentheses group terms. Keywords are upper case, so titles can still contain "or".
+
+The statement only depends on the shape of the query: its operators, fields and comparisons, not on the names,
+words and numbers given, which are all parameters. The plans are cached by shape, so typing in the search box only
+tokenizes the query again, and the same statement is reused by SQLite's own statement cache.
+"""
+
+import functools
+import re
+from typing import Callable, Optional
+
+from models import Material, title_key
+
+# Canonical field of each prefix accepted before a colon
+FIELDS = {
+    "cat": "category",
+    "category": "category",
+    "func": "function",
+    "function": "function",
+    "mat": "material",
+    "material": "material",
+    "title": "title",
+    "desc": "description",
+    "description": "description",
+}
+COMPARISONS = (">=", "<=", ">", "<", "=")
+PLAN_CACHE_SIZE = 256
+
+_TOKEN = re.compile(
+    rf"""
+    \s*(?:
+        (?P<open>\()
+      | (?P<close>\))
+      | (?P<field>(?:{"|".join(FIELDS)}):)
+      | (?P<compare>{"|".join(COMPARISONS)})
+      | (?P<negate>-)(?=[^\s)])
+      | "(?P<quoted>(?:[^"\\]|\\.)*)"?
+      | (?P<word>[^\s()"<>=]+)
+    )
+    """,
+    re.VERBOSE | re.IGNORECASE,
+)
+_ESCAPED = re.compile(r"\\(.)")
+_KEYWORDS = {"AND": "AND", "OR": "OR", "NOT": "-"}
+_TAG_TABLES = {"category": "cognitive_categories", "function": "cognitive_functions"}
+
+
+class QueryError(ValueError):
+    """The query cannot be parsed."""
+
+
+def tokenize(text: str) -> tuple[tuple[str, ...], list[str]]:
+    """The shape of the query, a tuple of token kinds, and its literal values in order."""
+    shape, values = [], []
+    text = text.rstrip()
+    position = 0
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        position = match.end()
+        kind = match.lastgroup
+        if kind == "open":
+            shape.append("(")
+        elif kind == "close":
+            shape.append(")")
+        elif kind == "field":
+            shape.append(f"{FIELDS[match['field'][:-1].lower()]}:")
+        elif kind == "compare":
+            shape.append(match["compare"])
+        elif kind == "negate":
+            shape.append("-")
+        elif kind == "word" and match["word"] in _KEYWORDS:
+            shape.append(_KEYWORDS[match["word"]])
+        elif kind == "quoted":
+            shape.append("value")
+            values.append(_ESCAPED.sub(r"\1", match["quoted"]))
+        else:
+            shape.append("value")
+            values.append(match[kind])
+    return tuple(shape), values
+
+
+def quote(value: str) -> str:
+    """The value as a quoted phrase, which `tokenize` reads back as a single value whatever it contains."""
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def _contains(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _title(value: str) -> str:
+    return _contains(title_key(value))
+
+
+def _material(value: str) -> str:
+    if value.upper() not in Material.__members__:
+        raise QueryError(f"Unknown material {value!r}, expected one of {', '.join(Material.__members__)}")
+    return value.upper()
+
+
+def _weight(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise QueryError(f"Expected a weight, got {value!r}") from None
+
+
+class _Parser:
+    """Recursive descent over a shape: OR binds looser than AND, which binds looser than NOT."""
+
+    def __init__(self, shape: tuple[str, ...], include_descendants: bool):
+        self.shape = shape
+        self.position = 0
+        self.include_descendants = include_descendants
+        # One per value of the shape, turning it into its parameter
+        self.converters: list[Callable] = []
+
+    def peek(self) -> str:
+        return self.shape[self.position] if self.position < len(self.shape) else None
+
+    def take(self) -> str:
+        kind = self.peek()
+        if kind is None:
+            raise QueryError("The query is incomplete")
+        self.position += 1
+        return kind
+
+    def value(self, converter: Callable, after: str):
+        if self.take() != "value":
+            raise QueryError(f"Expected a value after {after}")
+        self.converters.append(converter)
+
+    def parse(self) -> str:
+        if not self.shape:
+            return "1"
+        where = self.disjunction()
+        if self.position < len(self.shape):
+            raise QueryError(f"Unexpected {self.peek()!r}")
+        return where
+
+    def disjunction(self) -> str:
+        terms = [self.conjunction()]
+        while self.peek() == "OR":
+            self.position += 1
+            terms.append(self.conjunction())
+        return terms[0] if len(terms) == 1 else f"({' OR '.join(terms)})"
+
+    def conjunction(self) -> str:
+        terms = [self.negation()]
+        while self.peek() not in (None, ")", "OR"):
+            if self.peek() == "AND":
+                self.position += 1
+            terms.append(self.negation())
+        return terms[0] if len(terms) == 1 else f"({' AND '.join(terms)})"
+
+    def negation(self) -> str:
+        if self.peek() == "-":
+            self.position += 1
+            return f"NOT {self.negation()}"
+        return self.term()
+
+    def term(self) -> str:
+        kind = self.take()
+        if kind == "(":
+            where = self.disjunction()
+            if self.take() != ")":
+                raise QueryError("Missing closing parenthesis")
+            return where
+        if kind == "value":
+            self.converters.append(_title)
+            return "(title_key LIKE ? ESCAPE '\\')"
+        if kind == "title:":
+            self.value(_title, kind)
+            return "(title_key LIKE ? ESCAPE '\\')"
+        if kind == "description:":
+            self.value(_contains, kind)
+            return "(COALESCE(description, '') LIKE ? ESCAPE '\\')"
+        if kind == "material:":
+            self.value(_material, kind)
+            return "EXISTS (SELECT 1 FROM json_each(COALESCE(NULLIF(materials, ''), '[]')) WHERE value = ?)"
+        if kind in ("category:", "function:"):
+            return self.tag(_TAG_TABLES[kind[:-1]], kind)
+        raise QueryError(f"Unexpected {kind!r}")
+
+    def tag(self, table: str, kind: str) -> str:
+        self.value(str, kind)
+        # Resolved by SQLite, so that the plan does not depend on the taxonomy
+        tag_ids = f"SELECT id FROM {table} WHERE name = ? COLLATE NOCASE"
+        if self.include_descendants:
+            tag_ids = f"SELECT descendant FROM {table}_closure WHERE ancestor IN ({tag_ids})"
+        condition = f"json_extract(value, '$[0]') IN ({tag_ids})"
+        if self.peek() in COMPARISONS:
+            comparison = self.take()
+            self.value(_weight, comparison)
+            condition += f" AND json_extract(value, '$[1]') {comparison} ?"
+        return f"EXISTS (SELECT 1 FROM json_each(COALESCE(NULLIF({table}, ''), '[]')) WHERE {condition})"
+
+
+@functools.lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _plan(shape: tuple[str, ...], include_descendants: bool) -> tuple[str, tuple[Callable, ...]]:
+    parser = _Parser(shape, include_descendants)
+    return parser.parse(), tuple(parser.converters)
+
+
+def compile_query(text: str, include_descendants: bool = False) -> tuple[str, list]:
+    """
+    SQL condition on the games table matching the query, and its parameters. With `include_descendants`, `cat:` and
+    `func:` also match the descendants of the tag named.
+    """
+    shape, values = tokenize(text)
+    where, converters = _plan(shape, include_descendants)
+    return where, [convert(value) for convert, value in zip(converters, values)]
+
+
+def title_terms(text: str) -> Optional[list[str]]:
+    """
+    The title keys searched by a query made only of words and phrases, all required, or None for any other query.
+    Raises QueryError like `compile_query`.
+    """
+    shape, values = tokenize(text)
+    _plan(shape, False)
+    if not values or any(kind not in ("value", "AND") for kind in shape):
+        return None
+    return [title_key(value) for value in values]
+
+
+plan_cache_info = _plan.cache_info
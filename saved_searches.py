@@ -0,0 +1,219 @@
+"""
+Saved searches: named queries of the search language whose matching games are stored in the database, so that
+opening one is an indexed read of its game IDs instead of a new search over the whole catalog.
+
+    python3 . collection "Young, tactile" --save 'mat:TACTILE func:attention>=6'
+    python3 . collection "Young, tactile" --fields titles
+
+Each saved search keeps the change feed seq its games are up to date with. Bringing it up to date only checks the
+games changed since then against its query: they are removed from the search, and those still matching are added
+back by a single statement over their IDs. Renaming, moving or deleting a category or function can change which
+games a query names, so the games tagged with it or with one of its descendants are checked again too.
+
+Saved searches are brought up to date when they are opened. On a read-only connection, a search which is not up to
+date is run as a query instead.
+"""
+
+import logging
+import sqlite3
+from dataclasses import dataclass
+
+from database import Database, DatabaseError, NotFoundError, Projection
+from models import Change
+from query_language import compile_query
+
+logger = logging.getLogger(__name__)
+
+TAG_TABLES = ("cognitive_categories", "cognitive_functions")
+# Below the default limit of SQLite on the number of parameters
+CHUNK_SIZE = 900
+
+
+@dataclass(slots=True)
+class SavedSearch:
+    id: int
+    name: str
+    query: str
+    include_descendants: bool
+    seq: int
+    games: int = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "query": self.query,
+            "include_descendants": self.include_descendants,
+            "games": self.games,
+        }
+
+
+_SELECT = """
+    SELECT id, name, query, include_descendants, seq,
+           (SELECT COUNT(*) FROM saved_search_games WHERE search_id = saved_searches.id)
+    FROM saved_searches
+"""
+
+
+def _search(row: tuple) -> SavedSearch:
+    search_id, name, query, include_descendants, seq, games = row
+    return SavedSearch(search_id, name, query, bool(include_descendants), seq, games)
+
+
+def _chunks(game_ids: list[int]):
+    for start in range(0, len(game_ids), CHUNK_SIZE):
+        yield game_ids[start : start + CHUNK_SIZE]
+
+
+def save(db: Database, name: str, query: str, include_descendants: bool = False) -> SavedSearch:
+    """
+    Save the query under this name, replacing the search of the same name, and store the games matching it.
+
+    Raises `query_language.QueryError` if the query cannot be parsed.
+    """
+    where, params = compile_query(query, include_descendants)
+    logger.info("Saving the search %s", name)
+    try:
+        with db.con:
+            # Written first, so that the games and the seq below are read in the same write transaction
+            db.con.execute(
+                """
+                INSERT INTO saved_searches (name, query, include_descendants) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE
+                SET query = excluded.query, include_descendants = excluded.include_descendants
+                """,
+                (name, query, include_descendants),
+            )
+            (search_id,) = db.con.execute("SELECT id FROM saved_searches WHERE name = ?", (name,)).fetchone()
+            db.con.execute("DELETE FROM saved_search_games WHERE search_id = ?", (search_id,))
+            db.con.execute(
+                f"INSERT INTO saved_search_games (search_id, game_id) SELECT ?, id FROM games WHERE {where}",
+                [search_id, *params],
+            )
+            db.con.execute(
+                "UPDATE saved_searches SET seq = (SELECT COALESCE(MAX(seq), 0) FROM changes) WHERE id = ?",
+                (search_id,),
+            )
+    except sqlite3.Error as e:
+        raise DatabaseError(f"An error occurred with the database: {e}") from e
+    return get(db, name)
+
+
+def get(db: Database, name: str) -> SavedSearch:
+    try:
+        row = db.con.execute(f"{_SELECT} WHERE name = ?", (name,)).fetchone()
+    except sqlite3.Error as e:
+        raise DatabaseError(f"An error occurred with the database: {e}") from e
+    if row is None:
+        raise NotFoundError(f"Saved search {name!r} not found.")
+    return _search(row)
+
+
+def get_all(db: Database) -> list[SavedSearch]:
+    try:
+        return [_search(row) for row in db.con.execute(f"{_SELECT} ORDER BY name")]
+    except sqlite3.Error as e:
+        raise DatabaseError(f"An error occurred with the database: {e}") from e
+
+
+def delete(db: Database, name: str):
+    search = get(db, name)
+    logger.info("Deleting the saved search %s", name)
+    try:
+        with db.con:
+            db.con.execute("DELETE FROM saved_search_games WHERE search_id = ?", (search.id,))
+            db.con.execute("DELETE FROM saved_searches WHERE id = ?", (search.id,))
+    except sqlite3.Error as e:
+        raise DatabaseError(f"An error occurred with the database: {e}") from e
+
+
+def _changed_games(db: Database, changes: list[Change]) -> list[int]:
+    """IDs of the games whose match may have changed with these changes of the feed."""
+    game_ids = {change.row_id for change in changes if change.table == "games"}
+    for table in TAG_TABLES:
+        tag_ids = sorted({change.row_id for change in changes if change.table == table})
+        for chunk in _chunks(tag_ids):
+            cursor = db.con.execute(
+                f"""
+                SELECT DISTINCT games.id
+                FROM games, json_each(COALESCE(NULLIF(games.{table}, ''), '[]')) AS tag
+                WHERE json_extract(tag.value, '$[0]') IN (
+                    SELECT descendant FROM {table}_closure WHERE ancestor IN ({", ".join("?" * len(chunk))})
+                )
+                """,
+                chunk,
+            )
+            game_ids.update(row[0] for row in cursor)
+    return sorted(game_ids)
+
+
+def refresh(db: Database, names: list[str] = None) -> dict[str, int]:
+    """
+    Bring the saved searches (all of them by default) up to date with the change feed. Returns the number of games
+    checked again for each search which was not up to date.
+    """
+    searches = [get(db, name) for name in names] if names else get_all(db)
+    checked = {}
+    try:
+        changes = db.changes_since(min((search.seq for search in searches), default=0))
+        if not changes:
+            return checked
+        # Searches saved or refreshed together share their seq, and so the games to check
+        changed_games: dict[int, list[int]] = {}
+        with db.con:
+            for search in searches:
+                if search.seq >= changes[-1].seq:
+                    continue
+                if search.seq not in changed_games:
+                    changed_games[search.seq] = _changed_games(
+                        db, [change for change in changes if change.seq > search.seq]
+                    )
+                game_ids = changed_games[search.seq]
+                where, params = compile_query(search.query, search.include_descendants)
+                for chunk in _chunks(game_ids):
+                    placeholders = ", ".join("?" * len(chunk))
+                    db.con.execute(
+                        f"DELETE FROM saved_search_games WHERE search_id = ? AND game_id IN ({placeholders})",
+                        [search.id, *chunk],
+                    )
+                    db.con.execute(
+                        f"""
+                        INSERT INTO saved_search_games (search_id, game_id)
+                        SELECT ?, id FROM games WHERE id IN ({placeholders}) AND {where}
+                        """,
+                        [search.id, *chunk, *params],
+                    )
+                db.con.execute("UPDATE saved_searches SET seq = ? WHERE id = ?", (changes[-1].seq, search.id))
+                checked[search.name] = len(game_ids)
+    except sqlite3.Error as e:
+        raise DatabaseError(f"An error occurred with the database: {e}") from e
+    if checked:
+        logger.info("Refreshed the saved searches %s", checked)
+    return checked
+
+
+def games(db: Database, name: str, projection: Projection = None, limit: int = None, offset: int = 0) -> list:
+    """The games of the saved search, ordered by ID, brought up to date first."""
+    search = get(db, name)
+    try:
+        up_to_date = search.seq >= db.last_change_seq()
+        if not up_to_date and db.read_only:
+            # A limit, even -1, orders the games by ID like the stored ones
+            return db.get_games_with_filters(
+                search_query=search.query,
+                include_descendants=search.include_descendants,
+                projection=projection,
+                limit=-1 if limit is None else limit,
+                offset=offset,
+            )
+        if not up_to_date:
+            refresh(db, [name])
+        cursor = db.con.execute(
+            "SELECT game_id FROM saved_search_games WHERE search_id = ? ORDER BY game_id LIMIT ? OFFSET ?",
+            (search.id, -1 if limit is None else limit, offset),
+        )
+        game_ids = [row[0] for row in cursor]
+    except sqlite3.Error as e:
+        raise DatabaseError(f"An error occurred with the database: {e}") from e
+    if projection is Projection.IDS:
+        return game_ids
+    return db.get_games_by_ids(game_ids, projection)
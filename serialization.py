@@ -0,0 +1,93 @@
+"""Conversion of games to and from plain dicts and CSV rows, shared by the exports, imports and APIs."""
+
+from database import Projection
+from models import Game, Material, CognitiveCategoryRecord, CognitiveFunctionRecord
+
+CSV_FIELDS: dict[Projection, list[str]] = {
+    Projection.IDS: ["id"],
+    Projection.TITLES: ["id", "title"],
+    Projection.SUMMARY: ["id", "title", "image", "materials"],
+    Projection.FULL: ["id", "title", "description", "image", "materials", "categories", "functions"],
+}
+
+_LIST_SEPARATOR = ";"
+_WEIGHT_SEPARATOR = ":"
+
+
+def to_dict(item, projection: Projection = Projection.FULL) -> dict:
+    """
+    Plain dict of an object returned by a game query with the given projection.
+
+    Tags are written by name with their weight, so that the result can be imported into another catalog.
+    """
+    if projection is Projection.IDS:
+        return {"id": item}
+    if projection is Projection.TITLES:
+        return {"id": item[0], "title": item[1]}
+    data = {
+        "id": item.id,
+        "title": item.title,
+        "image": item.image,
+        "materials": [material.name for material in item.materials],
+    }
+    if projection is Projection.FULL:
+        data["description"] = item.description
+        data["categories"] = [{"name": category.name, "weight": weight} for category, weight in item.categories]
+        data["functions"] = [{"name": function.name, "weight": weight} for function, weight in item.functions]
+    return data
+
+
+def to_csv_row(data: dict) -> dict:
+    """Flatten a dict from `to_dict` into a CSV row: lists are joined with ';' and tags written as 'name:weight'."""
+    row = dict(data)
+    if "materials" in row:
+        row["materials"] = _LIST_SEPARATOR.join(row["materials"])
+    for key in ("categories", "functions"):
+        if key in row:
+            row[key] = _LIST_SEPARATOR.join(f"{tag['name']}{_WEIGHT_SEPARATOR}{tag['weight']}" for tag in row[key])
+    return row
+
+
+def from_csv_row(row: dict) -> dict:
+    """Inverse of `to_csv_row`."""
+    data = {key: value for key, value in row.items() if value not in (None, "")}
+    if "id" in data:
+        data["id"] = int(data["id"])
+    data["materials"] = [name for name in (row.get("materials") or "").split(_LIST_SEPARATOR) if name]
+    for key in ("categories", "functions"):
+        tags = []
+        for tag in (row.get(key) or "").split(_LIST_SEPARATOR):
+            if tag:
+                name, _, weight = tag.rpartition(_WEIGHT_SEPARATOR)
+                tags.append({"name": name, "weight": int(weight)})
+        data[key] = tags
+    return data
+
+
+def tag_names(data: dict) -> tuple[set[str], set[str]]:
+    """Names of the categories and functions referenced by a dict from `to_dict`."""
+    return (
+        {tag["name"] for tag in data.get("categories", [])},
+        {tag["name"] for tag in data.get("functions", [])},
+    )
+
+
+def from_dict(
+    data: dict,
+    categories: dict[str, CognitiveCategoryRecord],
+    functions: dict[str, CognitiveFunctionRecord],
+) -> Game:
+    """
+    Validated Game from a dict of `to_dict`, resolving the tags by name.
+
+    The ID is not kept: it only has a meaning in the catalog the dict comes from.
+    Raises KeyError for unknown tag names and ValueError for invalid data.
+    """
+    return Game(
+        title=data["title"],
+        description=data.get("description") or "",
+        image=data.get("image"),
+        materials=[Material[name] for name in data.get("materials", [])],
+        categories=[(categories[tag["name"]], tag["weight"]) for tag in data.get("categories", [])],
+        functions=[(functions[tag["name"]], tag["weight"]) for tag in data.get("functions", [])],
+    )
@@ -0,0 +1,411 @@
+"""
+Read-only JSON HTTP API over the catalog, for colleagues browsing it from the LAN.
+
+    python3 . serve --host 0.0.0.0 --port 8080
+
+Endpoints (all GET):
+    /api/games?q=&title=&category=ID&function=ID&material=NAME&descendants=1&fields=summary&limit=50&offset=0
+    /api/games/<id>
+    /api/games/<id>/thumbnail
+    /api/games/<id>/similar?limit=10
+    /api/facets?q=&title=&category=ID&function=ID&material=NAME&descendants=1
+    /api/taxonomy
+    /api/collections
+    /api/collections/<name>?fields=summary&limit=50&offset=0
+
+Requests are handled by a bounded pool of worker threads, each with its own read-only SQLite connection.
+Responses carry an ETag and are gzipped when the client accepts it. Each worker keeps the last responses it built,
+and drops them as soon as another connection commits to the database (PRAGMA data_version changes).
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import image_store
+import saved_searches
+import serialization
+import similarity
+from database import Database, DatabaseError, NotFoundError, Projection
+from models import Material
+from query_language import QueryError, compile_query
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 8
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+RESPONSE_CACHE_SIZE = 256
+GZIP_MIN_SIZE = 1024
+THUMBNAIL_SIZE = (150, 150)
+
+
+class BadRequest(Exception):
+    pass
+
+
+class Response:
+    __slots__ = ("status", "content_type", "body", "etag", "_gzipped")
+
+    def __init__(self, status: int, content_type: str, body: bytes):
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self._gzipped = None
+
+    @classmethod
+    def json(cls, data, status: int = HTTPStatus.OK) -> "Response":
+        return cls(status, "application/json", json.dumps(data, ensure_ascii=False).encode())
+
+    def gzipped(self) -> bytes:
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=5)
+        return self._gzipped
+
+    @property
+    def gzip_etag(self) -> str:
+        """The gzipped body is another representation, with its own strong validator."""
+        return self.etag[:-1] + '-gzip"'
+
+
+class _Worker(threading.local):
+    """State of a worker thread: its read-only connection, its cache of responses and its similarity matrix."""
+
+    db: Optional[Database] = None
+    data_version: Optional[int] = None
+    cache: Optional[OrderedDict] = None
+    similar_games = None
+
+
+class CatalogServer(HTTPServer):
+    """HTTP server handing the requests to a bounded pool of worker threads."""
+
+    allow_reuse_address = True
+
+    def __init__(
+        self, address: tuple[str, int], db_file: str, workers: int = DEFAULT_WORKERS, images_root: str = "."
+    ):
+        super().__init__(address, CatalogRequestHandler)
+        self.db_file = db_file
+        self.images_root = os.path.abspath(images_root)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="catalog-worker")
+        # Accepting blocks once every worker is busy and as many requests are queued: the rest waits in the backlog
+        self.slots = threading.BoundedSemaphore(workers * 2)
+        self.worker = _Worker()
+        self._thumbnails: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._thumbnails_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+    def worker_db(self) -> Database:
+        """The read-only Database of the current worker, whose response cache is reset if the data changed."""
+        worker = self.worker
+        if worker.db is None:
+            worker.db = Database(file=self.db_file, read_only=True)
+            worker.cache = OrderedDict()
+        data_version = worker.db.con.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != worker.data_version:
+            worker.data_version = data_version
+            worker.cache.clear()
+        return worker.db
+
+    def cached(self, key: str, build) -> Response:
+        db = self.worker_db()
+        cache = self.worker.cache
+        response = cache.get(key)
+        if response is None:
+            response = build(db)
+            cache[key] = response
+            if len(cache) > RESPONSE_CACHE_SIZE:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(key)
+        return response
+
+    def thumbnail(self, path: str) -> Optional[tuple[bytes, str]]:
+        """
+        A PNG thumbnail of the image, or the image itself when Pillow is not installed.
+
+        Only paths stored in the database are served. Relative ones are relative to the database directory.
+        """
+        full_path = os.path.abspath(os.path.join(self.images_root, path))
+        if not os.path.isfile(full_path):
+            return None
+        mtime = os.path.getmtime(full_path)
+        with self._thumbnails_lock:
+            cached = self._thumbnails.get(full_path)
+            if cached and cached[0] == mtime:
+                self._thumbnails.move_to_end(full_path)
+                return cached[1], "image/png"
+        try:
+            from PIL import Image
+        except ImportError:
+            with open(full_path, "rb") as f:
+                return f.read(), "application/octet-stream"
+        with Image.open(full_path) as image:
+            image.thumbnail(THUMBNAIL_SIZE)
+            output = io.BytesIO()
+            image.save(output, format="PNG")
+        data = output.getvalue()
+        with self._thumbnails_lock:
+            self._thumbnails[full_path] = (mtime, data)
+            if len(self._thumbnails) > RESPONSE_CACHE_SIZE:
+                self._thumbnails.popitem(last=False)
+        return data, "image/png"
+
+
+def _ints(query: dict, key: str) -> list[int]:
+    try:
+        return [int(value) for value in query.get(key, [])]
+    except ValueError:
+        raise BadRequest(f"{key} must be an integer") from None
+
+
+def _filters(query: dict) -> dict:
+    try:
+        materials = [Material[name] for name in query.get("material", [])]
+    except KeyError as e:
+        raise BadRequest(f"unknown material {e}") from None
+    search_query = query.get("q", [None])[0]
+    if search_query:
+        try:
+            compile_query(search_query)
+        except QueryError as e:
+            raise BadRequest(f"invalid query: {e}") from None
+    return {
+        "game_title": query.get("title", [None])[0],
+        "cognitive_categories_ids": _ints(query, "category"),
+        "cognitive_functions_ids": _ints(query, "function"),
+        "materials": materials,
+        "include_descendants": query.get("descendants", ["0"])[0] not in ("", "0", "false"),
+        "search_query": search_query,
+    }
+
+
+def _page(query: dict) -> tuple[Projection, int, int]:
+    fields = query.get("fields", ["summary"])[0]
+    try:
+        projection = Projection[fields.upper()]
+    except KeyError:
+        raise BadRequest(f"unknown fields {fields}") from None
+    limit = max(0, min(_ints(query, "limit")[0] if "limit" in query else DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    offset = max(0, _ints(query, "offset")[0] if "offset" in query else 0)
+    return projection, limit, offset
+
+
+def search_games(db: Database, query: dict) -> Response:
+    projection, limit, offset = _page(query)
+    games = db.get_games_with_filters(**_filters(query), projection=projection, limit=limit, offset=offset)
+    return Response.json(
+        {
+            "games": [serialization.to_dict(game, projection) for game in games],
+            "limit": limit,
+            "offset": offset,
+        }
+    )
+
+
+def game_detail(db: Database, game_id: int) -> Response:
+    return Response.json(serialization.to_dict(db.get_game(game_id=game_id)))
+
+
+def similar_games(server: "CatalogServer", db: Database, game_id: int, query: dict) -> Response:
+    limit = max(0, min(_ints(query, "limit")[0] if "limit" in query else similarity.DEFAULT_LIMIT, MAX_PAGE_SIZE))
+    worker = server.worker
+    if worker.similar_games is None:
+        # Built once per worker, then kept up to date from the change feed
+        worker.similar_games = similarity.SimilarGames(db, follow=False)
+    games = []
+    for similar_id, score in worker.similar_games.similar(game_id, limit):
+        _, title = db.get_game(game_id=similar_id, projection=Projection.TITLES)
+        games.append({"id": similar_id, "title": title, "score": round(score, 4)})
+    return Response.json({"games": games})
+
+
+def facets(db: Database, query: dict) -> Response:
+    counts = db.get_facets(**_filters(query))
+    return Response.json(
+        {
+            "games": counts["games"],
+            "categories": [
+                {"id": category.id, "name": category.name, "count": counts["cognitive_categories"].get(category.id, 0)}
+                for category in db.get_all_cognitive_categories()
+            ],
+            "functions": [
+                {"id": function.id, "name": function.name, "count": counts["cognitive_functions"].get(function.id, 0)}
+                for function in db.get_all_cognitive_functions()
+            ],
+            "materials": [
+                {"name": material.name, "count": counts["materials"].get(material.name, 0)} for material in Material
+            ],
+        }
+    )
+
+
+def collections(db: Database) -> Response:
+    return Response.json({"collections": [search.as_dict() for search in saved_searches.get_all(db)]})
+
+
+def collection_games(db: Database, name: str, query: dict) -> Response:
+    projection, limit, offset = _page(query)
+    games = saved_searches.games(db, name, projection, limit, offset)
+    return Response.json(
+        {
+            "games": [serialization.to_dict(game, projection) for game in games],
+            "limit": limit,
+            "offset": offset,
+        }
+    )
+
+
+def taxonomy(db: Database) -> Response:
+    category_parents = db.get_cognitive_category_parents()
+    function_parents = db.get_cognitive_function_parents()
+    return Response.json(
+        {
+            "categories": [
+                {"id": c.id, "name": c.name, "parent_id": category_parents.get(c.id)}
+                for c in db.get_all_cognitive_categories()
+            ],
+            "functions": [
+                {"id": f.id, "name": f.name, "parent_id": function_parents.get(f.id)}
+                for f in db.get_all_cognitive_functions()
+            ],
+            "materials": [material.name for material in Material],
+        }
+    )
+
+
+class CatalogRequestHandler(BaseHTTPRequestHandler):
+    server: CatalogServer
+    server_version = "NeuropsyGames"
+
+    def do_GET(self):
+        try:
+            response = self._route()
+        except BadRequest as e:
+            response = Response.json({"error": str(e)}, HTTPStatus.BAD_REQUEST)
+        except NotFoundError as e:
+            response = Response.json({"error": str(e)}, HTTPStatus.NOT_FOUND)
+        except DatabaseError as e:
+            logger.error("Database error on %s: %s", self.path, e)
+            response = Response.json({"error": "database error"}, HTTPStatus.INTERNAL_SERVER_ERROR)
+        self._send(response)
+
+    def _route(self) -> Response:
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        query = parse_qs(url.query)
+        key = self.path
+        if parts == ["api", "games"]:
+            return self.server.cached(key, lambda db: search_games(db, query))
+        if parts == ["api", "facets"]:
+            return self.server.cached(key, lambda db: facets(db, query))
+        if parts == ["api", "taxonomy"]:
+            return self.server.cached(key, taxonomy)
+        if parts == ["api", "collections"]:
+            return self.server.cached(key, collections)
+        if len(parts) == 3 and parts[:2] == ["api", "collections"]:
+            name = unquote(parts[2])
+            return self.server.cached(key, lambda db: collection_games(db, name, query))
+        if len(parts) in (3, 4) and parts[:2] == ["api", "games"] and parts[2].isdigit():
+            game_id = int(parts[2])
+            if len(parts) == 3:
+                return self.server.cached(key, lambda db: game_detail(db, game_id))
+            if parts[3] == "thumbnail":
+                return self._thumbnail(game_id)
+            if parts[3] == "similar":
+                return self.server.cached(key, lambda db: similar_games(self.server, db, game_id, query))
+        return Response.json({"error": "not found"}, HTTPStatus.NOT_FOUND)
+
+    def _thumbnail(self, game_id: int) -> Response:
+        db = self.server.worker_db()
+        game = db.get_game(game_id=game_id, projection=Projection.SUMMARY)
+        if image_store.blob_id(game.image) is not None:
+            data = image_store.read_thumbnail(db, game.image)
+            thumbnail = (data, "image/png") if data else None
+        else:
+            try:
+                thumbnail = self.server.thumbnail(game.image) if game.image else None
+            except OSError as e:
+                # Also raised by Pillow for a file which is not an image it can read
+                logger.error("Cannot read the image of game %d: %s", game_id, e)
+                return Response.json({"error": "unreadable image"}, HTTPStatus.INTERNAL_SERVER_ERROR)
+        if thumbnail is None:
+            return Response.json({"error": "no image"}, HTTPStatus.NOT_FOUND)
+        data, content_type = thumbnail
+        return Response(HTTPStatus.OK, content_type, data)
+
+    def _send(self, response: Response):
+        gzipped = (
+            len(response.body) >= GZIP_MIN_SIZE
+            and response.content_type == "application/json"
+            and "gzip" in self.headers.get("Accept-Encoding", "")
+        )
+        etag = response.gzip_etag if gzipped else response.etag
+        if response.status == HTTPStatus.OK and self.headers.get("If-None-Match") == etag:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return
+        body = response.gzipped() if gzipped else response.body
+        self.send_response(response.status)
+        self.send_header("Content-Type", response.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Cache-Control", "no-cache")
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def make_server(
+    db_file: str, host: str = "127.0.0.1", port: int = 8080, workers: int = DEFAULT_WORKERS, images_root: str = None
+) -> CatalogServer:
+    """Create the server. Port 0 picks a free port, available as `server.server_address[1]`."""
+    images_root = images_root or os.path.dirname(os.path.abspath(db_file))
+    return CatalogServer((host, port), db_file, workers, images_root)
+
+
+def serve(db_file: str, host: str = "127.0.0.1", port: int = 8080, workers: int = DEFAULT_WORKERS):
+    Database(file=db_file).setup()
+    server = make_server(db_file, host, port, workers)
+    logger.info("Serving %s on http://%s:%d", db_file, host, server.server_address[1])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
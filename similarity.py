@@ -0,0 +1,208 @@
+"""
+"Games like this one": the games closest to a game by their cognitive weights and their materials.
+
+Each game is a row of a matrix holding its category and function weights, normalized so that the cosine similarity
+of every game to one of them is a single matrix-vector product, and a bitmask of its materials, compared with
+the Jaccard index of the sets.
+
+The matrix is built once, then follows the change feed: the rows of the games added, updated or deleted since are
+rewritten in place instead of rebuilding it, and the rows of deleted games are reused by the next ones.
+"""
+
+import json
+import logging
+import sqlite3
+from typing import Callable, Optional
+
+import numpy as np
+
+from database import Database, DatabaseError, NotFoundError
+from models import Change, Material
+
+logger = logging.getLogger(__name__)
+
+# Share of the score given to the shared materials, the rest is given to the cognitive weights
+MATERIAL_WEIGHT = 0.25
+DEFAULT_LIMIT = 10
+# Game IDs per query when reading the changed games again
+READ_CHUNK = 500
+MIN_CAPACITY = 64
+
+TAG_TABLES = ("cognitive_categories", "cognitive_functions")
+
+# Number of bits set in each byte, to count the materials of the masks
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.float32)
+
+
+def material_mask(names: list[str]) -> int:
+    """Bitmask of the materials, from their names as stored in the games."""
+    mask = 0
+    for name in names:
+        mask |= 1 << (Material[name].value - 1)
+    return mask
+
+
+class SimilarGames:
+    """
+    Top-k most similar games, from a matrix of all the games kept in memory.
+
+    With `follow`, writes made through `db` update the matrix as soon as they are committed. Changes made by other
+    connections are applied before each query.
+    """
+
+    def __init__(self, db: Database, material_weight: float = MATERIAL_WEIGHT, follow: bool = True):
+        self.db = db
+        self.material_weight = material_weight
+        self.seq = 0
+        # Row of each game and column of each tag, by (table, tag ID)
+        self.rows: dict[int, int] = {}
+        self.columns: dict[tuple[str, int], int] = {}
+        self.size = 0
+        self.free: list[int] = []
+        self.ids = np.full(0, -1, dtype=np.int64)
+        self.weights = np.zeros((0, 0), dtype=np.float32)
+        self.materials = np.zeros(0, dtype=np.uint8)
+        self._unsubscribe: Optional[Callable[[], None]] = None
+        self.load()
+        if follow:
+            self._unsubscribe = db.subscribe(self.apply)
+
+    def close(self):
+        if self._unsubscribe:
+            self._unsubscribe()
+            self._unsubscribe = None
+
+    def load(self):
+        """Build the matrix from every game."""
+        # Read before the games: a change committed in between is applied again later, which changes nothing
+        self.seq = self.db.last_change_seq()
+        games = self._read()
+        self.rows.clear()
+        self.columns.clear()
+        self.free.clear()
+        self.size = 0
+        capacity = max(MIN_CAPACITY, len(games))
+        self.ids = np.full(capacity, -1, dtype=np.int64)
+        self.weights = np.zeros((capacity, 0), dtype=np.float32)
+        self.materials = np.zeros(capacity, dtype=np.uint8)
+        self._write(games)
+        logger.info("Built the similarity matrix of %d games and %d tags", len(self.rows), len(self.columns))
+
+    def apply(self, changes: list[Change]):
+        """Rewrite the rows of the games changed by these changes of the feed."""
+        game_ids = {change.row_id for change in changes if change.seq > self.seq and change.table == "games"}
+        if changes:
+            self.seq = max(self.seq, changes[-1].seq)
+        if not game_ids:
+            return
+        games = self._read(sorted(game_ids))
+        for game_id in game_ids - {game[0] for game in games}:
+            self._remove(game_id)
+        self._write(games)
+
+    def refresh(self):
+        """Apply the changes committed by other connections since the last time."""
+        self.apply(self.db.changes_since(self.seq))
+
+    def similar(self, game_id: int, limit: int = DEFAULT_LIMIT) -> list[tuple[int, float]]:
+        """(game ID, score between 0 and 1) of the games most similar to the given one, best first."""
+        self.refresh()
+        row = self.rows.get(game_id)
+        if row is None:
+            raise NotFoundError(f"Game with ID {game_id} not found.")
+        size = self.size
+        scores = self.weights[:size] @ self.weights[row]
+        if self.material_weight:
+            materials = self.materials[:size]
+            shared = _POPCOUNT[materials & self.materials[row]]
+            either = _POPCOUNT[materials | self.materials[row]]
+            jaccard = np.divide(shared, either, out=np.zeros(size, dtype=np.float32), where=either > 0)
+            scores = (1 - self.material_weight) * scores + self.material_weight * jaccard
+        scores[row] = -np.inf
+        scores[self.ids[:size] < 0] = -np.inf
+
+        limit = min(limit, len(self.rows) - 1)
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.lexsort((self.ids[top], -scores[top]))]
+        return [(int(self.ids[i]), float(scores[i])) for i in top]
+
+    def _read(self, game_ids: list[int] = None) -> list[tuple]:
+        query = "SELECT id, cognitive_categories, cognitive_functions, materials FROM games"
+        try:
+            if game_ids is None:
+                return self.db.con.execute(query).fetchall()
+            games = []
+            for start in range(0, len(game_ids), READ_CHUNK):
+                chunk = game_ids[start : start + READ_CHUNK]
+                placeholders = ", ".join("?" * len(chunk))
+                games += self.db.con.execute(f"{query} WHERE id IN ({placeholders})", chunk).fetchall()
+            return games
+        except sqlite3.Error as e:
+            raise DatabaseError(f"An error occurred with the database: {e}") from e
+
+    def _write(self, games: list[tuple]):
+        """Set the rows of the games, allocating those of new games, in one assignment per array."""
+        if not games:
+            return
+        rows, cells_rows, cells_columns, cells_weights, masks = [], [], [], [], []
+        for game_id, categories, functions, materials in games:
+            row = self._row(game_id)
+            rows.append(row)
+            for table, tags in zip(TAG_TABLES, (categories, functions)):
+                for tag_id, weight in json.loads(tags or "[]"):
+                    cells_rows.append(row)
+                    cells_columns.append(self._column(table, tag_id))
+                    cells_weights.append(weight)
+            masks.append(material_mask(json.loads(materials or "[]")))
+        self._reserve(self.size, len(self.columns))
+
+        rows = np.array(rows, dtype=np.intp)
+        self.weights[rows] = 0
+        self.weights[cells_rows, cells_columns] = cells_weights
+        norms = np.linalg.norm(self.weights[rows], axis=1, keepdims=True)
+        self.weights[rows] /= np.where(norms > 0, norms, 1)
+        self.materials[rows] = masks
+        self.ids[rows] = [game[0] for game in games]
+
+    def _row(self, game_id: int) -> int:
+        row = self.rows.get(game_id)
+        if row is None:
+            if self.free:
+                row = self.free.pop()
+            else:
+                row = self.size
+                self.size += 1
+            self.rows[game_id] = row
+        return row
+
+    def _column(self, table: str, tag_id: int) -> int:
+        return self.columns.setdefault((table, tag_id), len(self.columns))
+
+    def _remove(self, game_id: int):
+        row = self.rows.pop(game_id, None)
+        if row is None:
+            return
+        self.weights[row] = 0
+        self.materials[row] = 0
+        self.ids[row] = -1
+        self.free.append(row)
+
+    def _reserve(self, rows: int, columns: int):
+        """Grow the arrays, doubling their capacity, to hold this many rows and columns."""
+        capacity, width = self.weights.shape
+        if rows <= capacity and columns <= width:
+            return
+        new_capacity = max(capacity, MIN_CAPACITY)
+        while new_capacity < rows:
+            new_capacity *= 2
+        new_width = max(width, 1)
+        while new_width < columns:
+            new_width *= 2
+        weights = np.zeros((new_capacity, new_width), dtype=np.float32)
+        weights[:capacity, :width] = self.weights
+        self.weights = weights
+        if new_capacity > capacity:
+            self.ids = np.concatenate([self.ids, np.full(new_capacity - capacity, -1, dtype=np.int64)])
+            self.materials = np.concatenate([self.materials, np.zeros(new_capacity - capacity, dtype=np.uint8)])
@@ -0,0 +1,454 @@
+"""
+Delta sync bundles, to merge the catalogs of several clinicians.
+
+    python3 . sync-export --peer alice --output to_alice.zip
+    python3 . sync-import from_bob.zip
+
+A bundle is a zip file with `bundle.json` and the images of the exported games. It holds the games, categories and
+functions changed since a point of the change feed, and the tombstones of the deleted or renamed ones: its size and
+its merge time depend on the number of changes, not on the size of the catalog.
+
+Rows are identified across catalogs by their unique title or name, never by ID: tags are remapped by name.
+Conflicts are resolved the same way in every catalog, so that they converge whatever the order of the merges:
+the latest `updated_at` wins, then the greatest content hash. A tombstone wins over an older row, and the reverse.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import zipfile
+from datetime import datetime, timezone
+
+import image_store
+import serialization
+from database import Database, game_params
+from models import CognitiveCategoryRecord, CognitiveFunctionRecord
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+BUNDLE_FILE = "bundle.json"
+IMAGES_DIR = "images"
+
+# Rows written before modification times were tracked are as old as their creation
+UPDATED_AT = "COALESCE(updated_at, strftime('%Y-%m-%dT%H:%M:%fZ', created_at))"
+
+# Bundle key and table of each kind of tag. The games column has the name of the table.
+TAGS = (("categories", "cognitive_categories"), ("functions", "cognitive_functions"))
+TABLES = ("games", "cognitive_categories", "cognitive_functions")
+
+
+class BundleError(Exception):
+    pass
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _image_path(db: Database, image: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(db.file)), image)
+
+
+def _content_hash(game: dict, image_hash: str = None) -> str:
+    """Hash of what a game looks like in any catalog: tags by name, and the image by content instead of path."""
+    content = {key: game[key] for key in ("title", "description", "materials", "categories", "functions")}
+    content["image"] = image_hash
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+def _id_filter(ids: list[int] = None) -> tuple[str, list]:
+    """WHERE clause selecting the given row IDs, or every row if None. Any number of IDs is a single parameter."""
+    if ids is None:
+        return "1=1", []
+    return "id IN (SELECT value FROM json_each(?))", [json.dumps(ids)]
+
+
+def export_bundle(db: Database, path: str, since: int = 0) -> dict:
+    """
+    Write the changes made after the `since` point of the change feed, everything if 0, to a bundle at `path`.
+
+    Returns a summary whose `until` is the point to export from next time.
+    """
+    con = db.con
+    con.commit()
+    # A read transaction, so that the rows and the `until` point are consistent with each other
+    con.execute("BEGIN")
+    try:
+        until = db.last_change_seq()
+        # IDs of the changed rows of each table, None for all of them
+        changed: dict[str, list[int]] = dict.fromkeys(TABLES)
+        # Rowids of the tombstones merged from other peers, recorded in the feed by keep_tombstone
+        merged_tombstones = []
+        if since:
+            changed = {table: [] for table in TABLES}
+            cursor = con.execute(
+                "SELECT DISTINCT table_name, row_id FROM changes WHERE seq > ? AND seq <= ?", (since, until)
+            )
+            for table, row_id in cursor:
+                if table == "tombstones":
+                    merged_tombstones.append(row_id)
+                else:
+                    changed[table].append(row_id)
+
+        data = {
+            "format": FORMAT_VERSION,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "since": since,
+            "until": until,
+            "tombstones": [],
+        }
+        names = {}
+        for key, table in TAGS:
+            names[table] = dict(con.execute(f"SELECT id, name FROM {table}").fetchall())
+            where, params = _id_filter(changed[table])
+            data[key] = [
+                {"name": name, "updated_at": updated_at}
+                for name, updated_at in con.execute(f"SELECT name, {UPDATED_AT} FROM {table} WHERE {where}", params)
+            ]
+
+        where, params = _id_filter(changed["games"])
+        rows = con.execute(
+            f"""
+            SELECT title, description, cognitive_functions, cognitive_categories, materials, image, {UPDATED_AT}
+            FROM games WHERE {where}
+            """,
+            params,
+        ).fetchall()
+
+        for table, ids in changed.items():
+            if ids is None:
+                cursor = con.execute("SELECT key, deleted_at FROM tombstones WHERE table_name = ?", (table,))
+            else:
+                cursor = con.execute(
+                    """
+                    SELECT key, deleted_at FROM tombstones
+                    WHERE table_name = ?
+                    AND (row_id IN (SELECT value FROM json_each(?)) OR rowid IN (SELECT value FROM json_each(?)))
+                    """,
+                    (table, json.dumps(ids), json.dumps(merged_tombstones)),
+                )
+            data["tombstones"].extend(
+                {"table": table, "key": key, "deleted_at": deleted_at} for key, deleted_at in cursor
+            )
+    finally:
+        con.rollback()
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as bundle:
+        images = {}
+        data["games"] = []
+        for title, description, functions, categories, materials, image, updated_at in rows:
+            game = {
+                "title": title,
+                "description": description,
+                "image": None,
+                "materials": json.loads(materials or "[]"),
+                "categories": [
+                    {"name": names["cognitive_categories"][tag_id], "weight": weight}
+                    for tag_id, weight in json.loads(categories or "[]")
+                    if tag_id in names["cognitive_categories"]
+                ],
+                "functions": [
+                    {"name": names["cognitive_functions"][tag_id], "weight": weight}
+                    for tag_id, weight in json.loads(functions or "[]")
+                    if tag_id in names["cognitive_functions"]
+                ],
+                "updated_at": updated_at,
+            }
+            # (hash, extension, content or file path) of the image
+            source = None
+            if image_store.blob_id(image) is not None:
+                stored = image_store.read_original(db, image)
+                if stored:
+                    source = (hashlib.sha256(stored[0]).hexdigest(), stored[1], stored[0])
+            elif image and os.path.isfile(_image_path(db, image)):
+                image_path = _image_path(db, image)
+                source = (_file_hash(image_path), os.path.splitext(image)[1].lower(), image_path)
+            if source:
+                digest, extension, content = source
+                name = f"{IMAGES_DIR}/{digest}{extension}"
+                if name not in images:
+                    # Images are already compressed
+                    if isinstance(content, bytes):
+                        bundle.writestr(name, content, compress_type=zipfile.ZIP_STORED)
+                    else:
+                        bundle.write(content, name, compress_type=zipfile.ZIP_STORED)
+                    images[name] = digest
+                game["image"] = name
+            data["games"].append(game)
+        bundle.writestr(BUNDLE_FILE, json.dumps(data, ensure_ascii=False))
+
+    summary = {
+        "since": since,
+        "until": until,
+        "games": len(data["games"]),
+        "categories": len(data["categories"]),
+        "functions": len(data["functions"]),
+        "tombstones": len(data["tombstones"]),
+        "images": len(images),
+    }
+    logger.info("Exported bundle %s: %s", path, summary)
+    return summary
+
+
+def export_to_peer(db: Database, path: str, peer: str) -> dict:
+    """Export the changes made since the last bundle exported to `peer`, and remember this one."""
+    row = db.con.execute("SELECT seq FROM sync_peers WHERE name = ?", (peer,)).fetchone()
+    summary = export_bundle(db, path, since=row[0] if row else 0)
+    with db.con:
+        db.con.execute("INSERT OR REPLACE INTO sync_peers (name, seq) VALUES (?, ?)", (peer, summary["until"]))
+    return summary
+
+
+class _Merge:
+    """Merge of one bundle, inside the transaction of `import_bundle`."""
+
+    def __init__(self, db: Database, bundle: zipfile.ZipFile):
+        self.db = db
+        self.con = db.con
+        self.bundle = bundle
+        self.images = {name for name in bundle.namelist() if name.startswith(IMAGES_DIR + "/")}
+        self.stats = {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0, "rejected": 0, "images": 0}
+        self.tags: dict[str, dict[str, tuple[int, str]]] = {}
+
+    def tombstone(self, table: str, key: str) -> str:
+        row = self.con.execute("SELECT deleted_at FROM tombstones WHERE table_name = ? AND key = ?", (table, key))
+        row = row.fetchone()
+        return row[0] if row else None
+
+    def keep_tombstone(self, table: str, key: str, deleted_at: str, deleted: bool = False):
+        """
+        Record the deletion time of the bundle, so that it is compared the same way everywhere. `deleted` tells that
+        the merge has just deleted the local row, whose tombstone got the local time instead.
+        """
+        if deleted:
+            self.con.execute(
+                "UPDATE tombstones SET deleted_at = ? WHERE table_name = ? AND key = ?", (deleted_at, table, key)
+            )
+            return
+        cursor = self.con.execute(
+            """
+            INSERT INTO tombstones (table_name, key, deleted_at) VALUES (?, ?, ?)
+            ON CONFLICT (table_name, key) DO UPDATE SET deleted_at = excluded.deleted_at
+            WHERE excluded.deleted_at > deleted_at
+            """,
+            (table, key, deleted_at),
+        )
+        if not cursor.rowcount:
+            # Known already: relaying it again would send it back and forth between the peers
+            return
+        # Without a local row, no change of its table leads to the tombstone: it gets its own entry in the feed,
+        # so that the delta bundles to the other peers relay it
+        self.con.execute(
+            """
+            INSERT INTO changes (table_name, row_id, op)
+            SELECT 'tombstones', rowid, 'update' FROM tombstones WHERE table_name = ? AND key = ? AND row_id IS NULL
+            """,
+            (table, key),
+        )
+
+    def merge_tags(self, data: dict):
+        tombstones = [tombstone for tombstone in data["tombstones"] if tombstone["table"] != "games"]
+        for key, table in TAGS:
+            self.tags[table] = {
+                name: (tag_id, updated_at)
+                for tag_id, name, updated_at in self.con.execute(f"SELECT id, name, {UPDATED_AT} FROM {table}")
+            }
+        for tombstone in tombstones:
+            table, name = tombstone["table"], tombstone["key"]
+            if table not in self.tags:
+                continue
+            local = self.tags[table].get(name)
+            deleted = bool(local) and local[1] < tombstone["deleted_at"]
+            if deleted:
+                self.delete_tag(table, local[0])
+                del self.tags[table][name]
+            self.keep_tombstone(table, name, tombstone["deleted_at"], deleted)
+        for key, table in TAGS:
+            for tag in data[key]:
+                self.tag_id(table, tag["name"], tag["updated_at"])
+
+    def tag_id(self, table: str, name: str, updated_at: str):
+        """Local ID of a tag of the bundle, created if needed. None if it has been deleted here since."""
+        local = self.tags[table].get(name)
+        if local:
+            if local[1] < updated_at:
+                self.con.execute(
+                    f"UPDATE {table} SET updated_at = ?, version = version + 1 WHERE id = ?", (updated_at, local[0])
+                )
+                self.tags[table][name] = (local[0], updated_at)
+            return local[0]
+        deleted_at = self.tombstone(table, name)
+        if deleted_at and deleted_at >= updated_at:
+            return None
+        cursor = self.con.execute(f"INSERT INTO {table} (name, updated_at) VALUES (?, ?)", (name, updated_at))
+        self.tags[table][name] = (cursor.lastrowid, updated_at)
+        return cursor.lastrowid
+
+    def delete_tag(self, table: str, tag_id: int):
+        """Remove a tag and its references. The games keep their modification time: the bundle has their new tags."""
+        cursor = self.con.execute(
+            f"""
+            SELECT id, {table} FROM games
+            WHERE EXISTS (
+                SELECT 1 FROM json_each(COALESCE(NULLIF({table}, ''), '[]')) WHERE json_extract(value, '$[0]') = ?
+            )
+            """,
+            (tag_id,),
+        )
+        for game_id, tags in cursor.fetchall():
+            tags = [(other_id, weight) for other_id, weight in json.loads(tags) if other_id != tag_id]
+            self.con.execute(
+                f"UPDATE games SET {table} = ?, version = version + 1 WHERE id = ?", (json.dumps(tags), game_id)
+            )
+        self.con.execute(f"DELETE FROM {table} WHERE id = ?", (tag_id,))
+
+    def merge_game_tombstone(self, tombstone: dict):
+        row = self.con.execute(f"SELECT id, {UPDATED_AT} FROM games WHERE title = ?", (tombstone["key"],)).fetchone()
+        deleted = bool(row) and row[1] < tombstone["deleted_at"]
+        if deleted:
+            self.con.execute("DELETE FROM games WHERE id = ?", (row[0],))
+            self.stats["deleted"] += 1
+        self.keep_tombstone("games", tombstone["key"], tombstone["deleted_at"], deleted)
+
+    def merge_game(self, game: dict):
+        updated_at = game["updated_at"]
+        local = self.con.execute(
+            f"""
+            SELECT id, description, cognitive_functions, cognitive_categories, materials, image, {UPDATED_AT}
+            FROM games WHERE title = ?
+            """,
+            (game["title"],),
+        ).fetchone()
+        if local is None:
+            deleted_at = self.tombstone("games", game["title"])
+            if deleted_at and deleted_at >= updated_at:
+                self.stats["unchanged"] += 1
+                return
+        elif local[6] > updated_at or (local[6] == updated_at and not self.wins_tie(game, local)):
+            self.stats["unchanged"] += 1
+            return
+
+        # Tags deleted here since are dropped, unknown ones created
+        for key, table in TAGS:
+            game[key] = [tag for tag in game[key] if self.tag_id(table, tag["name"], updated_at) is not None]
+        categories, functions = (
+            {name: record(tag_id, name) for name, (tag_id, _) in self.tags[table].items()}
+            for table, record in (
+                ("cognitive_categories", CognitiveCategoryRecord),
+                ("cognitive_functions", CognitiveFunctionRecord),
+            )
+        )
+        try:
+            validated = serialization.from_dict({**game, "image": None}, categories, functions)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning("Rejected game %s of the bundle: %r", game.get("title"), e)
+            self.stats["rejected"] += 1
+            return
+        validated.image = self.extract_image(game["image"]) if game["image"] in self.images else None
+
+        params = (*game_params(validated), updated_at)
+        if local is None:
+            self.con.execute(
+                """
+                INSERT INTO games (
+                    title, description, cognitive_functions,
+                    cognitive_categories, materials, image, title_key, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                params,
+            )
+            self.stats["added"] += 1
+        else:
+            self.con.execute(
+                """
+                UPDATE games
+                SET title = ?, description = ?, cognitive_functions = ?,
+                    cognitive_categories = ?, materials = ?, image = ?, title_key = ?, updated_at = ?,
+                    version = version + 1
+                WHERE id = ?
+                """,
+                (*params, local[0]),
+            )
+            self.stats["updated"] += 1
+
+    def wins_tie(self, game: dict, local: tuple) -> bool:
+        """Same modification time on both sides: the greatest content hash wins, in every catalog."""
+        names = {table: {tag_id: name for name, (tag_id, _) in tags.items()} for table, tags in self.tags.items()}
+        local_game = {
+            "title": game["title"],
+            "description": local[1],
+            "materials": json.loads(local[4] or "[]"),
+            "categories": [
+                {"name": names["cognitive_categories"][tag_id], "weight": weight}
+                for tag_id, weight in json.loads(local[3] or "[]")
+                if tag_id in names["cognitive_categories"]
+            ],
+            "functions": [
+                {"name": names["cognitive_functions"][tag_id], "weight": weight}
+                for tag_id, weight in json.loads(local[2] or "[]")
+                if tag_id in names["cognitive_functions"]
+            ],
+        }
+        local_image = _image_path(self.db, local[5]) if local[5] else None
+        stored = image_store.read_original(self.db, local[5]) if image_store.blob_id(local[5]) is not None else None
+        if stored:
+            local_hash = _content_hash(local_game, hashlib.sha256(stored[0]).hexdigest())
+        elif local_image and os.path.isfile(local_image):
+            local_hash = _content_hash(local_game, _file_hash(local_image))
+        else:
+            local_hash = _content_hash(local_game)
+        image_hash = os.path.splitext(os.path.basename(game["image"]))[0] if game["image"] else None
+        return _content_hash(game, image_hash) > local_hash
+
+    def extract_image(self, name: str) -> str:
+        """Copy an image of the bundle next to the database, named after its content. Returns its path."""
+        path = f"{IMAGES_DIR}/{os.path.basename(name)}"
+        full_path = _image_path(self.db, path)
+        if not os.path.exists(full_path):
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with self.bundle.open(name) as source, open(full_path + ".partial", "wb") as target:
+                while chunk := source.read(1 << 20):
+                    target.write(chunk)
+            os.replace(full_path + ".partial", full_path)
+            self.stats["images"] += 1
+        return path
+
+
+def import_bundle(db: Database, path: str) -> dict:
+    """Merge a bundle into the catalog, in a single transaction. Returns counts of what happened to its games."""
+    try:
+        bundle = zipfile.ZipFile(path)
+    except (OSError, zipfile.BadZipFile) as e:
+        raise BundleError(f"Cannot read bundle {path}: {e}") from e
+    with bundle:
+        try:
+            data = json.loads(bundle.read(BUNDLE_FILE))
+        except (KeyError, ValueError) as e:
+            raise BundleError(f"Invalid bundle {path}: {e}") from e
+        if data.get("format") != FORMAT_VERSION:
+            raise BundleError(f"Unsupported bundle format {data.get('format')}")
+
+        merge = _Merge(db, bundle)
+        db.con.commit()
+        try:
+            with db.con:
+                merge.merge_tags(data)
+                # Tombstones first: a game renamed, or deleted then re-created, is found under its new title after
+                for tombstone in data["tombstones"]:
+                    if tombstone["table"] == "games":
+                        merge.merge_game_tombstone(tombstone)
+                for game in data["games"]:
+                    merge.merge_game(game)
+        except sqlite3.Error as e:
+            raise BundleError(f"Cannot merge bundle {path}: {e}") from e
+    db.publish_changes()
+    logger.info("Merged bundle %s: %s", path, merge.stats)
+    return merge.stats
+
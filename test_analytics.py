@@ -0,0 +1,90 @@
+import unittest
+from unittest import mock
+
+import analytics
+from benchmarks.catalog import generate_catalog
+from database import Database
+from models import CognitiveCategory, CognitiveFunction, Game
+
+
+class TestAnalytics(unittest.TestCase):
+    def setUp(self):
+        self.db = Database(file=":memory:")
+        self.db.setup()
+        for name in ("Memory", "Logic", "Speed"):
+            self.db.add_cognitive_category(CognitiveCategory(name=name))
+        for name in ("Attention", "Inhibition", "Planning"):
+            self.db.add_cognitive_function(CognitiveFunction(name=name))
+        memory, logic, speed = self.db.get_all_cognitive_categories()
+        attention, inhibition, planning = self.db.get_all_cognitive_functions()
+        games = [
+            ([(memory, 8), (logic, 2)], [(attention, 9)]),
+            ([(memory, 7), (logic, 5)], [(attention, 3), (inhibition, 8)]),
+            ([(memory, 3), (logic, 0)], [(attention, 7)]),
+            ([(speed, 9)], [(attention, 1)]),
+        ]
+        for i, (categories, functions) in enumerate(games):
+            self.db.add_game(Game(title=f"Game {i}", categories=categories, functions=functions))
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_compute(self):
+        report = analytics.compute(self.db, strong=7, min_games=2)
+        self.assertEqual(report["games"], 4)
+
+        functions = {entry["name"]: entry for entry in report["coverage"]["cognitive_functions"]}
+        self.assertEqual(list(functions), ["Attention", "Inhibition", "Planning"])
+        self.assertEqual((functions["Attention"]["games"], functions["Attention"]["strong_games"]), (4, 2))
+        self.assertEqual(functions["Attention"]["weighted_coverage"], 5.0)
+        self.assertEqual(functions["Attention"]["mean_weight"], 5.0)
+        self.assertEqual(functions["Attention"]["status"], "over")
+        self.assertEqual(functions["Planning"]["status"], "under")
+        self.assertEqual([gap["name"] for gap in report["gaps"]["cognitive_functions"]], ["Inhibition", "Planning"])
+        self.assertEqual({gap["name"] for gap in report["gaps"]["cognitive_categories"]}, {"Logic", "Speed"})
+
+        # Logic has a weight of 0 in a game, which still counts as having it
+        pairs = {(pair["first"]["name"], pair["second"]["name"]): pair for pair in report["co_occurrence"]}
+        self.assertEqual(pairs["Memory", "Logic"]["games"], 3)
+        self.assertEqual(pairs["Memory", "Logic"]["jaccard"], 1.0)
+        self.assertEqual(pairs["Memory", "Attention"]["jaccard"], 0.75)
+        self.assertEqual(pairs["Attention", "Inhibition"]["conditional"], 1.0)
+        self.assertNotIn(("Memory", "Speed"), pairs)
+        self.assertEqual(report["co_occurrence"][0]["jaccard"], 1.0)
+
+    def test_matches_a_naive_count(self):
+        generate_catalog(self.db, 200)
+        report = analytics.compute(self.db, top=1000)
+        full = self.db.get_games_with_filters()
+        for pair in report["co_occurrence"][:50]:
+            first, second = pair["first"], pair["second"]
+
+            def has(game, tag):
+                tags = game.categories if tag["table"] == "cognitive_categories" else game.functions
+                return any(record.id == tag["id"] for record, _ in tags)
+
+            self.assertEqual(pair["games"], sum(1 for game in full if has(game, first) and has(game, second)))
+
+    def test_report_is_cached_until_the_data_changes(self):
+        with mock.patch("analytics.compute", wraps=analytics.compute) as compute:
+            first = analytics.report(self.db)
+            self.assertEqual(analytics.report(self.db), first)
+            self.assertEqual(compute.call_count, 1)
+            analytics.report(self.db, strong=8)
+            self.assertEqual(compute.call_count, 2)
+
+            self.db.add_game(Game(title="New", categories=[], functions=[]))
+            self.assertEqual(analytics.report(self.db, strong=8)["games"], 5)
+            analytics.report(self.db, strong=8, refresh=True)
+            self.assertEqual(compute.call_count, 4)
+
+    def test_empty_catalog(self):
+        db = Database(file=":memory:")
+        db.setup()
+        report = analytics.report(db)
+        self.assertEqual((report["games"], report["co_occurrence"]), (0, []))
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
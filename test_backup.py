@@ -0,0 +1,144 @@
+import unittest
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import backup
+from database import Database
+from models import Game
+
+
+class TestBackup(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.directory.name, "catalog.db")
+        self.backup_dir = os.path.join(self.directory.name, "backups")
+        os.makedirs(os.path.join(self.directory.name, "images"))
+        self.write_image("1.png", b"first image")
+        self.db = Database(file=self.db_file)
+        self.db.setup()
+        self.db.add_game(Game(title="Dobble", image="images/1.png", categories=[], functions=[]))
+        self.db.add_game(Game(title="Uno", categories=[], functions=[]))
+
+    def tearDown(self):
+        self.db.con.close()
+        self.directory.cleanup()
+
+    @property
+    def image_file(self) -> str:
+        return os.path.join(self.directory.name, "images", "1.png")
+
+    def write_image(self, name: str, data: bytes):
+        with open(os.path.join(self.directory.name, "images", name), "wb") as f:
+            f.write(data)
+
+    def blobs(self) -> list[str]:
+        return [file for _, _, files in os.walk(os.path.join(self.backup_dir, "images")) for file in files]
+
+    def test_snapshot_while_in_use(self):
+        steps = []
+        snapshot = backup.create_snapshot(
+            self.db_file, self.backup_dir, pages=1, pause=0, progress=lambda remaining, total: steps.append(remaining)
+        )
+        self.assertGreater(len(steps), 1)
+        self.assertEqual(steps[-1], 0)
+        manifest = snapshot.manifest()
+        self.assertEqual(manifest["games"], 2)
+        self.assertEqual(list(manifest["images"]), ["images/1.png"])
+        self.assertEqual(backup.verify_snapshot(snapshot), [])
+        self.assertEqual([s.name for s in backup.list_snapshots(self.backup_dir)], [snapshot.name])
+
+    def test_images_are_copied_once(self):
+        backup.create_snapshot(self.db_file, self.backup_dir, now=datetime(2026, 1, 1))
+        backup.create_snapshot(self.db_file, self.backup_dir, now=datetime(2026, 1, 2))
+        self.assertEqual(len(self.blobs()), 1)
+
+        self.write_image("1.png", b"changed image")
+        snapshot = backup.create_snapshot(self.db_file, self.backup_dir, now=datetime(2026, 1, 3))
+        self.assertEqual(len(self.blobs()), 2)
+        self.assertEqual(snapshot.manifest()["images"]["images/1.png"], backup.file_hash(self.image_file))
+
+    def test_restore(self):
+        snapshot = backup.create_snapshot(self.db_file, self.backup_dir)
+        self.db.delete_game(1)
+        self.write_image("1.png", b"overwritten")
+
+        result = backup.restore_snapshot(snapshot, self.db_file)
+        self.assertEqual(result["games"], 2)
+        self.assertEqual(result["images_restored"], 1)
+        # The open connection sees the restored content
+        self.assertEqual(self.db.get_game(game_id=1).title, "Dobble")
+        with open(self.image_file, "rb") as f:
+            self.assertEqual(f.read(), b"first image")
+
+    def test_damaged_snapshot_is_not_restored(self):
+        snapshot = backup.create_snapshot(self.db_file, self.backup_dir)
+        for blob in self.blobs():
+            os.remove(os.path.join(self.backup_dir, "images", blob[:2], blob))
+        with open(os.path.join(snapshot.path, backup.DATABASE_FILE), "r+b") as f:
+            f.seek(200)
+            f.write(b"garbage")
+        self.db.delete_game(1)
+
+        problems = backup.verify_snapshot(snapshot)
+        self.assertEqual(problems, ["database: checksum mismatch"])
+        with self.assertRaises(backup.BackupError):
+            backup.restore_snapshot(snapshot, self.db_file)
+        self.assertEqual(len(self.db.get_all_games()), 1)
+
+    def test_interrupted_snapshot_is_ignored_and_cleaned(self):
+        snapshot = backup.create_snapshot(self.db_file, self.backup_dir)
+        partial = os.path.join(self.backup_dir, "20990101-000000" + backup.PARTIAL_SUFFIX)
+        os.makedirs(partial)
+        self.assertEqual(backup.find_snapshot(self.backup_dir).name, snapshot.name)
+        old = time.time() - backup.PARTIAL_MAX_AGE - 60
+        os.utime(partial, (old, old))
+        backup.prune_snapshots(self.backup_dir)
+        self.assertEqual(sorted(os.listdir(self.backup_dir)), sorted([snapshot.name, "images", "hashes.json"]))
+
+    def test_prune_during_a_backup(self):
+        first = backup.create_snapshot(self.db_file, self.backup_dir, now=datetime(2026, 3, 1))
+        # A backup running meanwhile, which copied a new image but has no manifest yet
+        self.write_image("2.png", b"second image")
+        self.db.add_game(Game(title="Spot", image="images/2.png", categories=[], functions=[]))
+        second = backup.create_snapshot(self.db_file, self.backup_dir, now=datetime(2026, 3, 2))
+        os.rename(second.path, second.path + backup.PARTIAL_SUFFIX)
+        os.remove(os.path.join(second.path + backup.PARTIAL_SUFFIX, backup.MANIFEST_FILE))
+
+        backup.prune_snapshots(self.backup_dir)
+        self.assertEqual(len(self.blobs()), 2)
+        self.assertTrue(os.path.isdir(second.path + backup.PARTIAL_SUFFIX))
+        self.assertEqual(backup.find_snapshot(self.backup_dir).name, first.name)
+
+    def test_retention(self):
+        start = datetime(2026, 3, 2, 12)
+        for day in range(30):
+            for hour in (0, 6):
+                backup.create_snapshot(self.db_file, self.backup_dir, now=start + timedelta(days=day, hours=hour))
+        self.db.con.execute("UPDATE games SET image = NULL")
+        self.db.con.commit()
+        backup.create_snapshot(self.db_file, self.backup_dir, now=start + timedelta(days=30))
+
+        backup.prune_snapshots(self.backup_dir, keep_last=3, keep_daily=5, keep_weekly=3)
+        names = [snapshot.name for snapshot in backup.list_snapshots(self.backup_dir)]
+        self.assertEqual(
+            names,
+            [
+                "20260322-180000",  # Latest of its week
+                "20260328-180000",  # Latest of each of the last 5 days, the 29th being also the latest of its week
+                "20260329-180000",
+                "20260330-180000",
+                "20260331-120000",  # Last 3
+                "20260331-180000",
+                "20260401-120000",
+            ],
+        )
+        self.assertEqual(len(self.blobs()), 1)
+
+        backup.prune_snapshots(self.backup_dir, keep_last=1, keep_daily=0, keep_weekly=0)
+        self.assertEqual(self.blobs(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+
+from benchmarks.catalog import generate_catalog, generate_games
+from benchmarks.suite import compare
+from database import Database, Projection
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_generate_games_is_deterministic(self):
+        self.assertEqual(generate_games(50, seed=1), generate_games(50, seed=1))
+        self.assertNotEqual(generate_games(50, seed=1), generate_games(50, seed=2))
+
+    def test_generate_catalog(self):
+        db = Database(file=":memory:")
+        db.setup()
+        generate_catalog(db, 200)
+        self.assertEqual(len(db.get_all_games(projection=Projection.IDS)), 200)
+        # Every generated tag references an existing category or function
+        self.assertEqual(len(db.get_all_games(projection=Projection.FULL)), 200)
+
+    def test_compare_flags_regressions(self):
+        baseline = {"results": {"1k": {"fast": {"median": 1.0}, "slow": {"median": 1.0}}}}
+        current = {"results": {"1k": {"fast": {"median": 1.1}, "slow": {"median": 1.5}, "new": {"median": 1.0}}}}
+        comparison = {entry["operation"]: entry["regression"] for entry in compare(current, baseline, 0.2)}
+        self.assertEqual(comparison, {"fast": False, "slow": True})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import unittest
+from unittest import mock
+
+from benchmarks.catalog import generate_catalog
+from benchmarks.suite import FILTERS
+from bitmap_index import GameIndex, bitmap_ids, ids_bitmap
+from database import Database, Projection
+from models import CognitiveCategory, Game, Material
+
+
+class TestBitmaps(unittest.TestCase):
+    def test_round_trip(self):
+        ids = [0, 1, 7, 8, 63, 64, 1000]
+        bitmap = ids_bitmap(ids)
+        self.assertEqual(bitmap.bit_count(), len(ids))
+        self.assertEqual(bitmap_ids(bitmap), ids)
+        self.assertEqual(bitmap_ids(bitmap, offset=2, limit=3), [7, 8, 63])
+        self.assertEqual(bitmap_ids(bitmap, offset=10), [])
+        self.assertEqual(bitmap_ids(0), [])
+
+
+class TestGameIndex(unittest.TestCase):
+    def setUp(self):
+        self.db_file = "test_bitmap_index.db"
+        self.db = Database(file=self.db_file)
+        self.db.setup()
+        generate_catalog(self.db, 500)
+
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.db_file):
+            os.remove(self.db_file)
+
+    def assertSameResults(self, index: GameIndex, **filters):
+        expected = self.db.get_games_with_filters(**filters, projection=Projection.IDS)
+        self.assertEqual(index.get_games_with_filters(**filters, projection=Projection.IDS), sorted(expected))
+
+    def test_matches_the_database(self):
+        index = GameIndex(self.db)
+        for filters in FILTERS.values():
+            self.assertSameResults(index, **filters)
+            self.assertEqual(index.get_facets(**filters), self.db.get_facets(**filters))
+        self.assertSameResults(index, game_title="MAZE 1_")
+        self.assertSameResults(index, game_title="me%1")
+
+    def test_typed_words_are_answered_in_memory(self):
+        index = GameIndex(self.db)
+        self.db.add_game(Game(title="Go", categories=[], functions=[]))
+        queries = ("maze", "ma", "MAZE cards", '"tower 1"', "mé", "cards AND garden", "zzz", "g_r", "o", "go")
+        for query in queries:
+            with self.subTest(query=query):
+                self.assertSameResults(index, search_query=query)
+        index = GameIndex(self.db)
+        with mock.patch.object(self.db, "get_games_with_filters") as sql:
+            for query in queries:
+                index.count(search_query=query)
+        sql.assert_not_called()
+
+        game = self.db.get_game(game_id=1)
+        game.title = "Brand new title"
+        self.db.update_game(game)
+        self.db.delete_game(2)
+        self.assertEqual(index.get_games_with_filters(search_query="brand new", projection=Projection.IDS), [1])
+        self.assertSameResults(index, search_query="maze")
+
+    def test_pages_are_hydrated(self):
+        index = GameIndex(self.db)
+        filters = {"cognitive_functions_ids": [1, 2]}
+        page = index.get_games_with_filters(**filters, limit=10, offset=5)
+        expected = self.db.get_games_with_filters(**filters, limit=10, offset=5, projection=Projection.IDS)
+        self.assertEqual([game.id for game in page], expected)
+        self.assertEqual(page[0], self.db.get_game(game_id=page[0].id))
+
+    def test_min_weight(self):
+        index = GameIndex(self.db)
+        heavy = index.search(cognitive_categories_ids=[1], min_weight=8)
+        for game in self.db.get_games_by_ids(bitmap_ids(heavy)):
+            self.assertTrue(any(category.id == 1 and weight >= 8 for category, weight in game.categories))
+        self.assertLess(heavy.bit_count(), index.count(cognitive_categories_ids=[1]))
+
+    def test_follows_writes(self):
+        index = GameIndex(self.db)
+        self.db.add_cognitive_category(CognitiveCategory(name="New"))
+        new = self.db.get_cognitive_category(category_name="New")
+        self.db.add_game(Game(title="Fresh", categories=[(new, 3)], functions=[], materials=[Material.TACTILE]))
+        fresh = self.db.get_game(game_title="Fresh")
+        found = index.get_games_with_filters(cognitive_categories_ids=[new.id], projection=Projection.IDS)
+        self.assertEqual(found, [fresh.id])
+
+        game = self.db.get_game(game_id=1)
+        game.materials = [Material.AUDITORY]
+        self.db.update_game(game)
+        self.db.delete_game(2)
+        self.db.delete_cognitive_category(1)
+        for filters in FILTERS.values():
+            self.assertSameResults(index, **filters)
+        self.assertEqual(index.entries.keys(), set(self.db.get_all_games(projection=Projection.IDS)))
+
+    def test_follows_other_connections(self):
+        index = GameIndex(self.db, follow=False)
+        other = Database(file=self.db_file)
+        other.delete_game(3)
+        other.add_game(Game(title="Other", categories=[], functions=[], materials=[Material.VERBAL]))
+        other.close()
+        self.assertSameResults(index, materials=[Material.VERBAL])
+        self.assertNotIn(3, index.get_games_with_filters(projection=Projection.IDS))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,282 @@
+import unittest
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+
+import cli
+from database import Database
+from models import CognitiveCategory, CognitiveFunction, Game, Material
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.directory.name, "catalog.db")
+        db = Database(file=self.db_file)
+        db.setup()
+        db.add_cognitive_category(CognitiveCategory(name="Memory"))
+        db.add_cognitive_function(CognitiveFunction(name="Attention"))
+        memory = db.get_cognitive_category(category_name="Memory")
+        attention = db.get_cognitive_function(function_name="Attention")
+        db.add_game(
+            Game(
+                title="Dobble",
+                description="Spot it",
+                materials=[Material.VISUAL],
+                categories=[(memory, 4)],
+                functions=[(attention, 8)],
+            )
+        )
+        db.add_game(Game(title="Uno", materials=[Material.VERBAL], categories=[], functions=[]))
+        db.con.close()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_cli(self, *argv: str) -> tuple[int, str]:
+        stdout = io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(io.StringIO()):
+            code = cli.main(["--db", self.db_file, *argv])
+        return code, stdout.getvalue()
+
+    def test_search_jsonl(self):
+        code, output = self.run_cli("search", "--function", "Attention")
+        self.assertEqual(code, cli.EXIT_OK)
+        games = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual(len(games), 1)
+        self.assertEqual(games[0]["title"], "Dobble")
+        self.assertEqual(games[0]["functions"], [{"name": "Attention", "weight": 8}])
+
+    def test_search_csv_titles(self):
+        code, output = self.run_cli("search", "--material", "VERBAL", "--fields", "titles", "--format", "csv")
+        self.assertEqual(code, cli.EXIT_OK)
+        self.assertEqual(output.splitlines()[0], "id,title")
+        self.assertEqual(output.splitlines()[1].split(",")[1], "Uno")
+
+    def test_search_limit(self):
+        code, output = self.run_cli("search", "--fields", "ids", "--limit", "1")
+        self.assertEqual(len(output.splitlines()), 1)
+
+    def test_search_query(self):
+        code, output = self.run_cli("search", "--query", 'func:attention>=8 mat:visual "spot"', "--fields", "titles")
+        self.assertEqual(code, cli.EXIT_OK)
+        self.assertEqual(output, "")
+        code, output = self.run_cli("search", "-q", "func:attention>=8 OR uno", "--fields", "titles")
+        self.assertEqual(len(output.splitlines()), 2)
+        code, _ = self.run_cli("search", "--query", "(dobble")
+        self.assertEqual(code, cli.EXIT_USAGE)
+
+    def test_search_unknown_category(self):
+        code, _ = self.run_cli("search", "--category", "Unknown")
+        self.assertEqual(code, cli.EXIT_USAGE)
+
+    def test_similar(self):
+        code, output = self.run_cli("similar", "Dobble", "--limit", "3")
+        self.assertEqual(code, cli.EXIT_OK)
+        self.assertEqual([json.loads(line)["title"] for line in output.splitlines()], ["Uno"])
+        code, _ = self.run_cli("similar", "Unknown")
+        self.assertEqual(code, cli.EXIT_USAGE)
+
+    def test_plan(self):
+        code, output = self.run_cli("plan", "--function", "Attention=7", "--category", "Memory=4")
+        self.assertEqual(code, cli.EXIT_OK)
+        plan = json.loads(output.splitlines()[0])
+        self.assertEqual([game["title"] for game in plan["games"]], ["Dobble"])
+        self.assertEqual(plan["uncovered"], [])
+
+        code, output = self.run_cli("plan", "--function", "Attention=9", "--category", "Memory=4")
+        self.assertEqual(json.loads(output.splitlines()[0])["uncovered"], ["Attention=9"])
+        code, _ = self.run_cli("plan", "--function", "Attention")
+        self.assertEqual(code, cli.EXIT_USAGE)
+        code, _ = self.run_cli("plan")
+        self.assertEqual(code, cli.EXIT_USAGE)
+
+    def test_export_import_round_trip(self):
+        for output_format in cli.FORMATS:
+            export_file = os.path.join(self.directory.name, f"export.{output_format}")
+            code, _ = self.run_cli("export", "--format", output_format, "--output", export_file)
+            self.assertEqual(code, cli.EXIT_OK)
+
+            target = os.path.join(self.directory.name, f"target_{output_format}.db")
+            with redirect_stderr(io.StringIO()):
+                self.assertEqual(cli.main(["--db", target, "import", export_file]), cli.EXIT_OK)
+                # Importing again skips the existing titles
+                self.assertEqual(cli.main(["--db", target, "import", export_file]), cli.EXIT_OK)
+
+            db = Database(file=target)
+            self.assertEqual(len(db.get_all_games()), 2)
+            game = db.get_game(game_title="Dobble")
+            self.assertEqual(game.description, "Spot it")
+            self.assertEqual([(category.name, weight) for category, weight in game.categories], [("Memory", 4)])
+            self.assertEqual([(function.name, weight) for function, weight in game.functions], [("Attention", 8)])
+            db.con.close()
+
+    def test_import_rejects_invalid_records(self):
+        source = os.path.join(self.directory.name, "bad.jsonl")
+        with open(source, "w") as f:
+            f.write('{"title": "Valid"}\n{"title": "Bad material", "materials": ["SMELL"]}\nnot json\n')
+
+        code, _ = self.run_cli("import", source)
+        self.assertEqual(code, cli.EXIT_REJECTED)
+        _, output = self.run_cli("search", "--fields", "titles")
+        self.assertIn("Valid", output)
+        self.assertNotIn("Bad material", output)
+
+    def test_import_rejects_malformed_lines_and_keeps_the_others(self):
+        source = os.path.join(self.directory.name, "malformed.jsonl")
+        with open(source, "w") as f:
+            f.write('{"title": "Valid", "categories": [{"name": "Logic", "weight": 3}]}\n[1, 2]\n')
+            f.write('{"title": "No tag name", "functions": [{"weight": 3}]}\n')
+            f.write('{"title": "Bad weight", "categories": [{"name": "Speed", "weight": "high"}]}\n')
+
+        code, _ = self.run_cli("import", source)
+        self.assertEqual(code, cli.EXIT_REJECTED)
+        db = Database(file=self.db_file)
+        self.assertEqual(db.get_game(game_title="Valid").categories[0][0].name, "Logic")
+        # The tags of rejected records are not created
+        self.assertEqual(sorted(c.name for c in db.get_all_cognitive_categories()), ["Logic", "Memory"])
+        db.close()
+
+    def test_import_rejects_short_csv_rows(self):
+        source = os.path.join(self.directory.name, "short.csv")
+        with open(source, "w") as f:
+            f.write("id,title,materials,categories,functions\n1,Short\n2,Full,VISUAL,,\n3,Long,,,,extra\n")
+
+        code, _ = self.run_cli("import", source)
+        self.assertEqual(code, cli.EXIT_REJECTED)
+        _, output = self.run_cli("search", "--fields", "titles")
+        self.assertIn("Full", output)
+        self.assertNotIn("Short", output)
+        self.assertNotIn("Long", output)
+
+    def test_unreadable_files(self):
+        missing = os.path.join(self.directory.name, "missing.jsonl")
+        self.assertEqual(self.run_cli("import", missing)[0], cli.EXIT_USAGE)
+        unwritable = os.path.join(self.directory.name, "missing", "export.jsonl")
+        self.assertEqual(self.run_cli("export", "--output", unwritable)[0], cli.EXIT_USAGE)
+
+    def test_stats(self):
+        code, output = self.run_cli("stats")
+        stats = json.loads(output)
+        self.assertEqual(stats["games"], 2)
+        self.assertEqual(stats["materials"]["VISUAL"], 1)
+        self.assertEqual(stats["materials"]["TACTILE"], 0)
+
+    def test_vacuum(self):
+        code, output = self.run_cli("vacuum")
+        self.assertEqual(code, cli.EXIT_OK)
+        self.assertIn("size_after", json.loads(output))
+
+    def test_backup_and_restore(self):
+        self.assertEqual(self.run_cli("backup")[0], cli.EXIT_OK)
+        code, output = self.run_cli("backup", "--list", "--verify")
+        snapshot = json.loads(output)
+        self.assertEqual((snapshot["games"], snapshot["problems"]), (2, []))
+
+        db = Database(file=self.db_file)
+        db.delete_game(1)
+        db.con.close()
+        code, output = self.run_cli("restore", snapshot["name"])
+        self.assertEqual(code, cli.EXIT_OK)
+        self.assertEqual(json.loads(output)["games"], 2)
+        self.assertEqual(self.run_cli("restore", "unknown")[0], cli.EXIT_USAGE)
+
+    def test_export_pack(self):
+        from packed_catalog import PackedCatalog
+
+        pack_file = os.path.join(self.directory.name, "catalog.pack")
+        code, output = self.run_cli("export-pack", "--output", pack_file)
+        self.assertEqual(code, cli.EXIT_OK)
+        self.assertEqual(json.loads(output)["games"], 2)
+        with PackedCatalog(pack_file) as pack:
+            self.assertEqual(pack.get_game(game_title="Dobble").functions[0][1], 8)
+
+    def test_ingest_images(self):
+        from PIL import Image
+
+        Image.new("RGB", (50, 50), "green").save(os.path.join(self.directory.name, "dobble.png"))
+        mapping = os.path.join(self.directory.name, "photos.json")
+        with open(mapping, "w") as f:
+            json.dump({"dobble.png": "Dobble", "uno.png": "Uno"}, f)
+        code, output = self.run_cli("ingest-images", self.directory.name, "--mapping", mapping, "--workers", "1")
+        self.assertEqual(code, cli.EXIT_REJECTED)
+        report = json.loads(output)
+        self.assertEqual((report["ingested"], [failure["file"] for failure in report["failed"]]), (1, ["uno.png"]))
+
+    def test_images(self):
+        from PIL import Image
+
+        Image.new("RGB", (50, 50), "green").save(os.path.join(self.directory.name, "dobble.png"))
+        db = Database(file=self.db_file)
+        game = db.get_game(game_title="Dobble")
+        game.image = "dobble.png"
+        db.update_game(game)
+        db.con.close()
+        code, output = self.run_cli("images", "--to-database", "--originals")
+        self.assertEqual((code, json.loads(output)["originals"]), (cli.EXIT_OK, 1))
+        self.assertFalse(os.path.exists(os.path.join(self.directory.name, "dobble.png")))
+        code, output = self.run_cli("images", "--to-files")
+        self.assertEqual((code, json.loads(output)["files"]), (cli.EXIT_OK, 1))
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, "dobble.png")))
+
+    def test_analytics(self):
+        code, output = self.run_cli("analytics", "--strong", "8", "--min-games", "1")
+        self.assertEqual(code, cli.EXIT_OK)
+        report = json.loads(output)
+        self.assertEqual([gap["name"] for gap in report["gaps"]["cognitive_categories"]], ["Memory"])
+        self.assertEqual(report["gaps"]["cognitive_functions"], [])
+        self.assertEqual(report["co_occurrence"][0]["games"], 1)
+
+    def test_collection(self):
+        code, output = self.run_cli("collection", "Strong attention", "--save", "func:attention>=7")
+        self.assertEqual((code, json.loads(output)["games"]), (cli.EXIT_OK, 1))
+        db = Database(file=self.db_file)
+        attention = db.get_cognitive_function(function_name="Attention")
+        db.add_game(Game(title="Spot", categories=[], functions=[(attention, 9)]))
+        db.con.close()
+        code, output = self.run_cli("collection", "Strong attention", "--fields", "titles", "--format", "csv")
+        self.assertEqual([line.split(",")[1] for line in output.splitlines()[1:]], ["Dobble", "Spot"])
+        _, output = self.run_cli("collection", "--list")
+        self.assertEqual(json.loads(output)["games"], 2)
+
+        self.assertEqual(self.run_cli("collection", "Broken", "--save", "func:")[0], cli.EXIT_USAGE)
+        self.assertEqual(self.run_cli("collection")[0], cli.EXIT_USAGE)
+        self.assertEqual(self.run_cli("collection", "Strong attention", "--delete")[0], cli.EXIT_OK)
+        self.assertEqual(self.run_cli("collection", "Strong attention")[0], cli.EXIT_USAGE)
+
+    def test_set_parent(self):
+        db = Database(file=self.db_file)
+        db.add_cognitive_function(CognitiveFunction(name="Vigilance"))
+        db.con.close()
+        code, output = self.run_cli("set-parent", "--function", "Vigilance", "--parent", "Attention")
+        self.assertEqual(code, cli.EXIT_OK)
+        self.assertIsNotNone(json.loads(output)["parent_id"])
+        code, _ = self.run_cli("set-parent", "--function", "Attention", "--parent", "Vigilance")
+        self.assertEqual(code, cli.EXIT_USAGE)
+        self.assertEqual(self.run_cli("set-parent", "--category", "Unknown")[0], cli.EXIT_USAGE)
+
+        db = Database(file=self.db_file)
+        vigilance = db.get_cognitive_function(function_name="Vigilance")
+        game = db.get_game(game_title="Dobble")
+        game.functions = [(vigilance, 5)]
+        db.update_game(game)
+        db.con.close()
+        _, output = self.run_cli("search", "--function", "Attention", "--fields", "titles")
+        self.assertEqual(output, "")
+        _, output = self.run_cli("search", "--function", "Attention", "--descendants", "--fields", "titles")
+        self.assertIn("Dobble", output)
+
+    def test_headless_imports(self):
+        script = "import sys, cli; print('tkinter' in sys.modules or 'PIL' in sys.modules)"
+        result = subprocess.run(
+            [sys.executable, "-c", script], capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__)
+        )
+        self.assertEqual(result.stdout.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import multiprocessing
+import os
+import sqlite3
+import threading
+import unittest
+from unittest import mock
+
+from database import ConflictError, Database, LockedError, NotFoundError
+from models import CognitiveCategory, Game
+
+WORKERS = 4
+INCREMENTS = 25
+
+
+def _increment(db_file: str, game_id: int, times: int):
+    """Increment the counter stored in the description of the game, re-reading it on every conflict."""
+    db = Database(file=db_file)
+    try:
+        for _ in range(times):
+            while True:
+                game = db.get_game(game_id=game_id)
+                try:
+                    db.update_game(
+                        Game(
+                            id=game.id,
+                            title=game.title,
+                            description=str(int(game.description) + 1),
+                            categories=[],
+                            functions=[],
+                            version=game.version,
+                        )
+                    )
+                    break
+                except ConflictError:
+                    continue
+    finally:
+        db.close()
+
+
+class TestConcurrency(unittest.TestCase):
+    def setUp(self):
+        self.db_file = "test_concurrency.db"
+        self.db = Database(file=self.db_file)
+        self.db.setup()
+        self.db.add_game(Game(title="Counter", description="0", categories=[], functions=[]))
+        self.game = self.db.get_game(game_title="Counter")
+
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.db_file):
+            os.remove(self.db_file)
+
+    def _edit(self, game, description: str, version) -> Game:
+        return Game(id=game.id, title=game.title, description=description, categories=[], functions=[], version=version)
+
+    def test_updates_increment_the_version(self):
+        self.assertEqual(self.game.version, 0)
+        self.db.update_game(self._edit(self.game, "1", self.game.version))
+        self.db.update_game(self._edit(self.game, "2", None))
+        self.assertEqual(self.db.get_game(game_id=self.game.id).version, 2)
+
+    def test_stale_update_raises_conflict(self):
+        other = Database(file=self.db_file)
+        other.update_game(self._edit(self.game, "theirs", self.game.version))
+        other.close()
+
+        with self.assertRaises(ConflictError):
+            self.db.update_game(self._edit(self.game, "mine", self.game.version))
+        self.assertEqual(self.db.get_game(game_id=self.game.id).description, "theirs")
+        self.assertFalse(self.db.con.in_transaction)
+
+        # Overwriting is explicit
+        self.db.update_game(self._edit(self.game, "mine", None))
+        self.assertEqual(self.db.get_game(game_id=self.game.id).description, "mine")
+
+    def test_stale_delete_raises_conflict(self):
+        self.db.update_game(self._edit(self.game, "1", None))
+        with self.assertRaises(ConflictError):
+            self.db.delete_game(self.game.id, version=self.game.version)
+        self.db.delete_game(self.game.id, version=self.game.version + 1)
+        with self.assertRaises(NotFoundError):
+            self.db.update_game(self._edit(self.game, "2", self.game.version + 1))
+
+    def test_stale_category_rename_raises_conflict(self):
+        self.db.add_cognitive_category(CognitiveCategory(name="Memory"))
+        category = self.db.get_cognitive_category(category_name="Memory")
+        self.db.update_cognitive_category(CognitiveCategory(id=category.id, name="Memories", version=category.version))
+        with self.assertRaises(ConflictError):
+            self.db.update_cognitive_category(CognitiveCategory(id=category.id, name="Mem", version=category.version))
+        self.assertEqual(self.db.get_cognitive_category_by_id(category.id).name, "Memories")
+
+    def _lock(self, seconds: float = None) -> sqlite3.Connection:
+        """Hold the write lock from another connection, released after the given time."""
+        con = sqlite3.connect(self.db_file, check_same_thread=False)
+        con.execute("BEGIN IMMEDIATE")
+        if seconds is not None:
+            timer = threading.Timer(seconds, con.rollback)
+            timer.start()
+            self.addCleanup(timer.join)
+        self.addCleanup(con.close)
+        return con
+
+    @mock.patch("database.BUSY_BACKOFF", 0.05)
+    def test_busy_write_is_retried(self):
+        self.db.con.execute("PRAGMA busy_timeout = 0")
+        self._lock(0.1)
+        self.db.add_game(Game(title="Retried", categories=[], functions=[]))
+        self.assertEqual(self.db.get_game(game_title="Retried").title, "Retried")
+
+    @mock.patch("database.BUSY_RETRIES", 2)
+    @mock.patch("database.BUSY_BACKOFF", 0.001)
+    def test_locked_error_after_retries(self):
+        self.db.con.execute("PRAGMA busy_timeout = 0")
+        lock = self._lock()
+        with self.assertRaises(LockedError):
+            self.db.add_game(Game(title="Locked", categories=[], functions=[]))
+        lock.rollback()
+
+    def test_no_lost_updates_across_processes(self):
+        processes = [
+            multiprocessing.Process(target=_increment, args=(self.db_file, self.game.id, INCREMENTS))
+            for _ in range(WORKERS)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=120)
+            self.assertEqual(process.exitcode, 0)
+
+        game = self.db.get_game(game_id=self.game.id)
+        self.assertEqual(int(game.description), WORKERS * INCREMENTS)
+        self.assertEqual(game.version, WORKERS * INCREMENTS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,7 @@
 import unittest
 import os
-from database import Database, NotFoundError
-from models import Game, CognitiveCategory, CognitiveFunction, Material
+from database import Database, DuplicateError, NotFoundError, Projection
+from models import Game, CognitiveCategory, CognitiveFunction, Material, GameRecord, CognitiveCategoryRecord, Change
 
 
 class TestDatabase(unittest.TestCase):
@@ -494,6 +494,219 @@ class TestDatabase(unittest.TestCase):
         games = self.db.get_games_with_filters(game_title="Nonexistent Game")
         self.assertEqual(len(games), 0)
 
+    def test_search_game_titles_ignores_case_and_accents(self):
+        for title in ["Élan", "elephant", "Dobble", "Echecs"]:
+            self.db.add_game(Game(title=title, categories=[], functions=[]))
+
+        matches = self.db.search_game_titles("EL")
+        self.assertEqual([title for _, title in matches], ["Élan", "elephant"])
+        game_id = self.db.get_game(game_title="Élan").id
+        self.assertEqual(matches[0], (game_id, "Élan"))
+        self.assertEqual([title for _, title in self.db.search_game_titles("é", limit=1)], ["Echecs"])
+        self.assertEqual(self.db.search_game_titles("zz"), [])
+
+    def test_search_game_titles_after_update(self):
+        self.db.add_game(Game(title="Memory", categories=[], functions=[]))
+        game = self.db.get_game(game_title="Memory")
+        game.title = "Uno"
+        self.db.update_game(game)
+
+        self.assertEqual(self.db.search_game_titles("mem"), [])
+        self.assertEqual(self.db.search_game_titles("un"), [(game.id, "Uno")])
+
+    def test_search_game_titles_uses_index(self):
+        plan = self.db.con.execute(
+            "EXPLAIN QUERY PLAN SELECT id, title FROM games WHERE title_key >= ? AND title_key < ? "
+            "ORDER BY title_key LIMIT 20",
+            ("a", "b"),
+        ).fetchall()
+        self.assertIn("idx_games_title_key", " ".join(row[-1] for row in plan))
+
+    def test_projections(self):
+        self.db.add_cognitive_category(CognitiveCategory(name="Memory"))
+        category = self.db.get_cognitive_category(category_name="Memory")
+        game = Game(
+            title="Projected Game",
+            description="A long description",
+            image="image.png",
+            materials=[Material.VISUAL],
+            categories=[(category, 5)],
+            functions=[],
+        )
+        self.db.add_game(game)
+        game_id = self.db.get_game(game_title="Projected Game").id
+
+        self.assertEqual(self.db.get_all_games(projection=Projection.IDS), [game_id])
+        self.assertEqual(self.db.get_all_games(projection=Projection.TITLES), [(game_id, "Projected Game")])
+
+        summary = self.db.get_game(game_id=game_id, projection=Projection.SUMMARY)
+        self.assertEqual(summary.title, "Projected Game")
+        self.assertEqual(summary.image, "image.png")
+        self.assertEqual(summary.materials, [Material.VISUAL])
+        self.assertEqual(summary.description, "")
+        self.assertEqual(summary.categories, [])
+
+        full = self.db.get_all_games(projection=Projection.FULL)[0]
+        self.assertEqual(full.description, "A long description")
+        self.assertEqual(full.categories, [(category, 5)])
+
+        self.assertEqual(
+            self.db.get_games_with_filters(cognitive_categories_ids=[category.id], projection=Projection.IDS),
+            [game_id],
+        )
+
+    def test_projection_selects_only_its_columns(self):
+        statements = []
+        self.db.con.set_trace_callback(statements.append)
+        self.db.get_games_with_filters(game_title="Game", projection=Projection.TITLES)
+        self.db.con.set_trace_callback(None)
+        self.assertTrue(statements[0].startswith("SELECT id, title FROM games"))
+
+    def test_get_games_with_filters_any_of_several_materials(self):
+        self.db.add_game(Game(title="Visual", materials=[Material.VISUAL], categories=[], functions=[]))
+        self.db.add_game(Game(title="Verbal", materials=[Material.VERBAL], categories=[], functions=[]))
+        self.db.add_game(Game(title="Tactile", materials=[Material.TACTILE], categories=[], functions=[]))
+
+        titles = self.db.get_games_with_filters(
+            materials=[Material.VISUAL, Material.VERBAL], projection=Projection.TITLES
+        )
+        self.assertEqual([title for _, title in titles], ["Visual", "Verbal"])
+
+    def test_reads_return_trusted_records(self):
+        self.db.add_cognitive_category(CognitiveCategory(name="Memory"))
+        category = self.db.get_cognitive_category(category_name="Memory")
+        self.db.add_game(Game(title="Record", categories=[(category, 5)], functions=[]))
+
+        game = self.db.get_game(game_title="Record")
+        self.assertIsInstance(game, GameRecord)
+        self.assertIsInstance(category, CognitiveCategoryRecord)
+        self.assertEqual(game.categories, [(CognitiveCategoryRecord(category.id, "Memory"), 5)])
+
+    def test_writes_validate_records(self):
+        self.db.add_game(Game(title="Record", categories=[], functions=[]))
+        game = self.db.get_game(game_title="Record")
+
+        game.materials = ["NOT A MATERIAL"]
+        with self.assertRaises(ValueError):
+            self.db.update_game(game)
+
+        game.materials = [Material.VERBAL]
+        self.db.update_game(game)
+        self.assertEqual(self.db.get_game(game_id=game.id).materials, [Material.VERBAL])
+
+    def test_add_games_in_batches(self):
+        games = [Game(title=f"Game {i}", categories=[], functions=[]) for i in range(25)]
+        self.assertEqual(self.db.add_games(games, batch_size=10), 25)
+        self.assertEqual(len(self.db.get_all_games()), 25)
+        self.assertEqual(self.db.search_game_titles("game 24"), [(25, "Game 24")])
+
+    def test_add_games_rolls_back_failed_batch(self):
+        games = [Game(title=title, categories=[], functions=[]) for title in ["A", "B", "C", "C"]]
+        with self.assertRaises(DuplicateError):
+            self.db.add_games(games, batch_size=2)
+        self.assertEqual([title for _, title in self.db.get_all_games(projection=Projection.TITLES)], ["A", "B"])
+
+    def test_iter_games_with_filters(self):
+        for i in range(5):
+            self.db.add_game(Game(title=f"Game {i}", materials=[Material.VISUAL], categories=[], functions=[]))
+        self.db.add_game(Game(title="Other", materials=[Material.VERBAL], categories=[], functions=[]))
+
+        games = self.db.iter_games_with_filters(materials=[Material.VISUAL], batch_size=2)
+        self.assertEqual([game.title for game in games], [f"Game {i}" for i in range(5)])
+
+    def test_get_games_with_filters_pages(self):
+        for i in range(5):
+            self.db.add_game(Game(title=f"Game {i}", categories=[], functions=[]))
+
+        page = self.db.get_games_with_filters(projection=Projection.IDS, limit=2, offset=2)
+        self.assertEqual(page, [3, 4])
+        self.assertEqual(self.db.get_games_with_filters(projection=Projection.IDS, offset=4), [5])
+
+    def test_get_games_by_ids(self):
+        for i in range(5):
+            self.db.add_game(Game(title=f"Game {i}", categories=[], functions=[]))
+
+        games = self.db.get_games_by_ids([4, 99, 2], projection=Projection.TITLES)
+        self.assertEqual(games, [(4, "Game 3"), (2, "Game 1")])
+        self.assertEqual([game.title for game in self.db.get_games_by_ids([1])], ["Game 0"])
+
+    def test_get_facets(self):
+        self.db.add_cognitive_category(CognitiveCategory(name="Memory"))
+        self.db.add_cognitive_category(CognitiveCategory(name="Language"))
+        memory = self.db.get_cognitive_category(category_name="Memory")
+        language = self.db.get_cognitive_category(category_name="Language")
+        self.db.add_game(Game(title="A", materials=[Material.VISUAL], categories=[(memory, 1)], functions=[]))
+        self.db.add_game(
+            Game(title="B", materials=[Material.VISUAL], categories=[(memory, 2), (language, 3)], functions=[])
+        )
+        self.db.add_game(Game(title="C", materials=[Material.VERBAL], categories=[], functions=[]))
+
+        facets = self.db.get_facets()
+        self.assertEqual(facets["games"], 3)
+        self.assertEqual(facets["cognitive_categories"], {memory.id: 2, language.id: 1})
+        self.assertEqual(facets["materials"], {Material.VISUAL.name: 2, Material.VERBAL.name: 1})
+
+        facets = self.db.get_facets(materials=[Material.VISUAL], cognitive_categories_ids=[language.id])
+        self.assertEqual(facets["games"], 1)
+        self.assertEqual(facets["cognitive_categories"], {memory.id: 1, language.id: 1})
+        self.assertEqual(facets["cognitive_functions"], {})
+
+    def test_changes_since(self):
+        self.db.add_cognitive_category(CognitiveCategory(name="Memory"))
+        memory = self.db.get_cognitive_category(category_name="Memory")
+        self.db.add_game(Game(title="A", categories=[(memory, 1)], functions=[]))
+        self.db.add_game(Game(title="B", categories=[], functions=[]))
+        seq = self.db.last_change_seq()
+        self.db.delete_cognitive_category(memory.id)
+
+        # Only the game tagged with the category has been updated
+        self.assertEqual(
+            [(change.table, change.row_id, change.op) for change in self.db.changes_since(seq)],
+            [("games", 1, "update"), ("cognitive_categories", memory.id, "delete")],
+        )
+        self.assertEqual(len(self.db.changes_since()), 5)
+        self.assertEqual(self.db.changes_since(seq, limit=1), [Change(seq + 1, "games", 1, "update")])
+
+    def test_subscribe(self):
+        received = []
+        unsubscribe = self.db.subscribe(received.append)
+        self.db.add_games([Game(title=title, categories=[], functions=[]) for title in ["A", "B"]])
+        self.db.delete_game(1)
+        self.assertEqual(
+            [[change.op for change in changes] for changes in received], [["insert", "insert"], ["delete"]]
+        )
+
+        unsubscribe()
+        self.db.delete_game(2)
+        self.assertEqual(len(received), 2)
+
+    def test_publish_changes_of_other_connections(self):
+        received = []
+        self.db.subscribe(received.append)
+        other = Database(file=self.db_file)
+        other.add_game(Game(title="A", categories=[], functions=[]))
+        other.con.close()
+        self.assertEqual(received, [])
+
+        self.db.publish_changes()
+        self.assertEqual([change.row_id for change in received[0]], [1])
+
+    def test_compact_changes(self):
+        self.db.add_game(Game(title="A", categories=[], functions=[]))
+        self.db.add_game(Game(title="B", categories=[], functions=[]))
+        self.db.update_game(Game(id=1, title="C", categories=[], functions=[]))
+        self.db.delete_game(1)
+
+        self.assertEqual(self.db.compact_changes(), 2)
+        self.assertEqual(
+            [(change.row_id, change.op) for change in self.db.changes_since()], [(2, "insert"), (1, "delete")]
+        )
+
+    def test_close_twice(self):
+        self.db.close()
+        with self.assertNoLogs("database", level="WARNING"):
+            self.db.close()
+
 
 if __name__ == "__main__":
     unittest.main()
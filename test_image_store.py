@@ -0,0 +1,88 @@
+import io
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+
+import image_store
+from backup import create_snapshot
+from database import Database
+from models import Game
+from sync import export_bundle
+
+
+class TestImageStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = Database(file=os.path.join(self.directory.name, "catalog.db"))
+        self.db.setup()
+        os.mkdir(os.path.join(self.directory.name, "images"))
+        Image.new("RGB", (600, 300), "red").save(self.path("images/1.jpg"))
+        Image.new("RGBA", (40, 40), "blue").save(self.path("images/2.png"))
+        with open(self.path("images/3.png"), "wb") as f:
+            f.write(b"not an image")
+        for title, image in (("Dobble", "images/1.jpg"), ("Uno", "images/2.png"), ("Twin", "images/1.jpg")):
+            self.db.add_game(Game(title=title, image=image, categories=[], functions=[]))
+        self.db.add_game(Game(title="Broken", image="images/3.png", categories=[], functions=[]))
+        with open(self.path("images/1.jpg"), "rb") as f:
+            self.original = f.read()
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory.name, name)
+
+    def image(self, title: str) -> str:
+        return self.db.get_game(game_title=title).image
+
+    def test_thumbnails_only(self):
+        report = image_store.move_to_database(self.db)
+        self.assertEqual((report["thumbnails"], report["originals"]), (2, 0))
+        self.assertEqual([failure["image"] for failure in report["failed"]], ["images/3.png"])
+        self.assertEqual(self.image("Dobble"), self.image("Twin"))
+        self.assertIsNotNone(image_store.blob_id(self.image("Dobble")))
+        self.assertEqual(self.image("Broken"), "images/3.png")
+
+        thumbnail = Image.open(io.BytesIO(image_store.read_thumbnail(self.db, self.image("Dobble"))))
+        self.assertEqual(thumbnail.size, (150, 75))
+        # The original stays in its file
+        self.assertTrue(os.path.exists(self.path("images/1.jpg")))
+        with image_store.open_image(self.db, self.image("Dobble")) as f:
+            self.assertEqual(f.read(), self.original)
+        self.assertIsNone(image_store.read_thumbnail(self.db, "images/3.png"))
+        self.assertIsNone(image_store.read_thumbnail(self.db, "blob:1000"))
+
+    def test_originals_round_trip(self):
+        image_store.move_to_database(self.db)
+        report = image_store.move_to_database(self.db, originals=True)
+        self.assertEqual((report["thumbnails"], report["originals"]), (0, 2))
+        self.assertFalse(os.path.exists(self.path("images/1.jpg")))
+        with image_store.open_image(self.db, self.image("Dobble")) as blob:
+            # Only the bytes read are fetched
+            self.assertEqual(blob.read(4), self.original[:4])
+            blob.seek(0)
+            with Image.open(blob) as image:
+                self.assertEqual(image.size, (600, 300))
+
+        report = image_store.move_to_files(self.db)
+        self.assertEqual(report, {"files": 2, "images": 2})
+        self.assertEqual(self.image("Twin"), "images/1.jpg")
+        with open(self.path("images/1.jpg"), "rb") as f:
+            self.assertEqual(f.read(), self.original)
+        self.assertEqual(self.db.con.execute("SELECT COUNT(*) FROM images").fetchone()[0], 0)
+
+    def test_backup_and_sync_read_stored_images(self):
+        image_store.move_to_database(self.db)
+        snapshot = create_snapshot(self.db.file)
+        self.assertEqual(sorted(snapshot.manifest()["images"]), ["images/1.jpg", "images/2.png", "images/3.png"])
+
+        image_store.move_to_database(self.db, originals=True)
+        summary = export_bundle(self.db, self.path("bundle.zip"))
+        self.assertEqual(summary["images"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
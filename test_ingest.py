@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+
+from database import Database
+from ingest import IngestError, ingest_images, load_mapping
+from models import Game
+
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = Database(file=os.path.join(self.directory.name, "catalog.db"))
+        self.db.setup()
+        for title in ("Dobble", "Uno", "Memory", "Twister"):
+            self.db.add_game(Game(title=title, categories=[], functions=[]))
+        self.folder = os.path.join(self.directory.name, "photos")
+        os.mkdir(self.folder)
+
+        # A portrait photo stored sideways, as cameras do, with its EXIF orientation
+        photo = Image.new("RGB", (3000, 2000), "red")
+        exif = photo.getexif()
+        exif[0x0112] = 6
+        photo.save(os.path.join(self.folder, "dobble.jpg"), exif=exif)
+        Image.new("RGBA", (200, 100), (0, 0, 255, 128)).save(os.path.join(self.folder, "uno.png"))
+        with open(os.path.join(self.folder, "memory.jpg"), "wb") as f:
+            f.write(b"\xff\xd8 not really a JPEG")
+        self.mapping = {
+            "dobble.jpg": "Dobble",
+            "uno.png": "Uno",
+            "memory.jpg": "Memory",
+            "missing.jpg": "Twister",
+            "other.jpg": "Unknown",
+        }
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def image(self, title: str) -> Image.Image:
+        path = self.db.get_game(game_title=title).image
+        return Image.open(os.path.join(self.directory.name, path))
+
+    def test_ingest(self):
+        calls = []
+        report = ingest_images(
+            self.db,
+            self.folder,
+            self.mapping,
+            workers=2,
+            max_size=300,
+            batch_size=1,
+            progress=lambda *call: calls.append(call),
+        )
+        self.assertEqual(report["ingested"], 2)
+        self.assertEqual([failure["file"] for failure in report["failed"]], ["memory.jpg", "missing.jpg", "other.jpg"])
+        self.assertEqual([call[:2] for call in calls], [(1, 4), (2, 4), (3, 4), (4, 4)])
+
+        with self.image("Dobble") as image:
+            self.assertEqual((image.format, image.size), ("JPEG", (200, 300)))
+        with self.image("Uno") as image:
+            self.assertEqual((image.format, image.mode, image.size), ("PNG", "RGBA", (200, 100)))
+        self.assertIsNone(self.db.get_game(game_title="Memory").image)
+        self.assertEqual(self.db.get_game(game_title="Uno").version, 1)
+
+        # The same photo for another game is stored once
+        report = ingest_images(self.db, self.folder, {"uno.png": "Memory"}, workers=1)
+        self.assertEqual(report["ingested"], 1)
+        self.assertEqual(self.db.get_game(game_title="Memory").image, self.db.get_game(game_title="Uno").image)
+        self.assertEqual(len(os.listdir(os.path.join(self.directory.name, "images"))), 2)
+
+    def test_load_mapping(self):
+        csv_file = os.path.join(self.directory.name, "photos.csv")
+        with open(csv_file, "w", encoding="utf-8") as f:
+            f.write("file,title\ndobble.jpg, Dobble\n\nuno.png,Uno\n")
+        self.assertEqual(load_mapping(csv_file), {"dobble.jpg": "Dobble", "uno.png": "Uno"})
+
+        json_file = os.path.join(self.directory.name, "photos.json")
+        with open(json_file, "w", encoding="utf-8") as f:
+            json.dump(["dobble.jpg"], f)
+        with self.assertRaises(IngestError):
+            load_mapping(json_file)
+        with self.assertRaises(IngestError):
+            load_mapping(os.path.join(self.directory.name, "absent.csv"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+
+import instrumentation
+from database import Database, NotFoundError
+from models import CognitiveCategory, Game
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.db = Database(file=":memory:")
+        self.db.setup()
+        self.recorder = instrumentation.enable(slow_threshold=0.05)
+
+    def tearDown(self):
+        instrumentation.disable()
+
+    def test_disabled_by_default(self):
+        instrumentation.disable()
+        self.db.get_all_games()
+        self.assertIsNone(instrumentation.current)
+        self.assertEqual(instrumentation.snapshot(), {})
+
+    def test_records_calls_and_statements(self):
+        self.db.add_cognitive_category(CognitiveCategory(name="Memory"))
+        self.db.get_all_cognitive_categories()
+        self.db.get_all_cognitive_categories()
+
+        methods = instrumentation.snapshot()["methods"]
+        stats = methods["Database.get_all_cognitive_categories"]
+        self.assertEqual(stats["calls"], 2)
+        self.assertEqual(stats["statements"], 2)
+        self.assertEqual(sum(stats["histogram"].values()), 2)
+        self.assertEqual(methods["Database.add_cognitive_category"]["calls"], 1)
+
+    def test_nested_calls_count_statements_inclusively(self):
+        self.db.add_cognitive_category(CognitiveCategory(name="Memory"))
+        category = self.db.get_cognitive_category(category_name="Memory")
+        self.db.add_game(Game(title="Game", categories=[(category, 3)], functions=[]))
+        self.db.get_game(game_title="Game")
+
+        methods = instrumentation.snapshot()["methods"]
+        # The game itself, then the categories and functions it references
+        self.assertEqual(methods["Database.get_game"]["statements"], 3)
+        self.assertEqual(methods["Database.get_all_cognitive_categories"]["calls"], 1)
+
+    def test_records_errors(self):
+        with self.assertRaises(NotFoundError):
+            self.db.get_game(game_id=42)
+        self.assertEqual(instrumentation.snapshot()["methods"]["Database.get_game"]["errors"], 1)
+
+    def test_slow_statements_are_explained(self):
+        self.recorder.slow_threshold = 0
+        self.db.get_games_with_filters(game_title="abc")
+
+        slow = instrumentation.snapshot()["slow_statements"]
+        self.assertTrue(slow)
+        self.assertEqual(slow[0]["method"], "Database.get_games_with_filters")
+        self.assertIn("games", " ".join(slow[0]["plan"]))
+
+    def test_trace_callback_is_removed(self):
+        self.db.get_all_games()
+        statements = []
+        instrumentation.disable()
+        self.db.con.set_trace_callback(statements.append)
+        self.db.con.execute("SELECT 1")
+        self.assertEqual(statements, ["SELECT 1"])
+
+    def test_trace_callback_is_restored(self):
+        statements = []
+        self.db.con.set_trace_callback(statements.append)
+        self.db.get_all_cognitive_categories()
+        self.db.con.execute("SELECT 1")
+        self.assertEqual(statements[-1], "SELECT 1")
+        self.assertIn("cognitive_categories", statements[0])
+        stats = instrumentation.snapshot()["methods"]["Database.get_all_cognitive_categories"]
+        self.assertEqual(stats["statements"], 1)
+        self.db.con.set_trace_callback(None)
+
+    def test_report(self):
+        self.db.get_all_games()
+        self.assertIn("Database.get_all_games", self.recorder.report())
+
+
+if __name__ == "__main__":
+    unittest.main()
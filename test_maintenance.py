@@ -0,0 +1,92 @@
+import unittest
+import json
+import os
+import tempfile
+
+import maintenance
+from database import Database, NotFoundError
+from models import CognitiveCategory, Game
+
+
+class TestMaintenance(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.directory.name, "catalog.db")
+        self.db = Database(file=self.db_file)
+        self.db.setup()
+
+    def tearDown(self):
+        self.db.con.close()
+        self.directory.cleanup()
+
+    def fill_and_empty(self):
+        games = (Game(title=f"Game {i}", description="x" * 500, categories=[], functions=[]) for i in range(2000))
+        self.db.add_games(games)
+        self.db.con.execute("DELETE FROM games")
+
+    def test_dangling_tags_are_reported_and_removed(self):
+        self.db.add_cognitive_category(CognitiveCategory(name="Memory"))
+        memory = self.db.get_cognitive_category(category_name="Memory")
+        self.db.add_game(Game(title="Dobble", categories=[(memory, 3)], functions=[]))
+        # As left by older versions, or by a write made outside of the Database
+        self.db.con.execute("UPDATE games SET cognitive_categories = ?", (json.dumps([[memory.id, 3], [42, 1]]),))
+        self.db.con.commit()
+        with self.assertRaises(NotFoundError):
+            self.db.get_game(game_title="Dobble")
+
+        report = maintenance.run(self.db, repair=False)
+        self.assertEqual(report.problems, ["1 cognitive_categories IDs of games do not exist"])
+        self.assertEqual(report.repaired_games, 0)
+
+        report = maintenance.run(self.db)
+        self.assertEqual(report.repaired_games, 1)
+        self.assertEqual(self.db.get_game(game_title="Dobble").categories[0][1], 3)
+        self.assertEqual(maintenance.run(self.db).problems, [])
+
+    def test_repaired_games_are_touched(self):
+        self.db.add_game(Game(title="Dobble", categories=[], functions=[]))
+        self.db.con.execute(
+            "UPDATE games SET cognitive_functions = ?, updated_at = '2000-01-01'", (json.dumps([[42, 1]]),)
+        )
+        self.db.con.commit()
+        (version,) = self.db.con.execute("SELECT version FROM games").fetchone()
+
+        maintenance.run(self.db)
+        self.assertEqual(
+            self.db.con.execute("SELECT updated_at > '2000-01-01', version FROM games").fetchone(), (1, version + 1)
+        )
+
+    def test_analyze_after_bulk_changes(self):
+        self.assertTrue(maintenance.run(self.db).analyzed)
+        self.assertFalse(maintenance.run(self.db).analyzed)
+        games = (Game(title=f"Game {i}", categories=[], functions=[]) for i in range(maintenance.ANALYZE_THRESHOLD))
+        self.db.add_games(games)
+        self.assertTrue(maintenance.run(self.db).analyzed)
+        self.assertGreater(self.db.con.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0], 0)
+
+    def test_incremental_vacuum(self):
+        self.assertEqual(self.db.con.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+        self.fill_and_empty()
+        self.db.con.commit()
+        free = self.db.con.execute("PRAGMA freelist_count").fetchone()[0]
+        self.assertGreater(free, maintenance.FREELIST_MIN_PAGES)
+
+        report = maintenance.run(self.db)
+        # ANALYZE may have used some of them first
+        self.assertGreater(report.freed_pages, free - 8)
+        self.assertEqual(self.db.con.execute("PRAGMA freelist_count").fetchone()[0], 0)
+        self.assertEqual(set(report.timings), {"integrity check", "analyze", "incremental vacuum"})
+
+    def test_older_databases_are_converted(self):
+        self.db.con.execute("PRAGMA auto_vacuum = NONE")
+        self.db.vacuum()
+        self.fill_and_empty()
+        self.db.con.commit()
+
+        self.assertGreater(maintenance.run(self.db).freed_pages, 0)
+        self.assertEqual(self.db.con.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+        self.assertEqual(self.db.con.execute("PRAGMA freelist_count").fetchone()[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
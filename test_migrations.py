@@ -0,0 +1,111 @@
+import unittest
+import os
+import sqlite3
+import tempfile
+from unittest import mock
+
+import migrations
+from database import Database
+
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.db_file = "test_migrations_temp.db"
+        self.db = Database(file=self.db_file)
+
+    def tearDown(self):
+        self.db.con.close()
+        if os.path.exists(self.db_file):
+            os.remove(self.db_file)
+
+    def test_setup_sets_latest_version(self):
+        self.db.setup()
+        self.assertEqual(migrations.get_version(self.db.con), migrations.latest_version())
+
+    def test_setup_on_up_to_date_database_skips_ddl(self):
+        self.db.setup()
+        statements = []
+        self.db.con.set_trace_callback(statements.append)
+        self.db.setup()
+        self.db.con.set_trace_callback(None)
+        self.assertEqual(statements, ["PRAGMA user_version"])
+
+    def test_setup_from_another_directory(self):
+        db_file = os.path.abspath(self.db_file)
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                db = Database(file=db_file)
+                db.setup()
+                db.con.close()
+            finally:
+                os.chdir(cwd)
+        tables = {row[0] for row in self.db.con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertIn("games", tables)
+
+    def test_setup_on_unversioned_database(self):
+        # Databases created before versioning have the tables but user_version 0
+        with open(migrations.SCHEMA_FILE) as f:
+            self.db.con.executescript(f.read())
+        self.db.setup()
+        self.assertEqual(migrations.get_version(self.db.con), migrations.latest_version())
+
+    def test_failed_migration_is_rolled_back(self):
+        self.db.setup()
+        version = migrations.latest_version()
+
+        def broken(con):
+            con.execute("CREATE TABLE half_done (id INTEGER)")
+            raise sqlite3.OperationalError("boom")
+
+        migrations.MIGRATIONS.append((version + 1, "broken", broken))
+        try:
+            with self.assertRaises(sqlite3.OperationalError):
+                migrations.migrate(self.db.con)
+        finally:
+            migrations.MIGRATIONS.pop()
+
+        self.assertEqual(migrations.get_version(self.db.con), version)
+        tables = {row[0] for row in self.db.con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertNotIn("half_done", tables)
+
+    def test_concurrent_setup(self):
+        other = Database(file=self.db_file)
+        self.addCleanup(other.con.close)
+        get_version = migrations.get_version
+        reads = []
+
+        def migrated_meanwhile(con):
+            version = get_version(con)
+            reads.append(version)
+            if len(reads) == 1:
+                # The first read is out of any transaction: the other instance migrates the file right after it
+                other.setup()
+            return version
+
+        with mock.patch("migrations.get_version", side_effect=migrated_meanwhile):
+            self.assertEqual(migrations.migrate(self.db.con), [])
+        self.assertEqual(migrations.get_version(self.db.con), migrations.latest_version())
+
+    def test_execute_script_handles_triggers(self):
+        migrations.execute_script(
+            self.db.con,
+            """
+            CREATE TABLE t (id INTEGER);
+            CREATE TABLE log (id INTEGER);
+            CREATE TRIGGER t_insert AFTER INSERT ON t BEGIN
+                INSERT INTO log (id) VALUES (new.id);
+            END;
+            INSERT INTO t (id) VALUES (1);
+            """,
+        )
+        self.assertEqual(self.db.con.execute("SELECT id FROM log").fetchall(), [(1,)])
+
+    def test_out_of_order_registration(self):
+        with self.assertRaises(ValueError):
+            migrations.migration(1, "duplicate")(lambda con: None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.catalog import generate_catalog
+from benchmarks.suite import FILTERS
+from database import Database, NotFoundError, Projection
+from models import Game, Material
+from packed_catalog import PackError, PackedCatalog, export_pack
+
+
+def _key(game) -> int:
+    return game if isinstance(game, int) else game[0] if isinstance(game, tuple) else game.id
+
+
+class TestPackedCatalog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = Database(file=os.path.join(self.directory.name, "catalog.db"))
+        self.db.setup()
+        generate_catalog(self.db, 300)
+        self.db.add_game(Game(title="Jeu de mémoire à l'écran", image="images/jeu.png", categories=[], functions=[]))
+        self.db.add_game(Game(title="100% Mémo_ry", categories=[], functions=[], materials=[Material.VERBAL]))
+        self.path = os.path.join(self.directory.name, "catalog.pack")
+        self.summary = export_pack(self.db, self.path)
+        self.pack = PackedCatalog(self.path)
+
+    def tearDown(self):
+        self.pack.close()
+        self.db.close()
+        self.directory.cleanup()
+
+    def test_summary(self):
+        self.assertEqual(self.summary["games"], 302)
+        self.assertEqual(self.pack.count, 302)
+        self.assertEqual(self.pack.seq, self.db.last_change_seq())
+
+    def test_same_results_as_the_database(self):
+        for filters in FILTERS.values():
+            for projection in Projection:
+                expected = self.db.get_games_with_filters(**filters, projection=projection)
+                found = self.pack.get_games_with_filters(**filters, projection=projection)
+                self.assertEqual(sorted(found, key=_key), sorted(expected, key=_key))
+            self.assertEqual(self.pack.get_facets(**filters), self.db.get_facets(**filters))
+        page = {"cognitive_functions_ids": [1, 3], "limit": 7, "offset": 3}
+        self.assertEqual(self.pack.get_games_with_filters(**page), self.db.get_games_with_filters(**page))
+
+    def test_title_search_behaves_like_like(self):
+        for title in ("MÉMOIRE", "mémoire", "JEU DE", "0%_", "%", "_", "o_r", "Mémo_r", "e à l", "absent", "'"):
+            expected = self.db.get_games_with_filters(game_title=title, projection=Projection.IDS)
+            found = self.pack.get_games_with_filters(game_title=title, projection=Projection.IDS)
+            self.assertEqual(found, sorted(expected), title)
+
+    def test_get_game_and_taxonomy(self):
+        game = self.db.get_game(game_title="Jeu de mémoire à l'écran")
+        self.assertEqual(self.pack.get_game(game_id=game.id), game)
+        self.assertEqual(self.pack.get_game(game_title=game.title), game)
+        self.assertIsNone(self.pack.get_game(game_title="100% Mémo_ry").image)
+        with self.assertRaises(NotFoundError):
+            self.pack.get_game(game_id=10_000)
+        self.assertEqual(self.pack.get_all_cognitive_categories(), self.db.get_all_cognitive_categories())
+        self.assertEqual(self.pack.get_all_cognitive_functions(), self.db.get_all_cognitive_functions())
+        self.assertEqual(sorted(self.pack.get_all_games(), key=_key), sorted(self.db.get_all_games(), key=_key))
+
+    def test_empty_catalog(self):
+        db = Database(file=":memory:")
+        db.setup()
+        path = os.path.join(self.directory.name, "empty.pack")
+        export_pack(db, path)
+        with PackedCatalog(path) as pack:
+            self.assertEqual(pack.get_games_with_filters(), [])
+            self.assertEqual(pack.get_facets()["games"], 0)
+
+    def test_rejects_other_files(self):
+        path = os.path.join(self.directory.name, "other.pack")
+        with open(path, "wb") as f:
+            f.write(b"SQLite format 3\0" + b"\0" * 1000)
+        with self.assertRaises(PackError):
+            PackedCatalog(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
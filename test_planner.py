@@ -0,0 +1,117 @@
+import os
+import random
+import time
+import unittest
+
+import planner
+from benchmarks.catalog import FUNCTION_COUNT, generate_catalog
+from database import Database
+from models import CognitiveFunction, Game, Material
+from planner import Target, plan_session, targets
+
+
+class TestPlanner(unittest.TestCase):
+    def setUp(self):
+        self.db_file = "test_planner.db"
+        self.db = Database(file=self.db_file)
+        self.db.setup()
+        for name in ("Working memory", "Inhibition", "Planning", "Flexibility"):
+            self.db.add_cognitive_function(CognitiveFunction(name=name))
+        self.functions = {function.name: function for function in self.db.get_all_cognitive_functions()}
+
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.db_file):
+            os.remove(self.db_file)
+
+    def _add(self, title, materials=(Material.VISUAL,), **weights):
+        functions = [(self.functions[name.replace("_", " ").capitalize()], weight) for name, weight in weights.items()]
+        self.db.add_game(Game(title=title, categories=[], functions=functions, materials=list(materials)))
+        return self.db.get_game(game_title=title).id
+
+    def _goals(self, **weights):
+        return targets({self.functions[name.replace("_", " ").capitalize()].id: w for name, w in weights.items()})
+
+    def test_single_game_covering_everything(self):
+        self._add("Memory only", working_memory=9)
+        both = self._add("Both", working_memory=7, inhibition=6)
+        plans = plan_session(self.db, self._goals(working_memory=7, inhibition=5))
+        self.assertEqual(plans[0].game_ids, [both])
+        self.assertTrue(plans[0].optimal)
+        self.assertEqual(plans[0].uncovered, [])
+
+    def test_weights_below_target_do_not_cover(self):
+        self._add("Weak", working_memory=6, inhibition=9)
+        strong = self._add("Strong", working_memory=8)
+        plans = plan_session(self.db, self._goals(working_memory=7, inhibition=5))
+        self.assertEqual(len(plans[0].game_ids), 2)
+        self.assertIn(strong, plans[0].game_ids)
+
+    def test_exact_search_beats_greedy(self):
+        # Greedy takes the game covering 3 targets first, then needs 2 more; 2 games are enough
+        ids = {
+            "Wide": self._add("Wide", working_memory=7, inhibition=7, planning=7),
+            "Left": self._add("Left", working_memory=7, inhibition=7, flexibility=7),
+            "Right": self._add("Right", planning=7),
+        }
+        self.db.add_cognitive_function(CognitiveFunction(name="Fluency"))
+        fluency = self.db.get_cognitive_function(function_name="Fluency")
+        self.db.add_game(Game(title="Fluent", categories=[], functions=[(fluency, 7), (self.functions["Planning"], 7)]))
+        goals = self._goals(working_memory=7, inhibition=7, planning=7, flexibility=7) + [
+            Target("cognitive_functions", fluency.id, 7)
+        ]
+        greedy = plan_session(self.db, goals, exact=False)
+        exact = plan_session(self.db, goals)
+        self.assertEqual(len(greedy[0].game_ids), 3)
+        self.assertFalse(greedy[0].optimal)
+        self.assertEqual(len(exact[0].game_ids), 2)
+        self.assertIn(ids["Left"], exact[0].game_ids)
+
+    def test_materials(self):
+        self._add("Visual", working_memory=9)
+        audio = self._add("Audio", materials=(Material.AUDITORY, Material.VERBAL), working_memory=8)
+        plans = plan_session(self.db, self._goals(working_memory=7), materials=[Material.AUDITORY, Material.VERBAL])
+        self.assertEqual([plan.game_ids for plan in plans], [[audio]])
+
+    def test_alternatives_ranked_by_strength(self):
+        weak = self._add("Weak", working_memory=7)
+        strong = self._add("Strong", working_memory=10)
+        middle = self._add("Middle", working_memory=8)
+        plans = plan_session(self.db, self._goals(working_memory=7), alternatives=2)
+        self.assertEqual([plan.game_ids for plan in plans], [[strong], [middle]])
+        self.assertNotIn([weak], [plan.game_ids for plan in plans])
+
+    def test_unreachable_targets(self):
+        game = self._add("Memory", working_memory=9)
+        plans = plan_session(self.db, self._goals(working_memory=7, planning=5))
+        self.assertEqual(plans[0].game_ids, [game])
+        self.assertEqual([goal.tag_id for goal in plans[0].uncovered], [self.functions["Planning"].id])
+        self.assertEqual(plan_session(self.db, self._goals(planning=5)), [])
+
+    def test_dominated_covers_are_dropped(self):
+        self.assertEqual(planner._undominated([0b011, 0b001, 0b110, 0b111, 0b100]), [0b111])
+        self.assertEqual(planner._undominated([0b011, 0b110]), [0b011, 0b110])
+
+    def test_interactive_on_large_catalog(self):
+        db = Database(file=":memory:")
+        db.setup()
+        generate_catalog(db, 10_000)
+        rng = random.Random(0)
+        goals = targets({function_id: rng.randint(6, 9) for function_id in rng.sample(range(1, FUNCTION_COUNT + 1), 8)})
+        start = time.perf_counter()
+        plans = plan_session(db, goals, time_budget=0.2)
+        self.assertLess(time.perf_counter() - start, 2.0)
+        self.assertTrue(plans)
+        covered = set()
+        for game in (db.get_game(game_id=game_id) for game_id in plans[0].game_ids):
+            covered |= {
+                goal
+                for goal in goals
+                for function, weight in game.functions
+                if function.id == goal.tag_id and weight >= goal.weight
+            }
+        self.assertEqual(covered | set(plans[0].uncovered), set(goals))
+
+
+if __name__ == "__main__":
+    unittest.main()
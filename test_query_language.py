@@ -0,0 +1,164 @@
+import time
+import unittest
+
+import query_language
+from benchmarks.catalog import generate_catalog
+from bitmap_index import GameIndex
+from database import Database, Projection
+from models import CognitiveCategory, CognitiveFunction, Game, Material
+from query_language import QueryError, compile_query, quote, tokenize
+
+
+class TestTokenize(unittest.TestCase):
+    def test_shape(self):
+        shape, values = tokenize('func:"working memory">=7 Cat:attention -mat:VISUAL NOT spot-it OR (a AND "or")')
+        self.assertEqual(
+            shape,
+            (
+                "function:", "value", ">=", "value", "category:", "value", "-", "material:", "value",
+                "-", "value", "OR", "(", "value", "AND", "value", ")",
+            ),
+        )  # fmt: skip
+        self.assertEqual(values, ["working memory", "7", "attention", "VISUAL", "spot-it", "a", "or"])
+
+    def test_escaped_quotes(self):
+        self.assertEqual(tokenize(r'"say \"hi\"" "a\\"'), (("value", "value"), ['say "hi"', "a\\"]))
+        for value in ('6" ruler', "back\\slash", 'ends with \\"', '"'):
+            with self.subTest(value=value):
+                self.assertEqual(tokenize(f"cat:{quote(value)} x"), (("category:", "value", "value"), [value, "x"]))
+
+    def test_unterminated_quote(self):
+        self.assertEqual(tokenize('title:"memory car'), (("title:", "value"), ["memory car"]))
+
+    def test_same_shape_same_plan(self):
+        first = compile_query('func:"working memory">=7 dobble')
+        second = compile_query("function:Attention   >=  3 uno")
+        self.assertEqual(first[0], second[0])
+        self.assertEqual(second[1], ["Attention", 3, "%uno%"])
+        self.assertNotEqual(first[0], compile_query("func:Attention<=3 uno")[0])
+
+    def test_errors(self):
+        for text in ("func:", "func:attention>=", "func:attention>=high", "(dobble", "dobble)", "mat:SMELL", "a OR"):
+            with self.subTest(text=text), self.assertRaises(QueryError):
+                compile_query(text)
+        self.assertEqual(compile_query("   "), ("1", []))
+
+
+class TestQueries(unittest.TestCase):
+    def setUp(self):
+        self.db = Database(file=":memory:")
+        self.db.setup()
+        for name in ("Attention", "Working memory", "Updating"):
+            self.db.add_cognitive_function(CognitiveFunction(name=name))
+        self.db.add_cognitive_category(CognitiveCategory(name="Memory"))
+        attention, working, updating = self.db.get_all_cognitive_functions()
+        (memory,) = self.db.get_all_cognitive_categories()
+        self.db.set_cognitive_function_parent(updating.id, working.id)
+        for title, description, materials, categories, functions in (
+            ("Dobble", "Spot the 100% match", [Material.VISUAL], [], [(attention, 8)]),
+            ("Mémo cards", "Pairs", [Material.VISUAL, Material.VERBAL], [(memory, 6)], [(working, 7)]),
+            ("N_back", None, [Material.AUDITORY], [(memory, 3)], [(updating, 9), (attention, 2)]),
+        ):
+            game = Game(title=title, materials=materials, categories=categories, functions=functions)
+            if description:
+                game.description = description
+            self.db.add_game(game)
+
+    def tearDown(self):
+        self.db.close()
+
+    def titles(self, text: str, **filters) -> list[str]:
+        games = self.db.get_games_with_filters(search_query=text, projection=Projection.TITLES, **filters)
+        return sorted(title for _, title in games)
+
+    def test_terms(self):
+        self.assertEqual(self.titles('func:"WORKING MEMORY">=7'), ["Mémo cards"])
+        self.assertEqual(self.titles("func:attention"), ["Dobble", "N_back"])
+        self.assertEqual(self.titles("func:attention>2"), ["Dobble"])
+        self.assertEqual(self.titles("func:attention=2"), ["N_back"])
+        self.assertEqual(self.titles("cat:memory<5"), ["N_back"])
+        self.assertEqual(self.titles("mat:visual -mat:VERBAL"), ["Dobble"])
+        self.assertEqual(self.titles("func:unknown"), [])
+
+    def test_text(self):
+        # Titles are searched case and accents ignored, wildcards are literal
+        self.assertEqual(self.titles("memo"), ["Mémo cards"])
+        self.assertEqual(self.titles("n_b"), ["N_back"])
+        self.assertEqual(self.titles("_"), ["N_back"])
+        self.assertEqual(self.titles('"mo ca"'), ["Mémo cards"])
+        self.assertEqual(self.titles("desc:100%"), ["Dobble"])
+        self.assertEqual(self.titles("-desc:pairs"), ["Dobble", "N_back"])
+
+    def test_operators(self):
+        self.assertEqual(self.titles("dobble OR mat:auditory"), ["Dobble", "N_back"])
+        # AND binds tighter than OR, NOT tighter than AND
+        self.assertEqual(self.titles("dobble OR mat:visual cat:memory"), ["Dobble", "Mémo cards"])
+        self.assertEqual(self.titles("(dobble OR mat:visual) -cat:memory"), ["Dobble"])
+        self.assertEqual(self.titles("NOT (dobble OR memo)"), ["N_back"])
+        self.assertEqual(self.titles("mat:visual AND cards"), ["Mémo cards"])
+
+    def test_quoted_tag_names(self):
+        self.db.add_cognitive_category(CognitiveCategory(name='The "odd" one'))
+        odd = self.db.get_cognitive_category(category_name='The "odd" one')
+        game = self.db.get_game(game_title="Dobble")
+        game.categories = [(odd, 5)]
+        self.db.update_game(game)
+        self.assertEqual(self.titles(f"cat:{quote(odd.name)}"), ["Dobble"])
+
+    def test_combined_with_filters(self):
+        self.assertEqual(self.titles("func:attention", materials=[Material.AUDITORY]), ["N_back"])
+        self.assertEqual(self.titles("func:working"), [])
+        self.assertEqual(self.titles('func:"working memory"', include_descendants=True), ["Mémo cards", "N_back"])
+        facets = self.db.get_facets(search_query="mat:visual")
+        self.assertEqual((facets["games"], facets["materials"]["VERBAL"]), (2, 1))
+
+
+class TestCatalogQueries(unittest.TestCase):
+    def setUp(self):
+        self.db = Database(file=":memory:")
+        self.db.setup()
+        generate_catalog(self.db, 500)
+        self.games = self.db.get_games_with_filters()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_matches_a_naive_filter(self):
+        def weight(game, name):
+            return max((weight for function, weight in game.functions if function.name == name), default=None)
+
+        queries = {
+            'func:"function 1">=7 mat:VISUAL -mat:VERBAL': lambda game: (weight(game, "Function 1") or 0) >= 7
+            and Material.VISUAL in game.materials
+            and Material.VERBAL not in game.materials,
+            'maze OR func:"function 3"<3': lambda game: "maze" in game.title.lower()
+            or (weight(game, "Function 3") is not None and weight(game, "Function 3") < 3),
+            "-(tower cards)": lambda game: not ("tower" in game.title.lower() and "cards" in game.title.lower()),
+        }
+        for text, predicate in queries.items():
+            with self.subTest(text=text):
+                expected = sorted(game.id for game in self.games if predicate(game))
+                game_ids = self.db.get_games_with_filters(search_query=text, projection=Projection.IDS)
+                self.assertEqual(sorted(game_ids), expected)
+
+    def test_bitmap_index(self):
+        index = GameIndex(self.db)
+        filters = {"search_query": 'func:"function 2">=5 OR memory', "materials": [Material.TACTILE]}
+        expected = self.db.get_games_with_filters(**filters, projection=Projection.IDS)
+        self.assertEqual(index.get_games_with_filters(**filters, projection=Projection.IDS), sorted(expected))
+        self.assertEqual(index.get_facets(**filters), self.db.get_facets(**filters))
+        index.close()
+
+    def test_compiles_fast(self):
+        text = 'func:"function 1">=7 cat:"category 2" mat:VISUAL -mat:VERBAL (maze OR tower) desc:garden'
+        start = time.perf_counter()
+        for _ in range(100):
+            query_language._plan.cache_clear()
+            compile_query(text)
+        self.assertLess((time.perf_counter() - start) / 100, 0.001)
+        compile_query(text)
+        self.assertEqual(query_language.plan_cache_info().hits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import saved_searches
+from benchmarks.catalog import generate_catalog
+from database import Database, NotFoundError, Projection
+from models import CognitiveFunction, Game, Material
+from query_language import QueryError
+
+
+class TestSavedSearches(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.directory.name, "catalog.db")
+        self.db = Database(file=self.db_file)
+        self.db.setup()
+        for name in ("Attention", "Executive functions", "Inhibition"):
+            self.db.add_cognitive_function(CognitiveFunction(name=name))
+        self.attention, self.executive, self.inhibition = self.db.get_all_cognitive_functions()
+        self.db.set_cognitive_function_parent(self.inhibition.id, self.executive.id)
+        self.add("Dobble", [Material.TACTILE], [(self.attention, 8)])
+        self.add("Uno", [Material.VISUAL], [(self.attention, 8)])
+        self.add("Jenga", [Material.TACTILE], [(self.attention, 3), (self.inhibition, 7)])
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def add(self, title: str, materials: list[Material], functions: list) -> int:
+        self.db.add_game(Game(title=title, materials=materials, categories=[], functions=functions))
+        return self.db.get_game(game_title=title).id
+
+    def titles(self, name: str) -> list[str]:
+        return [title for _, title in saved_searches.games(self.db, name, Projection.TITLES)]
+
+    def stored(self, name: str) -> list[int]:
+        search = saved_searches.get(self.db, name)
+        cursor = self.db.con.execute("SELECT game_id FROM saved_search_games WHERE search_id = ?", (search.id,))
+        return sorted(row[0] for row in cursor)
+
+    def test_save_and_open(self):
+        search = saved_searches.save(self.db, "Tactile attention", "mat:tactile func:attention>=6")
+        self.assertEqual((search.games, search.seq), (1, self.db.last_change_seq()))
+        self.assertEqual(self.titles("Tactile attention"), ["Dobble"])
+
+        saved_searches.save(self.db, "Tactile attention", "mat:tactile")
+        self.assertEqual(self.titles("Tactile attention"), ["Dobble", "Jenga"])
+        self.assertEqual([search.name for search in saved_searches.get_all(self.db)], ["Tactile attention"])
+        saved_searches.delete(self.db, "Tactile attention")
+        with self.assertRaises(NotFoundError):
+            saved_searches.games(self.db, "Tactile attention")
+        with self.assertRaises(QueryError):
+            saved_searches.save(self.db, "Broken", "func:")
+
+    def test_follows_game_changes(self):
+        saved_searches.save(self.db, "Strong attention", "func:attention>=6")
+        saved_searches.save(self.db, "Visual", "mat:visual")
+        game = self.db.get_game(game_title="Dobble")
+        game.functions = [(self.attention, 2)]
+        self.db.update_game(game)
+        self.db.delete_game(self.db.get_game(game_title="Uno").id)
+        new_id = self.add("Spot", [Material.VISUAL], [(self.attention, 9)])
+
+        with mock.patch("saved_searches._changed_games", wraps=saved_searches._changed_games) as changed:
+            self.assertEqual(saved_searches.refresh(self.db), {"Strong attention": 3, "Visual": 3})
+            # Both searches were saved at the same seq: the changed games are only looked up once
+            self.assertEqual(changed.call_count, 1)
+        self.assertEqual(self.stored("Strong attention"), [new_id])
+        self.assertEqual(self.titles("Visual"), ["Spot"])
+        self.assertEqual(saved_searches.refresh(self.db), {})
+
+    def test_follows_taxonomy_changes(self):
+        saved_searches.save(self.db, "Executive", 'func:"executive functions"', include_descendants=True)
+        saved_searches.save(self.db, "Focus", "func:focus")
+        self.assertEqual(self.titles("Executive"), ["Jenga"])
+        self.db.set_cognitive_function_parent(self.attention.id, self.executive.id)
+        self.assertEqual(self.titles("Executive"), ["Dobble", "Uno", "Jenga"])
+
+        self.db.update_cognitive_function(CognitiveFunction(id=self.attention.id, name="Focus"))
+        self.assertEqual(saved_searches.refresh(self.db, ["Focus"]), {"Focus": 3})
+        self.assertEqual(self.titles("Focus"), ["Dobble", "Uno", "Jenga"])
+
+        self.db.delete_cognitive_function(self.executive.id)
+        self.assertEqual(self.titles("Executive"), [])
+
+    def test_read_only_connection(self):
+        saved_searches.save(self.db, "Tactile", "mat:tactile")
+        reader = Database(file=self.db_file, read_only=True)
+        self.addCleanup(reader.close)
+        self.assertEqual(saved_searches.games(reader, "Tactile", Projection.IDS), self.stored("Tactile"))
+        new_id = self.add("Kapla", [Material.TACTILE], [])
+        with mock.patch("saved_searches.refresh") as refresh:
+            self.assertEqual(saved_searches.games(reader, "Tactile", Projection.IDS, limit=1, offset=2), [new_id])
+            refresh.assert_not_called()
+
+
+class TestCatalogSavedSearches(unittest.TestCase):
+    def test_matches_a_new_search(self):
+        db = Database(file=":memory:")
+        db.setup()
+        self.addCleanup(db.close)
+        generate_catalog(db, 300)
+        query = 'func:"function 1">=6 -mat:VERBAL OR cat:"category 3"<4'
+        saved_searches.save(db, "Saved", query)
+        for game_id in range(1, 300, 7):
+            game = db.get_game(game_id=game_id)
+            game.functions = game.functions[::-1][:2]
+            game.materials = [Material.VERBAL] if game_id % 2 else [Material.AUDITORY]
+            db.update_game(game)
+        db.delete_game(5)
+        expected = db.get_games_with_filters(search_query=query, projection=Projection.IDS, limit=-1)
+        self.assertEqual(saved_searches.games(db, "Saved", Projection.IDS), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
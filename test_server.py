@@ -0,0 +1,158 @@
+import unittest
+import gzip
+import http.client
+import json
+import os
+import tempfile
+import threading
+
+import server
+from database import Database
+from models import CognitiveCategory, CognitiveFunction, Game, Material
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.directory.name, "catalog.db")
+        self.db = Database(file=self.db_file)
+        self.db.setup()
+        self.db.add_cognitive_category(CognitiveCategory(name="Memory"))
+        self.db.add_cognitive_function(CognitiveFunction(name="Attention"))
+        self.memory = self.db.get_cognitive_category(category_name="Memory")
+        attention = self.db.get_cognitive_function(function_name="Attention")
+        self.db.add_game(
+            Game(
+                title="Dobble",
+                description="Spot it",
+                materials=[Material.VISUAL],
+                categories=[(self.memory, 4)],
+                functions=[(attention, 8)],
+            )
+        )
+        self.db.add_game(Game(title="Uno", materials=[Material.VERBAL], categories=[], functions=[]))
+
+        self.server = server.make_server(self.db_file, port=0, workers=2)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.db.con.close()
+        self.directory.cleanup()
+
+    def request(self, path: str, headers: dict = None) -> http.client.HTTPResponse:
+        connection = http.client.HTTPConnection("127.0.0.1", self.server.server_address[1], timeout=10)
+        self.addCleanup(connection.close)
+        connection.request("GET", path, headers=headers or {})
+        response = connection.getresponse()
+        response.body = response.read()
+        return response
+
+    def get_json(self, path: str, status: int = 200):
+        response = self.request(path)
+        self.assertEqual(response.status, status)
+        return json.loads(response.body)
+
+    def test_search(self):
+        data = self.get_json("/api/games")
+        self.assertEqual([game["title"] for game in data["games"]], ["Dobble", "Uno"])
+        self.assertNotIn("description", data["games"][0])
+
+        data = self.get_json(f"/api/games?category={self.memory.id}&fields=full")
+        self.assertEqual([game["title"] for game in data["games"]], ["Dobble"])
+        self.assertEqual(data["games"][0]["categories"], [{"name": "Memory", "weight": 4}])
+
+        data = self.get_json("/api/games?material=VERBAL&limit=1&offset=0")
+        self.assertEqual([game["title"] for game in data["games"]], ["Uno"])
+
+        data = self.get_json("/api/games?q=func%3Aattention%3E%3D8%20-mat%3AVERBAL")
+        self.assertEqual([game["title"] for game in data["games"]], ["Dobble"])
+
+    def test_detail(self):
+        data = self.get_json("/api/games/1")
+        self.assertEqual(data["title"], "Dobble")
+        self.assertEqual(data["description"], "Spot it")
+        self.get_json("/api/games/99", status=404)
+        self.get_json("/api/games/1/thumbnail", status=404)
+        self.get_json("/api/unknown", status=404)
+
+    def test_unreadable_thumbnail(self):
+        with open(os.path.join(self.directory.name, "broken.png"), "wb") as f:
+            f.write(b"not an image")
+        self.db.add_game(Game(title="Broken", image="broken.png", categories=[], functions=[]))
+        game_id = self.db.get_game(game_title="Broken").id
+        with self.assertLogs("server", "ERROR"):
+            error = self.get_json(f"/api/games/{game_id}/thumbnail", status=500)
+        self.assertEqual(error, {"error": "unreadable image"})
+
+    def test_similar(self):
+        data = self.get_json("/api/games/2/similar?limit=5")
+        self.assertEqual([game["title"] for game in data["games"]], ["Dobble"])
+        self.get_json("/api/games/99/similar", status=404)
+
+    def test_bad_requests(self):
+        self.get_json("/api/games?category=memory", status=400)
+        self.get_json("/api/games?material=SMELL", status=400)
+        self.get_json("/api/games?fields=everything", status=400)
+        self.get_json("/api/games?q=func%3A", status=400)
+
+    def test_facets_and_taxonomy(self):
+        data = self.get_json("/api/facets?material=VISUAL")
+        self.assertEqual(data["games"], 1)
+        self.assertEqual(data["categories"], [{"id": self.memory.id, "name": "Memory", "count": 1}])
+        self.assertIn({"name": "VERBAL", "count": 0}, data["materials"])
+
+        data = self.get_json("/api/taxonomy")
+        self.assertEqual(data["categories"], [{"id": self.memory.id, "name": "Memory", "parent_id": None}])
+
+    def test_collections(self):
+        import saved_searches
+
+        saved_searches.save(self.db, "Visual games", "mat:visual")
+        data = self.get_json("/api/collections")
+        self.assertEqual(data["collections"][0]["games"], 1)
+        data = self.get_json("/api/collections/Visual%20games?fields=titles")
+        self.assertEqual(data["games"], [{"id": 1, "title": "Dobble"}])
+        self.get_json("/api/collections/unknown", status=404)
+
+    def test_etag(self):
+        response = self.request("/api/games")
+        etag = response.getheader("ETag")
+        self.assertTrue(etag)
+        response = self.request("/api/games", {"If-None-Match": etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(response.body, b"")
+
+    def test_gzip(self):
+        self.db.add_games(Game(title=f"Game {i}", categories=[], functions=[]) for i in range(50))
+        response = self.request("/api/games", {"Accept-Encoding": "gzip"})
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+        self.assertEqual(len(json.loads(gzip.decompress(response.body))["games"]), 50)
+
+        response = self.request("/api/games")
+        self.assertIsNone(response.getheader("Content-Encoding"))
+
+    def test_gzip_has_its_own_etag(self):
+        self.db.add_games(Game(title=f"Game {i}", categories=[], functions=[]) for i in range(50))
+        gzipped = self.request("/api/games", {"Accept-Encoding": "gzip"})
+        identity = self.request("/api/games")
+        self.assertNotEqual(gzipped.getheader("ETag"), identity.getheader("ETag"))
+        self.assertEqual(gzipped.getheader("Vary"), "Accept-Encoding")
+
+        # The validator of one representation does not match the other one
+        response = self.request("/api/games", {"If-None-Match": gzipped.getheader("ETag")})
+        self.assertEqual((response.status, response.getheader("Content-Encoding")), (200, None))
+        response = self.request("/api/games", {"Accept-Encoding": "gzip", "If-None-Match": gzipped.getheader("ETag")})
+        self.assertEqual((response.status, response.getheader("Vary")), (304, "Accept-Encoding"))
+
+    def test_cache_invalidated_by_writes(self):
+        before = self.request("/api/games")
+        self.db.add_game(Game(title="Set", categories=[], functions=[]))
+        after = self.request("/api/games")
+        self.assertNotEqual(before.getheader("ETag"), after.getheader("ETag"))
+        self.assertIn("Set", [game["title"] for game in json.loads(after.body)["games"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
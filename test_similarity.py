@@ -0,0 +1,117 @@
+import os
+import unittest
+
+from database import Database, NotFoundError, Projection
+from models import CognitiveCategory, CognitiveFunction, Game, Material
+from similarity import SimilarGames, material_mask
+
+
+class TestSimilarGames(unittest.TestCase):
+    def setUp(self):
+        self.db_file = "test_similarity.db"
+        self.db = Database(file=self.db_file)
+        self.db.setup()
+        for name in ("Memory", "Language"):
+            self.db.add_cognitive_category(CognitiveCategory(name=name))
+        for name in ("Attention", "Planning"):
+            self.db.add_cognitive_function(CognitiveFunction(name=name))
+        self.memory = self.db.get_cognitive_category(category_name="Memory")
+        self.language = self.db.get_cognitive_category(category_name="Language")
+        self.attention = self.db.get_cognitive_function(function_name="Attention")
+        self.planning = self.db.get_cognitive_function(function_name="Planning")
+
+        self._add("Memo", [(self.memory, 5)], [(self.attention, 3)], [Material.VISUAL])
+        self._add("Memo junior", [(self.memory, 4)], [(self.attention, 3)], [Material.VISUAL])
+        self._add("Words", [(self.language, 5)], [], [Material.VERBAL])
+        self._add("Plan", [], [(self.planning, 5)], [Material.TACTILE])
+
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.db_file):
+            os.remove(self.db_file)
+
+    def _add(self, title, categories, functions, materials):
+        self.db.add_game(Game(title=title, categories=categories, functions=functions, materials=materials))
+        return self.db.get_game(game_title=title).id
+
+    def _id(self, title):
+        return self.db.get_game(game_title=title).id
+
+    def _titles(self, engine, title, limit=10):
+        titles = dict(self.db.get_all_games(projection=Projection.TITLES))
+        return [titles[game_id] for game_id, _ in engine.similar(self._id(title), limit)]
+
+    def test_material_mask(self):
+        self.assertEqual(material_mask([]), 0)
+        self.assertEqual(material_mask(["VISUAL", "AUDITORY"]), 0b1001)
+
+    def test_most_similar_first(self):
+        engine = SimilarGames(self.db)
+        results = engine.similar(self._id("Memo"), limit=2)
+        self.assertEqual(results[0][0], self._id("Memo junior"))
+        self.assertGreater(results[0][1], 0.99)
+        self.assertEqual(len(results), 2)
+        self.assertNotIn(self._id("Memo"), [game_id for game_id, _ in engine.similar(self._id("Memo"))])
+
+    def test_limit_larger_than_catalog(self):
+        engine = SimilarGames(self.db)
+        self.assertEqual(len(engine.similar(self._id("Plan"), limit=100)), 3)
+
+    def test_unknown_game(self):
+        with self.assertRaises(NotFoundError):
+            SimilarGames(self.db).similar(12345)
+
+    def test_follows_writes(self):
+        engine = SimilarGames(self.db)
+        capacity = engine.weights.shape[0]
+        words = self.db.get_game(game_title="Words")
+        self.db.update_game(
+            Game(
+                id=words.id,
+                title="Words",
+                categories=[(self.memory, 5)],
+                functions=[(self.attention, 3)],
+                materials=[Material.VISUAL],
+            )
+        )
+        self.assertEqual(engine.similar(self._id("Memo"), limit=1)[0][0], words.id)
+
+        row = engine.rows[words.id]
+        self.db.delete_game(words.id)
+        self.assertNotIn(words.id, engine.rows)
+        new_id = self._add("Recall", [(self.memory, 5)], [(self.attention, 3)], [Material.VISUAL])
+        self.assertEqual(engine.rows[new_id], row)  # The row of the deleted game is reused
+        self.assertEqual(engine.similar(self._id("Memo"), limit=1)[0][0], new_id)
+        self.assertEqual(engine.weights.shape[0], capacity)
+
+    def test_follows_other_connections(self):
+        engine = SimilarGames(self.db)
+        other = Database(file=self.db_file)
+        other.add_cognitive_category(CognitiveCategory(name="Spatial"))
+        spatial = other.get_cognitive_category(category_name="Spatial")
+        other.add_game(Game(title="Maze", categories=[(spatial, 5)], functions=[(self.planning, 5)], materials=[]))
+        other.close()
+        self.assertEqual(self._titles(engine, "Plan", 1), ["Maze"])
+        self.assertIn(("cognitive_categories", spatial.id), engine.columns)
+
+    def test_incremental_matches_rebuild(self):
+        engine = SimilarGames(self.db)
+        for i in range(100):
+            self._add(f"Game {i}", [(self.memory, i % 5 + 1)], [(self.planning, i % 3 + 1)], [Material.AUDITORY])
+        rebuilt = SimilarGames(self.db, follow=False)
+        for title in ("Memo", "Plan", "Game 42"):
+            # Many games tie: compare the scores
+            scores = [score for _, score in engine.similar(self._id(title))]
+            expected = [score for _, score in rebuilt.similar(self._id(title))]
+            for score, expected_score in zip(scores, expected, strict=True):
+                self.assertAlmostEqual(score, expected_score, places=5)
+
+    def test_close_stops_following(self):
+        engine = SimilarGames(self.db)
+        engine.close()
+        self._add("Later", [(self.memory, 1)], [], [])
+        self.assertEqual(len(engine.rows), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+import unittest
+import json
+import os
+import tempfile
+import zipfile
+
+import sync
+from database import Database, Projection
+from models import CognitiveCategory, CognitiveFunction, Game, Material
+
+
+class TestSync(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.a = self.catalog("a")
+        self.b = self.catalog("b")
+        # Not in A: the IDs of the tags of A are different in B
+        self.b.add_cognitive_category(CognitiveCategory(name="Language"))
+
+        self.a.add_cognitive_category(CognitiveCategory(name="Memory"))
+        self.a.add_cognitive_function(CognitiveFunction(name="Attention"))
+        memory = self.a.get_cognitive_category(category_name="Memory")
+        attention = self.a.get_cognitive_function(function_name="Attention")
+        with open(os.path.join(self.directory.name, "a", "dobble.png"), "wb") as f:
+            f.write(b"image")
+        self.a.add_game(
+            Game(
+                title="Dobble",
+                image="dobble.png",
+                materials=[Material.VISUAL],
+                categories=[(memory, 4)],
+                functions=[(attention, 8)],
+            )
+        )
+        self.a.add_game(Game(title="Uno", categories=[], functions=[]))
+        self.a.add_game(Game(title="Set", categories=[], functions=[]))
+
+    def tearDown(self):
+        self.a.con.close()
+        self.b.con.close()
+        self.directory.cleanup()
+
+    def catalog(self, name: str) -> Database:
+        os.makedirs(os.path.join(self.directory.name, name))
+        db = Database(file=os.path.join(self.directory.name, name, "catalog.db"))
+        db.setup()
+        return db
+
+    def transfer(self, source: Database, target: Database, since: int = 0) -> tuple[dict, dict]:
+        path = os.path.join(self.directory.name, "bundle.zip")
+        summary = sync.export_bundle(source, path, since)
+        return summary, sync.import_bundle(target, path)
+
+    def titles(self, db: Database) -> list[str]:
+        return sorted(title for _, title in db.get_all_games(projection=Projection.TITLES))
+
+    def test_full_bundle(self):
+        summary, stats = self.transfer(self.a, self.b)
+        self.assertEqual((summary["games"], summary["images"]), (3, 1))
+        self.assertEqual(stats["added"], 3)
+        self.assertEqual(self.titles(self.b), ["Dobble", "Set", "Uno"])
+
+        dobble = self.b.get_game(game_title="Dobble")
+        self.assertEqual([(category.name, weight) for category, weight in dobble.categories], [("Memory", 4)])
+        self.assertEqual(dobble.categories[0][0].id, self.b.get_cognitive_category(category_name="Memory").id)
+        self.assertEqual([(function.name, weight) for function, weight in dobble.functions], [("Attention", 8)])
+        with open(os.path.join(self.directory.name, "b", dobble.image), "rb") as f:
+            self.assertEqual(f.read(), b"image")
+
+        # Merging again changes nothing
+        self.assertEqual(self.transfer(self.a, self.b)[1]["unchanged"], 3)
+
+    def test_delta_only_holds_the_changes(self):
+        until = self.transfer(self.a, self.b)[0]["until"]
+        uno = self.a.get_game(game_title="Uno")
+        self.a.update_game(Game(id=uno.id, title="Uno", description="Cards", categories=[], functions=[]))
+        set_ = self.a.get_game(game_title="Set")
+        self.a.update_game(Game(id=set_.id, title="Set!", categories=[], functions=[]))
+        self.a.delete_game(self.a.get_game(game_title="Dobble").id)
+
+        summary, stats = self.transfer(self.a, self.b, until)
+        self.assertEqual((summary["games"], summary["tombstones"], summary["images"]), (2, 2, 0))
+        self.assertEqual((stats["added"], stats["updated"], stats["deleted"]), (1, 1, 2))
+        self.assertEqual(self.titles(self.b), ["Set!", "Uno"])
+        self.assertEqual(self.b.get_game(game_title="Uno").description, "Cards")
+
+        self.assertEqual(self.transfer(self.a, self.b, summary["until"])[0]["games"], 0)
+
+    def test_latest_change_wins(self):
+        self.transfer(self.a, self.b)
+        for db, description, updated_at in ((self.a, "old", "2030-01-01"), (self.b, "new", "2030-01-02")):
+            db.con.execute(
+                "UPDATE games SET description = ?, updated_at = ? WHERE title = 'Uno'", (description, updated_at)
+            )
+            db.con.commit()
+
+        self.transfer(self.a, self.b)
+        self.transfer(self.b, self.a)
+        self.assertEqual(self.a.get_game(game_title="Uno").description, "new")
+        self.assertEqual(self.b.get_game(game_title="Uno").description, "new")
+
+    def test_ties_converge(self):
+        self.transfer(self.a, self.b)
+        for db, description in ((self.a, "from a"), (self.b, "from b")):
+            db.con.execute(
+                "UPDATE games SET description = ?, updated_at = '2030-01-01' WHERE title = 'Uno'", (description,)
+            )
+            db.con.commit()
+
+        self.transfer(self.a, self.b)
+        self.transfer(self.b, self.a)
+        self.assertEqual(self.a.get_game(game_title="Uno").description, self.b.get_game(game_title="Uno").description)
+
+    def test_deletion_and_newer_edit(self):
+        self.transfer(self.a, self.b)
+        self.a.delete_game(self.a.get_game(game_title="Uno").id)
+        self.a.delete_game(self.a.get_game(game_title="Set").id)
+        self.b.con.execute("UPDATE games SET description = 'kept', updated_at = '2999-01-01' WHERE title = 'Uno'")
+        self.b.con.commit()
+
+        stats = self.transfer(self.a, self.b)[1]
+        self.assertEqual(stats["deleted"], 1)
+        self.assertEqual(self.titles(self.b), ["Dobble", "Uno"])
+        # The newer edit brings its game back, the other one stays deleted
+        self.transfer(self.b, self.a)
+        self.assertEqual(self.titles(self.a), ["Dobble", "Uno"])
+
+    def test_deleted_tag(self):
+        self.transfer(self.a, self.b)
+        until = self.a.last_change_seq()
+        self.a.delete_cognitive_category(self.a.get_cognitive_category(category_name="Memory").id)
+
+        self.transfer(self.a, self.b, until)
+        self.assertEqual([category.name for category in self.b.get_all_cognitive_categories()], ["Language"])
+        self.assertEqual(self.b.get_game(game_title="Dobble").categories, [])
+
+    def test_deleting_a_tag_touches_its_games(self):
+        self.transfer(self.a, self.b)
+        self.a.con.execute("UPDATE games SET updated_at = '2000-01-01'")
+        self.a.con.commit()
+        until = self.a.last_change_seq()
+        attention = self.a.get_cognitive_function(function_name="Attention")
+        self.a.delete_cognitive_function(attention.id)
+
+        # Newer than the copy of the peer, so that it takes the rewritten game
+        (updated_at,) = self.a.con.execute("SELECT updated_at FROM games WHERE title = 'Dobble'").fetchone()
+        self.assertGreater(updated_at, "2000-01-01")
+        summary, stats = self.transfer(self.a, self.b, until)
+        self.assertEqual((summary["games"], stats["updated"]), (1, 1))
+        self.assertEqual(self.b.get_game(game_title="Dobble").functions, [])
+
+    def test_merged_tombstones_are_relayed(self):
+        c = self.catalog("c")
+        self.addCleanup(c.close)
+        self.transfer(self.a, c)
+        until = self.transfer(self.b, c)[0]["until"]
+        self.a.delete_game(self.a.get_game(game_title="Uno").id)
+
+        # B never had Uno: it only keeps the tombstone, and relays it in its next delta bundle
+        self.transfer(self.a, self.b)
+        summary, stats = self.transfer(self.b, c, until)
+        self.assertEqual((summary["tombstones"], stats["deleted"]), (1, 1))
+        self.assertEqual(self.titles(c), ["Dobble", "Set"])
+
+        # Known by every peer now: importing it again does not relay it further
+        until = self.b.last_change_seq()
+        self.transfer(c, self.b)
+        self.assertEqual(self.b.last_change_seq(), until)
+
+    def test_export_to_peer(self):
+        path = os.path.join(self.directory.name, "bundle.zip")
+        self.assertEqual(sync.export_to_peer(self.a, path, "b")["games"], 3)
+        self.assertEqual(sync.export_to_peer(self.a, path, "b")["games"], 0)
+        self.a.add_game(Game(title="Halli Galli", categories=[], functions=[]))
+        self.assertEqual(sync.export_to_peer(self.a, path, "b")["games"], 1)
+        self.assertEqual(sync.export_to_peer(self.a, path, "c")["games"], 4)
+
+    def test_bundle_scales_with_the_delta(self):
+        self.a.add_games(Game(title=f"Game {i}", categories=[], functions=[]) for i in range(2000))
+        until = self.a.last_change_seq()
+        self.a.add_game(Game(title="New", categories=[], functions=[]))
+        path = os.path.join(self.directory.name, "bundle.zip")
+        self.assertEqual(sync.export_bundle(self.a, path, until)["games"], 1)
+        with zipfile.ZipFile(path) as bundle:
+            self.assertEqual([game["title"] for game in json.loads(bundle.read(sync.BUNDLE_FILE))["games"]], ["New"])
+
+    def test_invalid_bundle(self):
+        path = os.path.join(self.directory.name, "bundle.zip")
+        with open(path, "w") as f:
+            f.write("not a zip")
+        with self.assertRaises(sync.BundleError):
+            sync.import_bundle(self.b, path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+from bitmap_index import GameIndex
+from database import Database, NotFoundError, Projection
+from models import CognitiveCategory, CognitiveFunction, Game
+
+
+class TestTaxonomy(unittest.TestCase):
+    def setUp(self):
+        self.db = Database(file=":memory:")
+        self.db.setup()
+        for name in ("Executive functions", "Working memory", "Updating", "Inhibition", "Attention"):
+            self.db.add_cognitive_function(CognitiveFunction(name=name))
+        self.executive, self.working, self.updating, self.inhibition, self.attention = (
+            f.id for f in self.db.get_all_cognitive_functions()
+        )
+        self.db.set_cognitive_function_parent(self.working, self.executive)
+        self.db.set_cognitive_function_parent(self.updating, self.working)
+        self.db.set_cognitive_function_parent(self.inhibition, self.executive)
+        self.db.add_cognitive_category(CognitiveCategory(name="Memory"))
+        functions = {f.id: f for f in self.db.get_all_cognitive_functions()}
+        for title, function_id in (("N-back", self.updating), ("Stroop", self.inhibition), ("Spot", self.attention)):
+            self.db.add_game(Game(title=title, categories=[], functions=[(functions[function_id], 7)]))
+
+    def tearDown(self):
+        self.db.close()
+
+    def closure(self) -> set:
+        return set(self.db.con.execute("SELECT ancestor, descendant, depth FROM cognitive_functions_closure"))
+
+    def titles(self, function_ids: list[int], include_descendants: bool = True) -> list[str]:
+        games = self.db.get_games_with_filters(
+            cognitive_functions_ids=function_ids, include_descendants=include_descendants
+        )
+        return sorted(game.title for game in games)
+
+    def test_descendants(self):
+        self.assertEqual(
+            self.db.get_cognitive_function_descendants([self.executive]),
+            [self.executive, self.working, self.updating, self.inhibition],
+        )
+        self.assertIn((self.executive, self.updating, 2), self.closure())
+        self.assertEqual(self.db.get_cognitive_function_parents()[self.updating], self.working)
+
+    def test_filter_subtree(self):
+        self.assertEqual(self.titles([self.executive]), ["N-back", "Stroop"])
+        self.assertEqual(self.titles([self.working]), ["N-back"])
+        self.assertEqual(self.titles([self.executive], include_descendants=False), [])
+        facets = self.db.get_facets(cognitive_functions_ids=[self.executive], include_descendants=True)
+        self.assertEqual(facets["games"], 2)
+        self.assertEqual(facets["cognitive_functions"], {self.updating: 1, self.inhibition: 1})
+
+    def test_move_subtree(self):
+        untouched = {row for row in self.closure() if self.working not in row[:2] and self.updating not in row[:2]}
+        self.db.set_cognitive_function_parent(self.working, self.attention)
+        self.assertEqual(self.titles([self.attention]), ["N-back", "Spot"])
+        self.assertEqual(self.titles([self.executive]), ["Stroop"])
+        self.assertIn((self.attention, self.updating, 2), self.closure())
+        self.assertNotIn((self.executive, self.updating, 2), self.closure())
+        self.assertTrue(untouched <= self.closure())
+
+        self.db.set_cognitive_function_parent(self.working, None)
+        self.assertEqual(self.db.get_cognitive_function_descendants([self.attention]), [self.attention])
+        self.assertEqual(self.db.get_cognitive_function_descendants([self.working]), [self.working, self.updating])
+
+    def test_cycles_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.db.set_cognitive_function_parent(self.executive, self.updating)
+        with self.assertRaises(ValueError):
+            self.db.set_cognitive_function_parent(self.working, self.working)
+        with self.assertRaises(NotFoundError):
+            self.db.set_cognitive_function_parent(self.working, 1000)
+        self.assertEqual(self.titles([self.executive]), ["N-back", "Stroop"])
+
+    def test_delete_reparents_children(self):
+        self.db.delete_cognitive_function(self.working)
+        self.assertEqual(self.db.get_cognitive_function_parents()[self.updating], self.executive)
+        self.assertIn((self.executive, self.updating, 1), self.closure())
+        self.assertFalse(any(self.working in row[:2] for row in self.closure()))
+
+    def test_bitmap_index(self):
+        index = GameIndex(self.db)
+        filters = {"cognitive_functions_ids": [self.executive], "include_descendants": True}
+        expected = self.db.get_games_with_filters(**filters, projection=Projection.IDS)
+        self.assertEqual(index.get_games_with_filters(**filters, projection=Projection.IDS), sorted(expected))
+        self.assertEqual(index.get_facets(**filters), self.db.get_facets(**filters))
+        self.db.set_cognitive_function_parent(self.attention, self.executive)
+        self.assertEqual(index.count(**filters), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+import tracing
+
+
+class FakeWidget:
+    """Stands for a Tk widget: keeps the scheduled callbacks instead of running an event loop."""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, callback):
+        self.scheduled.append(callback)
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.tracer = tracing.enable()
+
+    def tearDown(self):
+        tracing.disable()
+
+    def test_disabled_tracing_is_a_no_op(self):
+        tracing.disable()
+        action = tracing.start_action("search")
+        with tracing.span("database"):
+            pass
+        action.end()
+        self.assertEqual(len(self.tracer.spans), 0)
+
+    def test_spans_are_correlated_to_their_action(self):
+        first = tracing.start_action("search")
+        with tracing.span("database"):
+            pass
+        with tracing.span("update games"):
+            with tracing.span("image decode"):
+                pass
+        first.end()
+        second = tracing.start_action("search")
+        with tracing.span("database"):
+            pass
+        second.end()
+        second.end()
+
+        actions = self.tracer.actions()
+        self.assertEqual([action["id"] for action in actions], [second.id, first.id])
+        self.assertEqual(
+            [name for name, _ in actions[1]["stages"]], ["database", "image decode", "update games"]
+        )
+        self.assertEqual([name for name, _ in actions[0]["stages"]], ["database"])
+
+    def test_spans_outside_actions(self):
+        with tracing.span("idle work"):
+            pass
+        self.assertIsNone(self.tracer.spans[0].action_id)
+        self.assertEqual(self.tracer.actions(), [])
+
+    def test_chrome_trace(self):
+        action = tracing.start_action("search")
+        with tracing.span("database"):
+            pass
+        action.end()
+
+        events = self.tracer.chrome_trace()["traceEvents"]
+        self.assertEqual([event["name"] for event in events], ["database", "search"])
+        for event in events:
+            self.assertEqual(event["ph"], "X")
+            self.assertEqual(event["args"], {"action": action.id})
+            self.assertGreaterEqual(event["dur"], 0)
+
+    def test_stall_monitor(self):
+        widget = FakeWidget()
+        monitor = tracing.StallMonitor(widget, self.tracer, threshold=0.1, interval=0.05)
+        monitor.start()
+
+        widget.scheduled.pop()()
+        self.assertEqual(self.tracer.stalls(), [])
+
+        monitor._expected -= 0.5  # The callback ran half a second late
+        widget.scheduled.pop()()
+        stalls = self.tracer.stalls()
+        self.assertEqual(len(stalls), 1)
+        self.assertGreater(stalls[0].duration, 0.4)
+        self.assertEqual(len(widget.scheduled), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
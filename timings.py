@@ -0,0 +1,48 @@
+import logging
+import os
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+REPORT_ENV_VAR = "NEUROPSY_STARTUP_REPORT"
+
+
+class StartupTimings:
+    """Records how long each startup phase takes, from process start to the first usable window."""
+
+    phases: list[tuple[str, float]]
+
+    def __init__(self, start: float = None):
+        self.start = start if start is not None else time.perf_counter()
+        self.phases = []
+        self._last = self.start
+
+    def mark(self, phase: str):
+        """Close the current phase under the given name and start the next one."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    @property
+    def total(self) -> float:
+        return self._last - self.start
+
+    def as_dict(self) -> dict[str, float]:
+        timings = {phase: duration for phase, duration in self.phases}
+        timings["total"] = self.total
+        return timings
+
+    def report(self) -> str:
+        lines = ["Startup timings:"]
+        for phase, duration in self.phases:
+            lines.append(f"  {phase:<24}{duration * 1000:9.1f} ms")
+        lines.append(f"  {'total':<24}{self.total * 1000:9.1f} ms")
+        return "\n".join(lines)
+
+    def emit(self):
+        """Log the report, and print it on stderr when NEUROPSY_STARTUP_REPORT is set."""
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(self.report())
+        if os.environ.get(REPORT_ENV_VAR):
+            print(self.report(), file=sys.stderr)
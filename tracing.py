@@ -0,0 +1,227 @@
+"""
+Lightweight tracing of the UI, from a Tk event to the rendered results.
+
+A user action (a search, for instance) is started with `start_action` and ended once Tk is idle again, that is once
+the results have been drawn. The stages in between are recorded with `span`, and are correlated to the action.
+
+    action = tracing.start_action("search")
+    with tracing.span("database"):
+        games = db.get_games_with_filters(...)
+    widget.after_idle(action.end)
+
+When tracing is disabled (the default), `start_action` and `span` return shared no-op objects.
+The application enables it when NEUROPSY_TRACE is set: to "1" to only use the in-app overlay (F12),
+or to a file path to also export the spans there as Chrome trace-event JSON on exit.
+"""
+
+import atexit
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+ENABLE_ENV_VAR = "NEUROPSY_TRACE"
+
+MAX_SPANS = 10_000
+
+STALL_SPAN = "event loop stall"
+
+
+class Span:
+    __slots__ = ("name", "start", "duration", "action_id", "action_name", "thread_id", "is_action")
+
+    def __init__(
+        self, name: str, start: float, duration: float, action: Optional["Action"], thread_id: int, is_action: bool
+    ):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.action_id = action.id if action else None
+        self.action_name = action.name if action else None
+        self.thread_id = thread_id
+        self.is_action = is_action
+
+
+class Action:
+    """A user action, to which the spans recorded on the same thread are attached until it ends."""
+
+    def __init__(self, tracer: "Tracer", action_id: int, name: str):
+        self.tracer = tracer
+        self.id = action_id
+        self.name = name
+        self.start = time.perf_counter()
+        self.ended = False
+
+    def end(self):
+        if self.ended:
+            return
+        self.ended = True
+        self.tracer.record(self.name, self.start, time.perf_counter() - self.start, self, is_action=True)
+        if getattr(self.tracer._local, "action", None) is self:
+            self.tracer._local.action = None
+
+
+class _SpanContext:
+    __slots__ = ("tracer", "name", "start")
+
+    def __init__(self, tracer: "Tracer", name: str):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        tracer = self.tracer
+        tracer.record(self.name, self.start, time.perf_counter() - self.start, getattr(tracer._local, "action", None))
+        return False
+
+
+class _NullSpan:
+    """Shared no-op span and action, used when tracing is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def end(self):
+        pass
+
+
+_NULL = _NullSpan()
+
+
+class Tracer:
+    """Collects the spans. Use `enable()` rather than creating one directly."""
+
+    spans: deque
+
+    def __init__(self, max_spans: int = MAX_SPANS):
+        self.spans = deque(maxlen=max_spans)
+        self.origin = time.perf_counter()
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+
+    def start_action(self, name: str) -> Action:
+        action = Action(self, next(self._ids), name)
+        self._local.action = action
+        return action
+
+    def span(self, name: str) -> _SpanContext:
+        return _SpanContext(self, name)
+
+    def record(
+        self, name: str, start: float, duration: float, action: Optional[Action] = None, is_action: bool = False
+    ):
+        self.spans.append(Span(name, start, duration, action, threading.get_ident(), is_action))
+
+    def actions(self, limit: int = 50) -> list[dict]:
+        """The last actions, most recent first, each with its total duration and the duration of its stages."""
+        by_id: dict[int, dict] = {}
+        for span in list(self.spans):
+            if span.action_id is None:
+                continue
+            action = by_id.setdefault(span.action_id, {"id": span.action_id, "name": span.action_name, "stages": []})
+            if span.is_action:
+                action["total"] = span.duration
+            else:
+                action["stages"].append((span.name, span.duration))
+        complete = [action for action in by_id.values() if "total" in action]
+        return sorted(complete, key=lambda action: action["id"], reverse=True)[:limit]
+
+    def stalls(self) -> list[Span]:
+        return [span for span in list(self.spans) if span.name == STALL_SPAN]
+
+    def chrome_trace(self) -> dict:
+        """The spans as Chrome trace-event JSON, to open in chrome://tracing or Perfetto."""
+        pid = os.getpid()
+        events = []
+        for span in list(self.spans):
+            event = {
+                "name": span.name,
+                "cat": span.action_name or "tk",
+                "ph": "X",
+                "ts": (span.start - self.origin) * 1e6,
+                "dur": span.duration * 1e6,
+                "pid": pid,
+                "tid": span.thread_id,
+            }
+            if span.action_id is not None:
+                event["args"] = {"action": span.action_id}
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+class StallMonitor:
+    """
+    Detects Tk event-loop stalls: a callback is scheduled every `interval` seconds,
+    and a stall span is recorded whenever it runs more than `threshold` seconds late.
+    """
+
+    def __init__(self, widget, tracer: Tracer, threshold: float = 0.1, interval: float = 0.05):
+        self.widget = widget
+        self.tracer = tracer
+        self.threshold = threshold
+        self.interval = interval
+        self._expected = None
+
+    def start(self):
+        self._schedule(time.perf_counter())
+
+    def _schedule(self, now: float):
+        self._expected = now + self.interval
+        self.widget.after(int(self.interval * 1000), self._tick)
+
+    def _tick(self):
+        now = time.perf_counter()
+        late = now - self._expected
+        if late > self.threshold:
+            self.tracer.record(STALL_SPAN, self._expected, late)
+        self._schedule(now)
+
+
+# The enabled tracer, or None.
+current: Optional[Tracer] = None
+
+
+def start_action(name: str):
+    """Start a user action on this thread. Call `end()` on the result once its results are rendered."""
+    return current.start_action(name) if current else _NULL
+
+
+def span(name: str):
+    """Context manager timing a stage of the current action."""
+    return current.span(name) if current else _NULL
+
+
+def enable(export_path: str = None) -> Tracer:
+    global current
+    current = Tracer()
+    if export_path:
+        atexit.register(current.export, export_path)
+    return current
+
+
+def disable() -> Optional[Tracer]:
+    global current
+    previous, current = current, None
+    return previous
+
+
+def enable_from_env() -> Optional[Tracer]:
+    value = os.environ.get(ENABLE_ENV_VAR)
+    if not value:
+        return None
+    return enable(None if value == "1" else value)
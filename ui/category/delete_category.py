@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from database import Database
+from models import Change
 
 
 class DeleteCategoryWindow(tk.Toplevel):
@@ -16,10 +17,21 @@ class DeleteCategoryWindow(tk.Toplevel):
         self.category_combobox = ttk.Combobox(self, textvariable=self.category_var)
         self.category_combobox.pack(pady=5)
         self._populate_categories()
+        self._unsubscribe = db.subscribe(self._on_changes)
+        self.bind("<Destroy>", self._on_destroy, add="+")
 
         # Delete Button
         ttk.Button(self, text="Delete", command=self._delete_from_db).pack(pady=10)
 
+    def _on_destroy(self, event):
+        # Also fired for the children, and when the window is closed without calling destroy()
+        if event.widget is self:
+            self._unsubscribe()
+
+    def _on_changes(self, changes: list[Change]):
+        if any(change.table == "cognitive_categories" for change in changes):
+            self._populate_categories()
+
     def _populate_categories(self):
         categories = self.db.get_all_cognitive_categories()
         self.category_combobox["values"] = [category.name for category in categories]
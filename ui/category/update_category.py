@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from database import Database
+from database import ConflictError, Database
+from models import Change, CognitiveCategory
 
 
 class UpdateCategoryWindow(tk.Toplevel):
@@ -15,7 +16,12 @@ class UpdateCategoryWindow(tk.Toplevel):
         self.category_var = tk.StringVar()
         self.category_combobox = ttk.Combobox(self, textvariable=self.category_var)
         self.category_combobox.pack(pady=5)
+        self.category_combobox.bind("<<ComboboxSelected>>", self._on_select)
+        # Category read when it was selected: the update is refused if someone else changed it since
+        self.category = None
         self._populate_categories()
+        self._unsubscribe = db.subscribe(self._on_changes)
+        self.bind("<Destroy>", self._on_destroy, add="+")
 
         # Name Entry
         ttk.Label(self, text="New Name").pack(pady=5)
@@ -25,10 +31,22 @@ class UpdateCategoryWindow(tk.Toplevel):
         # Update Button
         ttk.Button(self, text="Update", command=self._update_in_db).pack(pady=10)
 
+    def _on_destroy(self, event):
+        # Also fired for the children, and when the window is closed without calling destroy()
+        if event.widget is self:
+            self._unsubscribe()
+
+    def _on_changes(self, changes: list[Change]):
+        if any(change.table == "cognitive_categories" for change in changes):
+            self._populate_categories()
+
     def _populate_categories(self):
         categories = self.db.get_all_cognitive_categories()
         self.category_combobox["values"] = [category.name for category in categories]
 
+    def _on_select(self, event):
+        self.category = self.db.get_cognitive_category(category_name=self.category_var.get())
+
     def _update_in_db(self):
         selected_name = self.category_var.get()
         new_name = self.name_entry.get().strip()
@@ -37,12 +55,19 @@ class UpdateCategoryWindow(tk.Toplevel):
             messagebox.showerror("Error", "Both fields must be filled!")
             return
 
-        category = self.db.get_cognitive_category(category_name=selected_name)
-        category.name = new_name
+        selected = self.category
+        if selected is None or selected.name != selected_name:
+            # Typed instead of selected
+            selected = self.db.get_cognitive_category(category_name=selected_name)
+        category = CognitiveCategory(id=selected.id, name=new_name, version=selected.version)
 
         try:
             self.db.update_cognitive_category(category)
             messagebox.showinfo("Success", "Category updated successfully!")
             self.destroy()
+        except ConflictError:
+            messagebox.showerror("Conflict", "The category was modified by someone else in the meantime, try again.")
+            self.category = None
+            self._populate_categories()
         except Exception as e:
             messagebox.showerror("Error", str(e))
@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from database import Database
+from models import Change
 
 
 class DeleteFunctionWindow(tk.Toplevel):
@@ -16,10 +17,21 @@ class DeleteFunctionWindow(tk.Toplevel):
         self.function_combobox = ttk.Combobox(self, textvariable=self.function_var)
         self.function_combobox.pack(pady=5)
         self._populate_functions()
+        self._unsubscribe = db.subscribe(self._on_changes)
+        self.bind("<Destroy>", self._on_destroy, add="+")
 
         # Delete Button
         ttk.Button(self, text="Delete", command=self._delete_from_db).pack(pady=10)
 
+    def _on_destroy(self, event):
+        # Also fired for the children, and when the window is closed without calling destroy()
+        if event.widget is self:
+            self._unsubscribe()
+
+    def _on_changes(self, changes: list[Change]):
+        if any(change.table == "cognitive_functions" for change in changes):
+            self._populate_functions()
+
     def _populate_functions(self):
         functions = self.db.get_all_cognitive_functions()
         self.function_combobox["values"] = [function.name for function in functions]
@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from database import Database
+from database import ConflictError, Database
+from models import Change, CognitiveFunction
 
 
 class UpdateFunctionWindow(tk.Toplevel):
@@ -15,7 +16,12 @@ class UpdateFunctionWindow(tk.Toplevel):
         self.function_var = tk.StringVar()
         self.function_combobox = ttk.Combobox(self, textvariable=self.function_var)
         self.function_combobox.pack(pady=5)
+        self.function_combobox.bind("<<ComboboxSelected>>", self._on_select)
+        # Function read when it was selected: the update is refused if someone else changed it since
+        self.function = None
         self._populate_functions()
+        self._unsubscribe = db.subscribe(self._on_changes)
+        self.bind("<Destroy>", self._on_destroy, add="+")
 
         # Name Entry
         ttk.Label(self, text="New Name").pack(pady=5)
@@ -25,10 +31,22 @@ class UpdateFunctionWindow(tk.Toplevel):
         # Update Button
         ttk.Button(self, text="Update", command=self._update_in_db).pack(pady=10)
 
+    def _on_destroy(self, event):
+        # Also fired for the children, and when the window is closed without calling destroy()
+        if event.widget is self:
+            self._unsubscribe()
+
+    def _on_changes(self, changes: list[Change]):
+        if any(change.table == "cognitive_functions" for change in changes):
+            self._populate_functions()
+
     def _populate_functions(self):
         functions = self.db.get_all_cognitive_functions()
         self.function_combobox["values"] = [function.name for function in functions]
 
+    def _on_select(self, event):
+        self.function = self.db.get_cognitive_function(function_name=self.function_var.get())
+
     def _update_in_db(self):
         selected_name = self.function_var.get()
         new_name = self.name_entry.get().strip()
@@ -37,12 +55,19 @@ class UpdateFunctionWindow(tk.Toplevel):
             messagebox.showerror("Error", "Both fields must be filled!")
             return
 
-        function = self.db.get_cognitive_function(function_name=selected_name)
-        function.name = new_name
+        selected = self.function
+        if selected is None or selected.name != selected_name:
+            # Typed instead of selected
+            selected = self.db.get_cognitive_function(function_name=selected_name)
+        function = CognitiveFunction(id=selected.id, name=new_name, version=selected.version)
 
         try:
             self.db.update_cognitive_function(function)
             messagebox.showinfo("Success", "Function updated successfully!")
             self.destroy()
+        except ConflictError:
+            messagebox.showerror("Conflict", "The function was modified by someone else in the meantime, try again.")
+            self.function = None
+            self._populate_functions()
         except Exception as e:
             messagebox.showerror("Error", str(e))
@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 
 from database import Database
+from .game_picker import GamePicker
 
 
 class DeleteGameWindow(tk.Toplevel):
@@ -15,29 +16,21 @@ class DeleteGameWindow(tk.Toplevel):
 
         # Select Game
         ttk.Label(self, text="Select Game").pack()
-        self.game_var = tk.StringVar()
-        self.game_combobox = ttk.Combobox(self, textvariable=self.game_var)
-        self.game_combobox.pack()
-        self._populate_games()
+        self.game_picker = GamePicker(self, self.db)
+        self.game_picker.pack()
 
         # Delete Button
         ttk.Button(self, text="Delete", command=self._delete_from_db).pack(pady=10)
 
-    def _populate_games(self):
-        games = self.db.get_all_games()
-        self.game_combobox["values"] = [game.title for game in games]
-
     def _delete_from_db(self):
-        selected_game_title = self.game_var.get()
+        game_id = self.game_picker.selected_id
 
-        if not selected_game_title:
+        if game_id is None:
             messagebox.showerror("Error", "No game selected!")
             return
 
-        game = self.db.get_game(game_title=selected_game_title)
-
         try:
-            self.db.delete_game(game.id)
+            self.db.delete_game(game_id)
             messagebox.showinfo("Success", "Game deleted successfully!")
             self.destroy()
         except Exception as e:
@@ -1,7 +1,10 @@
+import io
 import tkinter as tk
 import tkinter.ttk as ttk
 import logging
-from PIL import Image, ImageTk
+
+import tracing
+from database import Database
 from models import Game
 
 logger = logging.getLogger(__name__)
@@ -10,7 +13,7 @@ NO_IMAGE_PATH = "assets/no_image.png"
 
 
 class GameDetailFrame(ttk.Frame):
-    def __init__(self, parent, game: Game):
+    def __init__(self, parent, game: Game, db: Database = None):
         super().__init__(parent)
         self.game = game
 
@@ -25,9 +28,13 @@ class GameDetailFrame(ttk.Frame):
         image_path = self.game.image if self.game.image else NO_IMAGE_PATH
 
         try:
-            image = Image.open(image_path)
-            image = image.resize((150, 150))
-            self.image_tk = ImageTk.PhotoImage(image)
+            with tracing.span("image decode"):
+                # Pillow is only imported once an image is first shown, to keep it out of the startup path
+                from PIL import ImageTk
+
+                image = self._open_image(db, image_path)
+                image = image.resize((150, 150))
+                self.image_tk = ImageTk.PhotoImage(image)
             self.image_label = ttk.Label(self.image_frame, image=self.image_tk)
             self.image_label.pack()
         except Exception as e:
@@ -63,3 +70,17 @@ class GameDetailFrame(ttk.Frame):
         ttk.Label(self.details_frame, text="Cognitive Functions:", font=("Arial", 12, "bold")).pack(anchor=tk.W, pady=5)
         for function, weight in self.game.functions:
             ttk.Label(self.details_frame, text=f"- {function.name} ({weight})").pack(anchor=tk.W)
+
+    @staticmethod
+    def _open_image(db: Database, image_path: str):
+        """The image, or its thumbnail when it is stored in the database, which is all the list shows."""
+        from PIL import Image
+
+        import image_store
+
+        if image_store.blob_id(image_path) is None:
+            return Image.open(image_path)
+        thumbnail = image_store.read_thumbnail(db, image_path) if isinstance(db, Database) else None
+        if thumbnail is None:
+            raise FileNotFoundError(f"No image {image_path} in the database")
+        return Image.open(io.BytesIO(thumbnail))
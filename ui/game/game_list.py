@@ -36,4 +36,4 @@ class GameListFrame(ttk.Frame):
 
         # Populate the scrollable frame with new GameDetailFrames
         for game in games:
-            GameDetailFrame(self.scrollable_frame, game).pack(fill=tk.X, pady=5)
+            GameDetailFrame(self.scrollable_frame, game, self.db).pack(fill=tk.X, pady=5)
@@ -0,0 +1,62 @@
+import tkinter as tk
+from tkinter import ttk
+from typing import Callable, Optional
+
+from database import Database
+from models import Change
+
+MAX_SUGGESTIONS: int = 20
+
+
+class GamePicker(ttk.Combobox):
+    """
+    Combobox suggesting game titles as the user types.
+
+    Only the (id, title) of the first matches are fetched, and the ID of the chosen game is kept,
+    so callers never have to look the game up again by title.
+    """
+
+    db: Database
+    game_var: tk.StringVar
+    matches: dict[str, int]
+
+    def __init__(self, parent, db: Database, on_select: Callable[[int], None] = None):
+        self.game_var = tk.StringVar()
+        super().__init__(parent, textvariable=self.game_var)
+        self.db = db
+        self.on_select = on_select
+        self.matches = {}
+        self.bind("<KeyRelease>", self._on_key_release)
+        self.bind("<<ComboboxSelected>>", self._on_selected)
+        self._suggest("")
+        self._unsubscribe = db.subscribe(self._on_changes)
+        self.bind("<Destroy>", self._on_destroy, add="+")
+
+    def _on_destroy(self, event):
+        # Also fired when the window is closed without calling destroy()
+        if event.widget is self:
+            self._unsubscribe()
+
+    @property
+    def selected_id(self) -> Optional[int]:
+        """ID of the game whose title is in the entry, if any."""
+        return self.matches.get(self.game_var.get())
+
+    def _suggest(self, prefix: str):
+        self.matches = {title: game_id for game_id, title in self.db.search_game_titles(prefix, MAX_SUGGESTIONS)}
+        self["values"] = list(self.matches)
+
+    def _on_changes(self, changes: list[Change]):
+        # Games added, renamed or deleted meanwhile, from another window for instance
+        if any(change.table == "games" for change in changes):
+            self._suggest(self.game_var.get())
+
+    def _on_key_release(self, event):
+        if event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+            return
+        self._suggest(self.game_var.get())
+
+    def _on_selected(self, event):
+        game_id = self.selected_id
+        if game_id is not None and self.on_select:
+            self.on_select(game_id)
@@ -1,8 +1,7 @@
-import tkinter as tk
-
-from database import Database
+from database import ConflictError, Database
 
 from .create_game import CreateGameWindow
+from .game_picker import GamePicker
 from tkinter import ttk, messagebox
 
 
@@ -12,40 +11,55 @@ class UpdateGameWindow(CreateGameWindow):
     def __init__(self, parent, db: Database):
         super().__init__(parent, db)
         self.title("Update Game")
+        self.version = None
         ttk.Label(self, text="Select Game").pack()
-        self.game_var = tk.StringVar()
-        self.game_combobox = ttk.Combobox(self, textvariable=self.game_var)
-        self.game_combobox.pack()
-        self.game_combobox.bind("<<ComboboxSelected>>", lambda _: self._populate_form())
-        self._populate_games()
+        self.game_picker = GamePicker(self, self.db, on_select=self._populate_form)
+        self.game_picker.pack()
 
         # Update Button
         self.action_button.destroy()
         self.action_button = ttk.Button(self, text="Update", command=self._update_in_db)
         self.action_button.pack(pady=10)
 
-    def _populate_games(self):
-        games = self.db.get_all_games()
-        self.game_combobox["values"] = [game.title for game in games]
-
-    def _populate_form(self):
-        selected_game_title = self.game_var.get()
-        if selected_game_title:
-            game = self.db.get_game(game_title=selected_game_title)
-            super()._populate_form(game)
+    def _populate_form(self, game_id: int):
+        game = self.db.get_game(game_id=game_id)
+        # Version of the game shown in the form: the update is refused if someone else changed it since
+        self.version = game.version
+        super()._populate_form(game)
 
     def _update_in_db(self):
-        selected_game_title = self.game_var.get()
-        if not selected_game_title:
+        game_id = self.game_picker.selected_id
+        if game_id is None:
             messagebox.showerror("Error", "No game selected!")
             return
 
         game = self._game_from_form()
-        game.id = self.db.get_game(game_title=selected_game_title).id
+        if game is None:
+            return
+        game.id = game_id
+        game.version = self.version
 
         try:
             self.db.update_game(game)
-            messagebox.showinfo("Success", "Game updated successfully!")
-            self.destroy()
+        except ConflictError:
+            overwrite = messagebox.askyesnocancel(
+                "Conflict",
+                "This game was modified by someone else since you opened it.\n\n"
+                "Yes: overwrite their changes with yours.\nNo: discard your changes and load theirs.",
+            )
+            if overwrite is None:
+                return
+            if not overwrite:
+                self._populate_form(game_id)
+                return
+            game.version = None
+            try:
+                self.db.update_game(game)
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+                return
         except Exception as e:
             messagebox.showerror("Error", str(e))
+            return
+        messagebox.showinfo("Success", "Game updated successfully!")
+        self.destroy()
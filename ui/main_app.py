@@ -0,0 +1,164 @@
+import importlib
+import os
+import threading
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+import tracing
+from timings import StartupTimings
+
+# Tab title, module and frame class. Tabs are only imported and built when first selected.
+TABS: list[tuple[str, str, str]] = [
+    ("Games", "ui.game.game_crud", "GameCRUDFrame"),
+    ("Categories", "ui.category.category_crud", "CategoryCRUDFrame"),
+    ("Functions", "ui.function.function_crud", "FunctionCRUDFrame"),
+    ("Search & List", "ui.search_bar", "SearchBarFrame"),
+]
+# With NEUROPSY_KIOSK set to a file written by `python3 . export-pack`, the catalog is only browsed from that file
+KIOSK_TABS = TABS[-1:]
+# Milliseconds to wait for the window manager to show the window, before going on without it (e.g. started minimized)
+MAP_TIMEOUT = 2000
+
+
+class MainApp(tk.Tk):
+    def __init__(self, timings: StartupTimings = None):
+        super().__init__()
+        self.timings = timings or StartupTimings()
+        self.kiosk = os.environ.get("NEUROPSY_KIOSK")
+        self.tabs = KIOSK_TABS if self.kiosk else TABS
+        self.title("Neuropsy Games (read-only)" if self.kiosk else "Neuropsy Games")
+        self.geometry("800x600")
+        self.db = None
+        self.search_frame = None
+        self.notebook = ttk.Notebook(self)
+        self.notebook.pack(fill=tk.BOTH, expand=True)
+        self._tab_frames: dict[str, ttk.Frame] = {}
+        self._add_tabs()
+        self.timings.mark("window")
+
+        # Paint the empty window before loading pydantic, the database and the first tab. The window manager maps the
+        # window asynchronously: the first paint is when it is mapped and its widgets are drawn.
+        self._mapped = tk.BooleanVar(self, False)
+        self.bind("<Map>", self._on_map, add="+")
+        timeout = self.after(MAP_TIMEOUT, self._mapped.set, True)
+        self.wait_variable(self._mapped)
+        self.after_cancel(timeout)
+        self.update_idletasks()
+        self.timings.mark("first paint")
+
+        self._open_database()
+        if not self.kiosk:
+            self._add_menu()
+            self._start_maintenance()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        self._start_tracing()
+        self.notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
+        self._build_tab(self.tabs[0][0])
+        self.timings.mark("first tab")
+
+    def _on_map(self, event):
+        # Also fired for the children
+        if event.widget is self:
+            self._mapped.set(True)
+
+    def _add_tabs(self):
+        for text, _, _ in self.tabs:
+            self.notebook.add(ttk.Frame(self.notebook), text=text)
+
+    def _open_database(self):
+        if self.kiosk:
+            from packed_catalog import PackedCatalog
+
+            self.db = PackedCatalog(self.kiosk)
+            self.timings.mark("map pack")
+            return
+        from database import Database
+
+        self.timings.mark("import database")
+        self.db = Database()
+        self.db.setup()
+        self.timings.mark("database setup")
+
+    def _start_maintenance(self):
+        import maintenance
+
+        maintenance.IdleMaintenance(self, self.db).start()
+
+    def _on_close(self):
+        self.db.close()
+        self.destroy()
+
+    def _add_menu(self):
+        menu = tk.Menu(self)
+        file_menu = tk.Menu(menu, tearoff=False)
+        file_menu.add_command(label="Back up now", command=self._back_up)
+        menu.add_cascade(label="File", menu=file_menu)
+        self.config(menu=menu)
+        self.file_menu = file_menu
+
+    def _back_up(self):
+        """Snapshot the catalog on a worker thread: the copy runs in small steps while the window stays usable."""
+        import backup
+
+        result = {}
+
+        def run():
+            try:
+                result["snapshot"] = backup.create_snapshot(self.db.file)
+                backup.prune_snapshots(backup.default_backup_dir(self.db.file))
+            except Exception as e:
+                result["error"] = e
+
+        def poll():
+            if thread.is_alive():
+                self.after(100, poll)
+                return
+            self.file_menu.entryconfigure("Back up now", state=tk.NORMAL)
+            if "error" in result:
+                messagebox.showerror("Error", f"Backup failed: {result['error']}")
+            else:
+                messagebox.showinfo("Success", f"Backup {result['snapshot'].name} created.")
+
+        self.file_menu.entryconfigure("Back up now", state=tk.DISABLED)
+        thread = threading.Thread(target=run, name="backup", daemon=True)
+        thread.start()
+        self.after(100, poll)
+
+    def _start_tracing(self):
+        if tracing.current is None:
+            return
+        tracing.StallMonitor(self, tracing.current).start()
+        self.bind("<F12>", self._show_performance_overlay)
+
+    def _show_performance_overlay(self, event=None):
+        from ui.performance_overlay import PerformanceOverlayWindow
+
+        PerformanceOverlayWindow(self, tracing.current)
+
+    def _build_tab(self, text: str) -> bool:
+        """Build the frame of the given tab if needed. Returns True if it has just been built."""
+        if text in self._tab_frames:
+            return False
+        index, module_name, class_name = next(
+            (i, module, cls) for i, (title, module, cls) in enumerate(self.tabs) if title == text
+        )
+        frame_class = getattr(importlib.import_module(module_name), class_name)
+        placeholder = self.notebook.nametowidget(self.notebook.tabs()[index])
+        frame = frame_class(placeholder, self.db)
+        frame.pack(fill=tk.BOTH, expand=True)
+        self._tab_frames[text] = frame
+        if text == "Search & List":
+            self.search_frame = frame
+        return True
+
+    def _on_tab_changed(self, event):
+        selected_tab = self.notebook.tab(self.notebook.select(), "text")
+        action = tracing.start_action(f"open {selected_tab}")
+        with tracing.span("build tab"):
+            self._build_tab(selected_tab)
+        # Changes made meanwhile by another process, such as a command line import
+        self.db.publish_changes()
+        if selected_tab == "Search & List" and self.search_frame:
+            with tracing.span("refresh"):
+                self.search_frame.refresh()
+        self.after_idle(action.end)
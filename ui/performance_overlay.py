@@ -0,0 +1,60 @@
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+
+from tracing import Tracer
+
+REFRESH_MS: int = 1000
+
+
+class PerformanceOverlayWindow(tk.Toplevel):
+    """Shows the last traced user actions with the duration of each stage, and the event-loop stalls."""
+
+    tracer: Tracer
+
+    def __init__(self, parent, tracer: Tracer):
+        super().__init__(parent)
+        self.tracer = tracer
+        self.title("Performance")
+        self.geometry("500x400")
+        self.attributes("-topmost", True)
+
+        self.tree = ttk.Treeview(self, columns=("duration",), show="tree headings")
+        self.tree.heading("#0", text="Action / stage")
+        self.tree.heading("duration", text="Duration (ms)")
+        self.tree.column("duration", width=100, anchor=tk.E)
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+        self.stalls_var = tk.StringVar()
+        ttk.Label(self, textvariable=self.stalls_var).pack(anchor=tk.W, padx=10)
+        ttk.Button(self, text="Export trace", command=self._export).pack(pady=5)
+
+        self._refresh()
+
+    def _refresh(self):
+        self.tree.delete(*self.tree.get_children())
+        for action in self.tracer.actions():
+            text = f"#{action['id']} {action['name']}"
+            item = self.tree.insert("", tk.END, text=text, values=(_ms(action["total"]),))
+            for name, duration in action["stages"]:
+                self.tree.insert(item, tk.END, text=name, values=(_ms(duration),))
+
+        stalls = self.tracer.stalls()
+        longest = max((stall.duration for stall in stalls), default=0)
+        self.stalls_var.set(f"Event loop stalls: {len(stalls)} (longest {_ms(longest)} ms)")
+        self.after(REFRESH_MS, self._refresh)
+
+    def _export(self):
+        path = filedialog.asksaveasfilename(
+            title="Export Chrome trace",
+            defaultextension=".json",
+            filetypes=[("Trace Event JSON", "*.json")],
+        )
+        if path:
+            try:
+                self.tracer.export(path)
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}"
@@ -1,10 +1,14 @@
 import tkinter as tk
 import tkinter.ttk as ttk
 import logging
+from tkinter import messagebox, simpledialog
 
+import saved_searches
+import tracing
 from ui.game.game_list import GameListFrame
 from database import Database
-from models import Material
+from models import Change, Material
+from query_language import QueryError, quote
 
 logger = logging.getLogger(__name__)
 
@@ -18,9 +22,44 @@ class SearchBarFrame(ttk.Frame):
     def __init__(self, parent, db: Database):
         super().__init__(parent)
         self.db = db
-        self.refresh()
+        # The taxonomy queries run on refresh(), when the tab is first shown
+        self.taxonomy_changed = True
+        self.games_changed = False
+        self.searched = False
+        # Name of the saved search shown instead of the search results
+        self.saved_name = None
+        # Built on the first search, then kept up to date from the change feed
+        self.index = None
+        self._unsubscribe = db.subscribe(self._on_changes)
+        self.bind("<Destroy>", self._on_destroy, add="+")
+
+    def _on_destroy(self, event):
+        # Also fired when the window is closed without calling destroy()
+        if event.widget is self:
+            self._unsubscribe()
+            if self.index:
+                self.index.close()
+
+    def _on_changes(self, changes: list[Change]):
+        for change in changes:
+            if change.table == "games":
+                self.games_changed = True
+            elif change.table in ("cognitive_categories", "cognitive_functions"):
+                self.taxonomy_changed = True
 
     def refresh(self):
+        """Rebuild the filters if the categories or functions changed, else only search again if games changed."""
+        if not self.taxonomy_changed:
+            if self.games_changed and self.saved_name:
+                self._open_saved()
+            elif self.games_changed and self.searched:
+                self._search()
+            return
+        self.taxonomy_changed = False
+        self.games_changed = False
+        self.searched = False
+        self.saved_name = None
+
         for child in self.winfo_children():
             child.destroy()
 
@@ -32,6 +71,25 @@ class SearchBarFrame(ttk.Frame):
         self.search_entry = ttk.Entry(self, textvariable=self.search_var)
         self.search_entry.pack(fill=tk.X, padx=10, pady=5)
         self.search_entry.bind("<KeyRelease>", self._on_key_release)
+        # Why the query typed cannot be parsed, while the previous results stay shown
+        self.query_error = ttk.Label(self, text="", foreground="red")
+        self.query_error.pack(fill=tk.X, padx=10)
+
+        # Saved searches, whose games are stored in the database
+        if isinstance(self.db, Database):
+            saved_frame = ttk.Frame(self)
+            saved_frame.pack(fill=tk.X, padx=10, pady=5)
+            ttk.Label(saved_frame, text="Saved searches:").pack(side=tk.LEFT)
+            self.saved_var = tk.StringVar()
+            self.saved_box = ttk.Combobox(
+                saved_frame,
+                textvariable=self.saved_var,
+                state="readonly",
+                values=[search.name for search in saved_searches.get_all(self.db)],
+            )
+            self.saved_box.pack(side=tk.LEFT, padx=5)
+            self.saved_box.bind("<<ComboboxSelected>>", lambda event: self._open_saved(self.saved_var.get()))
+            ttk.Button(saved_frame, text="Save search", command=self._save_search).pack(side=tk.LEFT)
 
         # Filters
         ttk.Label(self, text="Filters").pack(pady=5)
@@ -79,22 +137,94 @@ class SearchBarFrame(ttk.Frame):
         if len(query) >= 2:
             self._search()
 
+    def _current_query(self) -> str:
+        """The filters checked and the text typed, as a single query of the search language."""
+        groups = [
+            [f"mat:{material.name}" for material, var in self.material_vars.items() if var.get()],
+            [f"cat:{quote(name)}" for name, (var, _) in self.category_vars.items() if var.get()],
+            [f"func:{quote(name)}" for name, (var, _) in self.function_vars.items() if var.get()],
+        ]
+        terms = [f"({' OR '.join(group)})" if len(group) > 1 else group[0] for group in groups if group]
+        text = self.search_var.get().strip()
+        if text:
+            terms.append(f"({text})")
+        return " ".join(terms)
+
+    def _save_search(self):
+        query = self._current_query()
+        if not query:
+            messagebox.showerror("Error", "Type a query or check filters to save them.")
+            return
+        name = simpledialog.askstring("Save search", "Name of the search:", parent=self)
+        if not name:
+            return
+        try:
+            saved_searches.save(self.db, name, query)
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.saved_box.config(values=[search.name for search in saved_searches.get_all(self.db)])
+        self.saved_var.set(name)
+        self._open_saved(name)
+
+    def _open_saved(self, name: str = None):
+        """Show the stored games of a saved search, brought up to date with the changes since it was last opened."""
+        action = tracing.start_action("open saved search")
+        self.games_changed = False
+        self.saved_name = name or self.saved_name
+        try:
+            with tracing.span("database"):
+                games = saved_searches.games(self.db, self.saved_name)
+            with tracing.span("update games"):
+                self.game_list_frame.update_games(games)
+        except Exception as e:
+            logger.error(f"Error while opening the saved search {self.saved_name}: {e}")
+        finally:
+            self.after_idle(action.end)
+
     def _search(self):
+        action = tracing.start_action("search")
+        self.games_changed = False
+        self.searched = True
+        self.saved_name = None
+
         # Collect filters
-        game_title = self.search_var.get() if len(self.search_var.get()) >= 2 else None
+        text = self.search_var.get() if len(self.search_var.get()) >= 2 else None
         materials = [material for material, var in self.material_vars.items() if var.get()]
         category_ids = [_id for _, (var, _id) in self.category_vars.items() if var.get()]
         function_ids = [_id for _, (var, _id) in self.function_vars.items() if var.get()]
 
         try:
             # Fetch games from the database
-            games = self.db.get_games_with_filters(
-                game_title=game_title,
-                cognitive_categories_ids=category_ids,
-                cognitive_functions_ids=function_ids,
-                materials=materials,
-            )
+            if not isinstance(self.db, Database):
+                # A packed catalog already searches its own inverted index, by title only
+                searcher = self.db
+                filters = {"game_title": text}
+            else:
+                # The text is a query of the search language, of which plain words search the titles
+                filters = {"search_query": text}
+                if self.index is None:
+                    from bitmap_index import GameIndex
+
+                    with tracing.span("build index"):
+                        self.index = GameIndex(self.db)
+                searcher = self.index
+            # The filters are intersected in memory, only the matching games are read from the database
+            with tracing.span("database"):
+                games = searcher.get_games_with_filters(
+                    cognitive_categories_ids=category_ids,
+                    cognitive_functions_ids=function_ids,
+                    materials=materials,
+                    **filters,
+                )
+            self.query_error.config(text="")
             # Update GameListFrame with search results
-            self.game_list_frame.update_games(games)
+            with tracing.span("update games"):
+                self.game_list_frame.update_games(games)
+        except QueryError as e:
+            self.query_error.config(text=str(e))
         except Exception as e:
             logger.error(f"Error during search: {e}")
+        finally:
+            # Queued after the redraws of the new widgets: the action ends when the results have been drawn
+            self.after_idle(action.end)